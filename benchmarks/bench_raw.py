@@ -0,0 +1,83 @@
+'''
+Compare memory use and throughput of :meth:`SQLAlchemyProvider.iter_raw`
+with loading every concept through :meth:`SQLAlchemyProvider.get_by_id`.
+
+Usage::
+
+    $ python benchmarks/bench_raw.py [number_of_concepts] [sqlalchemy_url]
+'''
+import sys
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from skosprovider_sqlalchemy.models import Base
+from skosprovider_sqlalchemy.models import Concept
+from skosprovider_sqlalchemy.models import ConceptScheme
+from skosprovider_sqlalchemy.models import Initialiser
+from skosprovider_sqlalchemy.models import Label
+from skosprovider_sqlalchemy.models import Note
+from skosprovider_sqlalchemy.providers import SQLAlchemyProvider
+
+
+def create_scheme(session, size):
+    cs = ConceptScheme(id=1, uri='urn:x-skosprovider:bench')
+    session.add(cs)
+    parent = None
+    for i in range(1, size + 1):
+        c = Concept(concept_id=str(i), conceptscheme=cs)
+        c.labels.append(Label('Concept %d' % i, 'prefLabel', 'en'))
+        c.labels.append(Label('Begrip %d' % i, 'prefLabel', 'nl'))
+        c.labels.append(Label('Term %d' % i, 'altLabel', 'en'))
+        c.notes.append(Note('Note on concept %d' % i, 'scopeNote', 'en'))
+        if parent is not None:
+            c.broader_concepts.add(parent)
+        if i % 10 == 1:
+            parent = c
+        session.add(c)
+    session.commit()
+
+
+def measure(name, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    duration = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(
+        '%-10s %8d items %8.3f s %10.0f items/s %8.1f MiB peak' % (
+            name, len(result), duration, len(result) / duration,
+            peak / 1024 / 1024
+        )
+    )
+
+
+def main(argv=sys.argv):
+    size = int(argv[1]) if len(argv) > 1 else 5000
+    url = argv[2] if len(argv) > 2 else 'sqlite://'
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    Initialiser(session).init_all()
+    create_scheme(session, size)
+    provider = SQLAlchemyProvider({'id': 'BENCH', 'conceptscheme_id': 1}, session)
+    ids = [c['id'] for c in provider.get_all()]
+
+    def load_objects():
+        session.expunge_all()
+        return [provider.get_by_id(i) for i in ids]
+
+    def load_records():
+        session.expunge_all()
+        return list(provider.iter_raw())
+
+    measure('objects', load_objects)
+    measure('records', load_records)
+
+
+if __name__ == '__main__':
+    main()
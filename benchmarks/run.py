@@ -0,0 +1,230 @@
+'''
+Benchmark the most important provider operations on a synthetic scheme.
+
+The results are written as a JSON report. Passing an earlier report with
+`--compare` prints how every operation evolved since then.
+
+Usage::
+
+    $ python benchmarks/run.py --url sqlite:///bench.db --size 10000 \\
+        --output report.json
+    $ python benchmarks/run.py \\
+        --url postgresql://user:pw@localhost/bench --size 10000 \\
+        --compare report.json
+
+.. warning::
+
+    The database at `--url` is emptied before the benchmark runs.
+'''
+import argparse
+import json
+import logging
+import platform
+import random
+import statistics
+import sys
+import time
+
+import sqlalchemy
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from skosprovider_sqlalchemy.generator import SYLLABLES
+from skosprovider_sqlalchemy.generator import generate_scheme
+from skosprovider_sqlalchemy.models import Base
+from skosprovider_sqlalchemy.models import ConceptScheme
+from skosprovider_sqlalchemy.models import Initialiser
+from skosprovider_sqlalchemy.models import Visitation
+from skosprovider_sqlalchemy.providers import SQLAlchemyProvider
+from skosprovider_sqlalchemy.utils import VisitationCalculator
+from skosprovider_sqlalchemy.utils import import_provider
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', default='sqlite://')
+    parser.add_argument('--size', type=int, default=5000)
+    parser.add_argument('--depth', type=int, default=5)
+    parser.add_argument('--branching', type=int, default=6)
+    parser.add_argument('--polyhierarchy', type=float, default=0.05)
+    parser.add_argument('--related', type=float, default=0.02)
+    parser.add_argument('--collections', type=int, default=20)
+    parser.add_argument('--languages', default='nl,en,fr')
+    parser.add_argument('--labels-per-concept', type=int, default=2)
+    parser.add_argument('--notes', type=float, default=0.5)
+    parser.add_argument('--matches', type=float, default=0.3)
+    parser.add_argument('--import-size', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output')
+    parser.add_argument('--compare')
+    return parser.parse_args(argv)
+
+
+class Benchmark:
+
+    def __init__(self, args):
+        self.args = args
+        self.engine = create_engine(args.url)
+        self.session_maker = sessionmaker(bind=self.engine)
+        self.rnd = random.Random(args.seed)
+        self.results = {}
+        self.calls = []
+
+    def setup(self):
+        Base.metadata.drop_all(self.engine)
+        Base.metadata.create_all(self.engine)
+        session = self.session_maker()
+        Initialiser(session).init_all()
+        session.commit()
+        generator_args = dict(
+            depth=self.args.depth,
+            branching=self.args.branching,
+            polyhierarchy=self.args.polyhierarchy,
+            related=self.args.related,
+            collections=self.args.collections,
+            languages=self.args.languages.split(','),
+            labels_per_concept=self.args.labels_per_concept,
+            notes=self.args.notes,
+            matches=self.args.matches,
+            seed=self.args.seed
+        )
+        start = time.perf_counter()
+        with self.engine.begin() as conn:
+            self.cs_id = generate_scheme(conn, size=self.args.size, **generator_args)
+            self.small_cs_id = generate_scheme(
+                conn, size=self.args.import_size, **generator_args
+            )
+        self.results['generate'] = {'seconds': time.perf_counter() - start}
+        session.close()
+
+    def provider(self, conceptscheme_id=None, **kwargs):
+        return SQLAlchemyProvider(
+            {'id': 'BENCH', 'conceptscheme_id': conceptscheme_id or self.cs_id},
+            self.session_maker,
+            instrumentation=lambda stats: self.calls.append(stats),
+            **kwargs
+        )
+
+    def measure(self, name, func, args_list):
+        self.calls = []
+        timings = []
+        for args in args_list:
+            start = time.perf_counter()
+            func(*args)
+            timings.append(time.perf_counter() - start)
+        self.results[name] = {
+            'calls': len(timings),
+            'mean': statistics.mean(timings),
+            'median': statistics.median(timings),
+            'min': min(timings),
+            'max': max(timings),
+            'statements': statistics.mean(c.statements for c in self.calls)
+            if self.calls else None,
+        }
+
+    def _sample_ids(self):
+        return [
+            (str(self.rnd.randint(1, self.args.size)),)
+            for _ in range(self.args.repeat)
+        ]
+
+    def run(self):
+        self.setup()
+        provider = self.provider()
+        ids = self._sample_ids()
+        top = [(c['id'],) for c in provider.get_top_concepts()]
+
+        self.measure('get_by_id', provider.get_by_id, ids)
+        self.measure('get_by_uri', provider.get_by_uri, [
+            ('urn:x-skosprovider:synthetic:%d:%s' % (self.cs_id, i),)
+            for (i,) in ids
+        ])
+        self.measure('find_label', lambda q: provider.find({'label': q}), [
+            (self.rnd.choice(SYLLABLES) + self.rnd.choice(SYLLABLES),)
+            for _ in ids
+        ])
+        self.measure('find_collection_all', lambda c: provider.find(
+            {'collection': {'id': c, 'depth': 'all'}}
+        ), [(str(self.args.size + 1),)])
+        self.measure('get_all', provider.get_all, [()])
+        self.measure('get_top_concepts', provider.get_top_concepts, [()])
+        self.measure('get_top_display', provider.get_top_display, [()])
+        self.measure('get_children_display', provider.get_children_display, ids)
+        self.measure('expand_recurse', provider.expand, top)
+
+        session = self.session_maker()
+        vc = VisitationCalculator(session)
+        cs = session.get(ConceptScheme, self.cs_id)
+        start = time.perf_counter()
+        visit = vc.visit(cs)
+        self.results['visitation_calculator'] = {
+            'seconds': time.perf_counter() - start
+        }
+        session.add_all(
+            Visitation(
+                conceptscheme_id=self.cs_id, concept_id=v['id'],
+                lft=v['lft'], rght=v['rght'], depth=v['depth']
+            ) for v in visit
+        )
+        session.commit()
+        visit_provider = self.provider(expand_strategy='visit')
+        self.measure('expand_visit', visit_provider.expand, top)
+
+        source = self.provider(self.small_cs_id)
+        session = self.session_maker()
+        start = time.perf_counter()
+        import_provider(source, session)
+        session.flush()
+        self.results['import_provider'] = {
+            'seconds': time.perf_counter() - start,
+            'concepts': self.args.import_size
+        }
+        session.rollback()
+        return self.report()
+
+    def report(self):
+        return {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'sqlalchemy': sqlalchemy.__version__,
+            'dialect': self.engine.dialect.name,
+            'parameters': {
+                k: v for k, v in vars(self.args).items()
+                if k not in ('url', 'output', 'compare')
+            },
+            'results': self.results
+        }
+
+
+def _key(result):
+    return result.get('median', result.get('seconds'))
+
+
+def compare(report, baseline):
+    print('%-25s %12s %12s %8s' % ('operation', 'baseline', 'current', 'ratio'))
+    for name, result in sorted(report['results'].items()):
+        if name not in baseline['results']:
+            continue
+        old = _key(baseline['results'][name])
+        new = _key(result)
+        print('%-25s %12.6f %12.6f %8.2f' % (name, old, new, new / old if old else 0))
+
+
+def main(argv=sys.argv):
+    logging.basicConfig(level=logging.ERROR)
+    args = _parse_args(argv[1:])
+    report = Benchmark(args).run()
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+'''
+Helpers for writing rows with set-based statements.
+
+These are shared by the :mod:`skosprovider_sqlalchemy.loaders`, the
+:mod:`skosprovider_sqlalchemy.generator`,
+:func:`skosprovider_sqlalchemy.utils.clone_conceptscheme` and
+:func:`skosprovider_sqlalchemy.utils.delete_conceptscheme`, and can be used
+by other code that bypasses the ORM.
+'''
+from contextlib import contextmanager
+
+from sqlalchemy import Column
+from sqlalchemy import Integer
+from sqlalchemy import MetaData
+from sqlalchemy import Table
+from sqlalchemy import text
+from sqlalchemy.schema import DropTable
+
+from skosprovider_sqlalchemy.models import ConceptScheme
+from skosprovider_sqlalchemy.models import Label
+from skosprovider_sqlalchemy.models import Note
+from skosprovider_sqlalchemy.models import Source
+from skosprovider_sqlalchemy.models import Thing
+
+temporary_metadata = MetaData()
+'''
+The metadata of temporary tables. These are never part of
+:data:`skosprovider_sqlalchemy.models.Base.metadata`, so they are not
+created by `create_all`.
+'''
+
+removed_ids = Table(
+    'skos_removed_id',
+    temporary_metadata,
+    Column('id', Integer, primary_key=True),
+    prefixes=['TEMPORARY'],
+    postgresql_on_commit='DROP'
+)
+'''
+A temporary table with the ids of rows that are about to be removed. Use it
+with :func:`temporary_table`.
+'''
+
+
+@contextmanager
+def temporary_table(conn, table):
+    '''
+    Create a temporary table for the duration of a `with` block.
+
+    The table is dropped when the block ends. When the block fails, the
+    original error is raised. On PostgreSQL a failed statement aborts the
+    transaction, so nothing can be executed until it has been rolled back.
+    Creating a table is part of the transaction there, so the rollback
+    removes it. Tables created with `postgresql_on_commit='DROP'` are also
+    removed when the transaction is committed after an error was handled.
+    Other databases drop the table right away. Since SQLite does not always
+    create tables inside the transaction, a rollback can leave the table
+    behind there, so a table left over by an earlier failure is dropped
+    before it is created again.
+
+    .. code-block:: python
+
+        with temporary_table(conn, removed_ids):
+            conn.execute(removed_ids.insert().from_select(['id'], ids))
+
+    :param conn: A :class:`sqlalchemy.engine.Connection`.
+    :param table: A :class:`sqlalchemy.schema.Table` with a `TEMPORARY`
+        prefix.
+    :return: The table.
+    '''
+    conn.execute(DropTable(table, if_exists=True))
+    table.create(conn)
+    try:
+        yield table
+    except BaseException:
+        if conn.dialect.name != 'postgresql':
+            conn.execute(DropTable(table, if_exists=True))
+        raise
+    table.drop(conn)
+
+
+def reset_sequences(conn):
+    '''
+    Let the id sequences catch up with rows that were inserted with
+    explicit ids.
+
+    On databases that use sequences, such as PostgreSQL, the next row
+    inserted through the ORM would otherwise get an id that is already in
+    use. Other databases are left alone.
+
+    :param conn: A :class:`sqlalchemy.engine.Connection`.
+    '''
+    if conn.dialect.name != 'postgresql':
+        return
+    for model in (ConceptScheme, Thing, Label, Note, Source):
+        table = model.__table__.name
+        conn.execute(text(
+            "SELECT setval(pg_get_serial_sequence('%s', 'id'), "
+            "COALESCE((SELECT MAX(id) FROM %s), 1))" % (table, table)
+        ))
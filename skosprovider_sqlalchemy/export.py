@@ -0,0 +1,287 @@
+'''
+Export a conceptscheme as SKOS, without building it in memory first.
+
+The exporters read the concepts and collections of a provider with
+:meth:`skosprovider_sqlalchemy.providers.SQLAlchemyProvider.iter_raw`, in
+chunks ordered by their internal id, and write every chunk before reading
+the next one. The memory needed does not depend on the size of the
+conceptscheme, and no RDF library is needed.
+
+.. code-block:: python
+
+    with open('trees.nt', 'w', encoding='utf-8') as f:
+        export_ntriples(provider, f)
+'''
+import json
+
+RDF = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'
+SKOS = 'http://www.w3.org/2004/02/skos/core#'
+SKOS_THES = 'http://purl.org/iso25964/skos-thes#'
+DCTERMS = 'http://purl.org/dc/terms/'
+
+PREFIXES = {
+    'rdf': RDF,
+    'skos': SKOS,
+    'skos-thes': SKOS_THES,
+    'dcterms': DCTERMS,
+}
+'''
+The prefixes used in Turtle and JSON-LD exports.
+'''
+
+_LABELTYPES = ('prefLabel', 'altLabel', 'hiddenLabel')
+
+_NOTETYPES = (
+    'note', 'changeNote', 'definition', 'editorialNote',
+    'example', 'historyNote', 'scopeNote'
+)
+
+
+def _uri(uri):
+    return ('uri', uri)
+
+
+def _name(name):
+    return ('name', name)
+
+
+def _literal(value, language=None, markup=None):
+    datatype = 'rdf:HTML' if markup == 'HTML' else None
+    return ('literal', value, None if datatype else language, datatype)
+
+
+def _bnode(properties):
+    return ('bnode', properties)
+
+
+def _describe(labels, notes, sources):
+    res = []
+    for label in labels:
+        if label.type in _LABELTYPES:
+            res.append(('skos:' + label.type, _literal(label.label, label.language)))
+    for note in notes:
+        if note.type in _NOTETYPES:
+            res.append((
+                'skos:' + note.type,
+                _literal(note.note, note.language, note.markup)
+            ))
+    for source in sources:
+        res.append(('dcterms:source', _bnode([
+            (
+                'dcterms:bibliographicCitation',
+                _literal(source.citation, markup=source.markup)
+            )
+        ])))
+    return res
+
+
+def iter_resources(provider, chunk_size=1000):
+    '''
+    Describe a conceptscheme and all its concepts and collections.
+
+    This is the basis of all exporters and can be used to write other
+    formats.
+
+    :param provider: A
+        :class:`skosprovider_sqlalchemy.providers.SQLAlchemyProvider`.
+    :param int chunk_size: How many concepts or collections to read from
+        the database at once.
+    :rtype: A generator of tuples of a :term:`URI` and a list of
+        `(predicate, object)` tuples. Predicates use the :data:`PREFIXES`.
+        Objects are tuples that start with `uri`, `name`, `literal` or
+        `bnode`.
+    '''
+    cs = provider.concept_scheme
+    scheme = [('rdf:type', _name('skos:ConceptScheme'))]
+    scheme += _describe(cs.labels, cs.notes, cs.sources)
+    scheme += [
+        ('skos:hasTopConcept', _uri(
+            c['uri'] or provider.uri_generator.generate(type=c['type'], id=c['id'])
+        ))
+        for c in provider.get_top_concepts()
+    ]
+    yield cs.uri, scheme
+    for thing in provider.iter_raw(chunk_size=chunk_size, relation_uris=True):
+        if thing.type == 'collection':
+            properties = [('rdf:type', _name('skos:Collection'))]
+        else:
+            properties = [('rdf:type', _name('skos:Concept'))]
+        properties.append(('skos:inScheme', _uri(cs.uri)))
+        properties.append(('dcterms:identifier', _literal(thing.id)))
+        properties += _describe(thing.labels, thing.notes, thing.sources)
+        for predicate, targets in (
+            ('skos:broader', thing.broader),
+            ('skos:narrower', thing.narrower),
+            ('skos:related', thing.related),
+            ('skos:member', thing.members),
+            ('skos-thes:subordinateArray', thing.subordinate_arrays),
+            ('skos-thes:superOrdinate', thing.superordinates),
+        ):
+            properties += [(predicate, _uri(target)) for target in targets]
+        for matchtype, uris in thing.matches.items():
+            properties += [
+                ('skos:%sMatch' % matchtype, _uri(uri)) for uri in uris
+            ]
+        yield thing.uri, properties
+
+
+def _escape_uri(uri):
+    return ''.join(
+        '\\u%04X' % ord(c) if c in '<>"{}|^`\\' or ord(c) <= 0x20 else c
+        for c in uri
+    )
+
+
+def _escape_literal(value):
+    return (
+        value.replace('\\', '\\\\')
+        .replace('"', '\\"')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+def _expand(name):
+    prefix, local = name.split(':', 1)
+    return PREFIXES[prefix] + local
+
+
+def _format(term, names=False):
+    '''
+    Format a term as N-Triples. When `names` is set, prefixed names are
+    kept as they are, as Turtle allows.
+    '''
+    if term[0] == 'uri':
+        return '<%s>' % _escape_uri(term[1])
+    if term[0] == 'name':
+        return term[1] if names else '<%s>' % _expand(term[1])
+    _, value, language, datatype = term
+    res = '"%s"' % _escape_literal(value)
+    if datatype:
+        return res + '^^' + (datatype if names else '<%s>' % _expand(datatype))
+    if language:
+        return res + '@' + language
+    return res
+
+
+def export_ntriples(provider, out, chunk_size=1000):
+    '''
+    Write a conceptscheme as N-Triples.
+
+    :param provider: A
+        :class:`skosprovider_sqlalchemy.providers.SQLAlchemyProvider`.
+    :param out: A text file to write to.
+    :param int chunk_size: How many concepts or collections to read from
+        the database at once.
+    :return: The number of concepts and collections written.
+    '''
+    count = -1
+    bnodes = 0
+    for uri, properties in iter_resources(provider, chunk_size):
+        lines = []
+        todo = [('<%s>' % _escape_uri(uri), properties)]
+        while todo:
+            subject, properties = todo.pop()
+            for predicate, obj in properties:
+                if obj[0] == 'bnode':
+                    bnodes += 1
+                    node = '_:b%d' % bnodes
+                    todo.append((node, obj[1]))
+                else:
+                    node = _format(obj)
+                lines.append('%s <%s> %s .\n' % (subject, _expand(predicate), node))
+        out.write(''.join(lines))
+        count += 1
+    return count
+
+
+def _turtle_object(obj, indent):
+    if obj[0] != 'bnode':
+        return _format(obj, names=True)
+    return '[\n%s\n%s]' % (
+        _turtle_properties(obj[1], indent + '    '), indent
+    )
+
+
+def _turtle_properties(properties, indent):
+    return ' ;\n'.join(
+        '%s%s %s' % (
+            indent,
+            'a' if predicate == 'rdf:type' else predicate,
+            _turtle_object(obj, indent)
+        )
+        for predicate, obj in properties
+    )
+
+
+def export_turtle(provider, out, chunk_size=1000):
+    '''
+    Write a conceptscheme as Turtle.
+
+    :param provider: A
+        :class:`skosprovider_sqlalchemy.providers.SQLAlchemyProvider`.
+    :param out: A text file to write to.
+    :param int chunk_size: How many concepts or collections to read from
+        the database at once.
+    :return: The number of concepts and collections written.
+    '''
+    out.write(''.join(
+        '@prefix %s: <%s> .\n' % (prefix, namespace)
+        for prefix, namespace in PREFIXES.items()
+    ))
+    count = -1
+    for uri, properties in iter_resources(provider, chunk_size):
+        out.write('\n<%s>\n%s .\n' % (
+            _escape_uri(uri), _turtle_properties(properties, '    ')
+        ))
+        count += 1
+    return count
+
+
+def _jsonld_object(obj):
+    if obj[0] == 'uri':
+        return {'@id': obj[1]}
+    if obj[0] == 'name':
+        return {'@id': obj[1]}
+    if obj[0] == 'bnode':
+        return _jsonld_node(None, obj[1])
+    _, value, language, datatype = obj
+    res = {'@value': value}
+    if datatype:
+        res['@type'] = datatype
+    elif language:
+        res['@language'] = language
+    return res
+
+
+def _jsonld_node(uri, properties):
+    node = {'@id': uri} if uri else {}
+    for predicate, obj in properties:
+        if predicate == 'rdf:type':
+            node['@type'] = obj[1]
+        else:
+            node.setdefault(predicate, []).append(_jsonld_object(obj))
+    return node
+
+
+def export_jsonld(provider, out, chunk_size=1000):
+    '''
+    Write a conceptscheme as a JSON-LD document with a `@graph` of nodes.
+
+    :param provider: A
+        :class:`skosprovider_sqlalchemy.providers.SQLAlchemyProvider`.
+    :param out: A text file to write to.
+    :param int chunk_size: How many concepts or collections to read from
+        the database at once.
+    :return: The number of concepts and collections written.
+    '''
+    out.write('{"@context": %s,\n"@graph": [' % json.dumps(PREFIXES))
+    count = -1
+    for uri, properties in iter_resources(provider, chunk_size):
+        out.write('%s\n%s' % (
+            ',' if count >= 0 else '',
+            json.dumps(_jsonld_node(uri, properties), ensure_ascii=False)
+        ))
+        count += 1
+    out.write(']}\n')
+    return count
@@ -0,0 +1,172 @@
+'''
+Create providers for many conceptschemes at once.
+
+Applications that serve a lot of conceptschemes from the same database
+would otherwise create every
+:class:`skosprovider_sqlalchemy.providers.SQLAlchemyProvider` separately,
+each with its own session and each loading its own conceptscheme. The
+:class:`ProviderFactory` loads all conceptschemes in one pass and lets the
+providers share one session, and thereby one engine and connection pool.
+It also offers operations that work across all conceptschemes, backed by a
+single :class:`skosprovider_sqlalchemy.resolver.UriResolver` and its cache.
+
+Other caches, such as the :term:`URI` map of the `uri_cache` setting, are
+kept per provider.
+'''
+from collections import defaultdict
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from skosprovider_sqlalchemy.models import ConceptScheme as ConceptSchemeModel
+from skosprovider_sqlalchemy.providers import SQLAlchemyProvider
+from skosprovider_sqlalchemy.resolver import UriResolver
+
+
+class ProviderFactory:
+    '''
+    Creates and keeps track of the providers for several conceptschemes.
+
+    :param session: The database session shared by all providers. This
+        can also be a callable that returns a Session.
+    :param resolver: The
+        :class:`skosprovider_sqlalchemy.resolver.UriResolver` used to look
+        up :term:`URIs <URI>` across conceptschemes. When `None`, a resolver
+        without a cache is used.
+    :param kwargs: Keyword arguments passed to every provider, eg.
+        `expand_strategy` or `cache_ttl`.
+    '''
+
+    def __init__(self, session, resolver=None, **kwargs):
+        try:
+            self.session = session()
+        except TypeError:
+            self.session = session
+        self.resolver = resolver or UriResolver(self.session)
+        '''
+        The :class:`skosprovider_sqlalchemy.resolver.UriResolver`. It
+        recognises the generated :term:`URIs <URI>` of all providers created
+        by this factory.
+        '''
+        self.provider_kwargs = kwargs
+        self.providers = {}
+        '''
+        A :class:`dict` mapping conceptscheme ids to the providers created
+        so far.
+        '''
+
+    def create_providers(
+        self, metadata=None, conceptscheme_ids=None, provider_kwargs=None
+    ):
+        '''
+        Create a provider for every conceptscheme in the database.
+
+        All conceptschemes are loaded with a fixed number of queries and
+        handed to their provider, so the providers don't need to load them
+        again.
+
+        :param dict metadata: A :class:`dict` mapping conceptscheme ids to
+            the metadata of their provider. Conceptschemes that are not
+            present get a provider with the conceptscheme id as its id.
+        :param list conceptscheme_ids: Only create providers for these
+            conceptschemes. When `None`, providers are created for all
+            conceptschemes.
+        :param dict provider_kwargs: A :class:`dict` mapping conceptscheme ids
+            to extra keyword arguments for their provider, eg. a
+            `uri_generator`.
+        :rtype: A list of
+            :class:`skosprovider_sqlalchemy.providers.SQLAlchemyProvider`,
+            ordered by conceptscheme id.
+        '''
+        metadata = metadata or {}
+        provider_kwargs = provider_kwargs or {}
+        q = (
+            select(ConceptSchemeModel)
+            .options(
+                selectinload(ConceptSchemeModel.labels),
+                selectinload(ConceptSchemeModel.notes),
+                selectinload(ConceptSchemeModel.languages),
+                selectinload(ConceptSchemeModel.sources),
+            )
+            .order_by(ConceptSchemeModel.id)
+        )
+        if conceptscheme_ids is not None:
+            q = q.filter(ConceptSchemeModel.id.in_(conceptscheme_ids))
+        res = []
+        for csm in self.session.execute(q).scalars():
+            provider_metadata = dict(metadata.get(csm.id, {'id': str(csm.id)}))
+            provider_metadata['conceptscheme_id'] = csm.id
+            kwargs = dict(self.provider_kwargs)
+            kwargs.update(provider_kwargs.get(csm.id, {}))
+            kwargs['concept_scheme'] = csm
+            provider = SQLAlchemyProvider(provider_metadata, self.session, **kwargs)
+            self.providers[csm.id] = provider
+            self.resolver.add_provider(provider)
+            res.append(provider)
+        return res
+
+    def get_provider(self, conceptscheme_id):
+        '''
+        Get the provider for a conceptscheme.
+
+        :param int conceptscheme_id: The id of the conceptscheme.
+        :rtype: :class:`skosprovider_sqlalchemy.providers.SQLAlchemyProvider`
+            or `False` if no provider was created for this conceptscheme.
+        '''
+        return self.providers.get(conceptscheme_id, False)
+
+    def clear_cache(self):
+        '''
+        Clear the data cached by all providers and the resolver.
+        '''
+        for provider in self.providers.values():
+            provider.clear_cache()
+        self.resolver.clear_cache()
+
+    def resolve_uris(self, uris, chunk_size=1000):
+        '''
+        Find out which conceptschemes a list of :term:`URIs <URI>` belong to.
+
+        See :meth:`skosprovider_sqlalchemy.resolver.UriResolver.resolve_uris`.
+        '''
+        return self.resolver.resolve_uris(uris, chunk_size)
+
+    def get_by_uris(self, uris, chunk_size=1000):
+        '''
+        Get concepts and collections from any conceptscheme, based on their
+        :term:`URIs <URI>`.
+
+        The :term:`URIs <URI>` are resolved by the shared
+        :attr:`resolver` and then every provider loads its concepts and
+        collections in batches with
+        :meth:`skosprovider_sqlalchemy.providers.SQLAlchemyProvider.get_by_ids`.
+        The number of queries does not depend on the number of
+        :term:`URIs <URI>`, whether they are stored or generated.
+
+        :param list uris: The :term:`URIs <URI>` to look up.
+        :param int chunk_size: How many :term:`URIs <URI>` to look up in one
+            query.
+        :rtype: A :class:`dict` mapping each :term:`URI` to a
+            :class:`skosprovider.skos.Concept` or
+            :class:`skosprovider.skos.Collection` or `False` if it is unknown
+            to all providers.
+        '''
+        res = dict.fromkeys(uris, False)
+        resolved = {
+            uri: found for uri, found in
+            self.resolve_uris(uris, chunk_size).items()
+            if self.get_provider(found[0])
+        }
+        per_scheme = defaultdict(set)
+        for conceptscheme_id, concept_id in resolved.values():
+            per_scheme[conceptscheme_id].add(concept_id)
+        found = {}
+        for conceptscheme_id, concept_ids in per_scheme.items():
+            provider = self.get_provider(conceptscheme_id)
+            for concept_id, thing in provider.get_by_ids(
+                concept_ids, chunk_size
+            ).items():
+                found[(conceptscheme_id, concept_id)] = thing
+        for uri, key in resolved.items():
+            res[uri] = found[key]
+        return res
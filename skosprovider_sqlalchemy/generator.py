@@ -0,0 +1,244 @@
+'''
+Generate synthetic conceptschemes.
+
+Synthetic schemes are meant for load testing and benchmarking. They can
+be as large as needed, up to millions of concepts, and contain
+multilingual labels, notes, matches, related concepts, a polyhierarchy
+and collections. The rows are written with bulk inserts straight into the
+model tables, a chunk at a time, so memory use stays low. For a given
+seed, the generated scheme is always the same.
+'''
+import bisect
+import random
+
+from sqlalchemy import func
+from sqlalchemy import select
+
+from skosprovider_sqlalchemy.bulk import reset_sequences
+from skosprovider_sqlalchemy.models import ConceptScheme
+from skosprovider_sqlalchemy.models import Label
+from skosprovider_sqlalchemy.models import Match
+from skosprovider_sqlalchemy.models import Note
+from skosprovider_sqlalchemy.models import Thing
+from skosprovider_sqlalchemy.models import collection_concept
+from skosprovider_sqlalchemy.models import concept_hierarchy_collection
+from skosprovider_sqlalchemy.models import concept_hierarchy_concept
+from skosprovider_sqlalchemy.models import concept_label
+from skosprovider_sqlalchemy.models import concept_note
+from skosprovider_sqlalchemy.models import concept_related_concept
+from skosprovider_sqlalchemy.models import conceptscheme_language
+from skosprovider_sqlalchemy.models import has_owner_columns
+
+CHUNK_SIZE = 5000
+'''
+The number of concepts that are generated and inserted at once.
+'''
+
+MATCHTYPES = [
+    'closeMatch', 'exactMatch', 'broadMatch', 'narrowMatch', 'relatedMatch'
+]
+
+SYLLABLES = [
+    'an', 'bel', 'dor', 'e', 'ga', 'hu', 'ka', 'lin', 'me', 'no', 'o',
+    'pa', 'ri', 'sel', 'sta', 'to', 'u', 'ver', 'wy', 'zo'
+]
+
+
+def _word(rnd):
+    return ''.join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4)))
+
+
+def _text(rnd, words):
+    return ' '.join(_word(rnd) for _ in range(words)).capitalize()
+
+
+def _next_id(conn, column):
+    return (conn.execute(select(func.max(column))).scalar() or 0) + 1
+
+
+def _levels(size, depth, branching):
+    '''
+    Lay out `size` concepts as a forest, in breadth first order.
+
+    :rtype: A tuple of the number of trees and a list with the index of
+        the first concept of every level. The last item is `size`.
+    '''
+    capacity = sum(branching ** d for d in range(depth))
+    roots = max(1, -(-size // capacity))
+    starts = [0]
+    while starts[-1] < size:
+        starts.append(min(size, starts[-1] + roots * branching ** (len(starts) - 1)))
+    return roots, starts
+
+
+def generate_scheme(
+    conn, size=1000, depth=4, branching=5, polyhierarchy=0.05,
+    related=0.02, collections=10, languages=('nl', 'en', 'fr'),
+    labels_per_concept=2, notes=0.5, matches=0.3, seed=1
+):
+    '''
+    Generate a conceptscheme.
+
+    The concepts form a forest. Every concept has up to `branching`
+    narrower concepts and no tree is more than `depth` levels deep. When
+    `size` concepts don't fit in one tree, more trees are added.
+
+    :param conn: A :class:`sqlalchemy.engine.Connection`. The languages,
+        labeltypes, notetypes and matchtypes need to be present in the
+        database already, see
+        :class:`skosprovider_sqlalchemy.models.Initialiser`.
+    :param int size: Number of concepts.
+    :param int depth: Maximum depth of the hierarchy.
+    :param int branching: Number of narrower concepts per concept.
+    :param float polyhierarchy: Fraction of concepts that get a second
+        broader concept.
+    :param float related: Fraction of concepts that get a related concept.
+    :param int collections: Number of collections. Each collection is placed
+        under a random concept and gets up to `branching` random members
+        from the levels below that concept.
+    :param list languages: Languages of the labels. Every concept gets a
+        prefLabel in every language.
+    :param int labels_per_concept: Number of labels per concept and
+        language. Labels beyond the first one are altLabels.
+    :param float notes: Fraction of concepts that get a definition.
+    :param float matches: Fraction of concepts that get a match.
+    :param int seed: Seed for the random number generator.
+    :return: The id of the new conceptscheme.
+    '''
+    if size < 1 or depth < 1 or branching < 1:
+        raise ValueError(
+            'Please provide a positive size, depth and branching factor.'
+        )
+    rnd = random.Random(seed)
+    cs_id = _next_id(conn, ConceptScheme.id)
+    conn.execute(
+        ConceptScheme.__table__.insert(),
+        [{'id': cs_id, 'uri': 'urn:x-skosprovider:synthetic:%d' % cs_id}]
+    )
+    conn.execute(conceptscheme_language.insert(), [
+        {'conceptscheme_id': cs_id, 'language_id': lan} for lan in languages
+    ])
+
+    roots, starts = _levels(size, depth, branching)
+    direct = has_owner_columns(conn)
+    first_id = _next_id(conn, Thing.id)
+    ids = {
+        'label': _next_id(conn, Label.id),
+        'note': _next_id(conn, Note.id)
+    }
+
+    def _thing(i, type, **kwargs):
+        return dict(
+            id=first_id + i,
+            type=type,
+            concept_id=str(i + 1),
+            uri='urn:x-skosprovider:synthetic:%d:%d' % (cs_id, i + 1),
+            conceptscheme_id=cs_id,
+            **kwargs
+        )
+
+    def owner(thing):
+        return {'concept_id': thing['id']} if direct else {}
+
+    def _write(things):
+        labels, label_links = [], []
+        note_rows, note_links = [], []
+        for t in things:
+            for lan in languages:
+                for n in range(labels_per_concept):
+                    labels.append({
+                        'id': ids['label'],
+                        'label': _text(rnd, rnd.randint(1, 3)),
+                        'labeltype_id': 'prefLabel' if n == 0 else 'altLabel',
+                        'language_id': lan,
+                        **owner(t)
+                    })
+                    label_links.append(
+                        {'concept_id': t['id'], 'label_id': ids['label']}
+                    )
+                    ids['label'] += 1
+            if t['type'] == 'concept' and rnd.random() < notes:
+                note_rows.append({
+                    'id': ids['note'],
+                    'note': _text(rnd, rnd.randint(5, 20)) + '.',
+                    'notetype_id': 'definition',
+                    'language_id': languages[0],
+                    **owner(t)
+                })
+                note_links.append({'concept_id': t['id'], 'note_id': ids['note']})
+                ids['note'] += 1
+        conn.execute(Thing.__table__.insert(), things)
+        conn.execute(Label.__table__.insert(), labels)
+        conn.execute(concept_label.insert(), label_links)
+        if note_rows:
+            conn.execute(Note.__table__.insert(), note_rows)
+            conn.execute(concept_note.insert(), note_links)
+
+    for start in range(0, size, CHUNK_SIZE):
+        chunk = range(start, min(size, start + CHUNK_SIZE))
+        _write([_thing(i, 'concept') for i in chunk])
+        hierarchy, relations, match_rows = [], [], []
+        for i in chunk:
+            if i >= roots:
+                parent = (i - roots) // branching
+                hierarchy.append((parent, i))
+                if rnd.random() < polyhierarchy:
+                    # Another concept on the level of the parent, so the
+                    # hierarchy doesn't get any cycles.
+                    level = bisect.bisect_right(starts, parent) - 1
+                    other = rnd.randrange(starts[level], starts[level + 1])
+                    if other != parent:
+                        hierarchy.append((other, i))
+            if i > 0 and rnd.random() < related:
+                relations.append((i, rnd.randrange(i)))
+            if rnd.random() < matches:
+                match_rows.append({
+                    'concept_id': first_id + i,
+                    'matchtype_id': rnd.choice(MATCHTYPES),
+                    'uri': 'http://example.org/synthetic/%d' % rnd.randrange(10 * size)
+                })
+        if hierarchy:
+            conn.execute(concept_hierarchy_concept.insert(), [
+                {
+                    'concept_id_broader': first_id + parent,
+                    'concept_id_narrower': first_id + child
+                } for parent, child in hierarchy
+            ])
+        if relations:
+            conn.execute(concept_related_concept.insert(), [
+                {
+                    'concept_id_from': first_id + a,
+                    'concept_id_to': first_id + b
+                } for a, b in relations
+            ])
+        if match_rows:
+            conn.execute(Match.__table__.insert(), match_rows)
+
+    if collections:
+        _write([
+            _thing(size + i, 'collection', infer_concept_relations=True)
+            for i in range(collections)
+        ])
+        # Concepts on deeper levels are never ancestors of the parent of a
+        # collection, so its members don't introduce cycles.
+        parents = range(starts[-2]) if len(starts) > 2 else range(size)
+        hierarchy_collection, members = [], []
+        for i in range(collections):
+            collection_id = first_id + size + i
+            parent = rnd.choice(parents)
+            hierarchy_collection.append({
+                'concept_id_broader': first_id + parent,
+                'collection_id_narrower': collection_id
+            })
+            level = bisect.bisect_right(starts, parent) - 1
+            candidates = range(starts[level + 1], size)
+            for member in rnd.sample(candidates, min(branching, len(candidates))):
+                members.append({
+                    'collection_id': collection_id,
+                    'concept_id': first_id + member
+                })
+        conn.execute(concept_hierarchy_collection.insert(), hierarchy_collection)
+        if members:
+            conn.execute(collection_concept.insert(), members)
+    reset_sequences(conn)
+    return cs_id
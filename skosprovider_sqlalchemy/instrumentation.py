@@ -0,0 +1,172 @@
+'''
+Instrumentation for :class:`skosprovider_sqlalchemy.providers.SQLAlchemyProvider`.
+
+When a provider is created with an `instrumentation` callback, every call
+to one of its public methods is measured. Once the call has finished, the
+callback receives a :class:`ProviderCallStats` with the results. This makes
+it possible to export the measurements to a metrics system and to catch
+calls that issue more SQL than expected.
+'''
+import contextlib
+import contextvars
+import functools
+import inspect
+import logging
+import time
+
+from sqlalchemy import event
+
+log = logging.getLogger(__name__)
+
+_stats = contextvars.ContextVar('provider_call_stats', default=None)
+
+
+class ProviderCallStats:
+    '''
+    Measurements for a single call to a provider method.
+    '''
+
+    __slots__ = (
+        'provider', 'method', 'duration', 'statements', 'rows', 'objects'
+    )
+
+    def __init__(self, provider, method):
+        self.provider = provider
+        '''The provider that was called.'''
+        self.method = method
+        '''The name of the method that was called.'''
+        self.duration = 0.0
+        '''Wall time of the call, in seconds.'''
+        self.statements = 0
+        '''Number of SQL statements sent to the database.'''
+        self.rows = 0
+        '''
+        Number of rows returned by the call, eg. the concepts in a list
+        or the items yielded by a generator.
+        '''
+        self.objects = 0
+        '''Number of model instances loaded from the database.'''
+
+    def __repr__(self):
+        return (
+            'ProviderCallStats(%s.%s, duration=%.6f, statements=%d, '
+            'rows=%d, objects=%d)' % (
+                self.provider.get_vocabulary_id(), self.method, self.duration,
+                self.statements, self.rows, self.objects
+            )
+        )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _stats.get()
+    if stats is not None:
+        stats.statements += 1
+
+
+def _count_rows(result):
+    '''
+    Count the rows returned by a provider method: the items of a list or
+    :class:`dict`, one for a single concept or collection and none for
+    `None` or `False`.
+    '''
+    if result is None or result is False:
+        return 0
+    if isinstance(result, (list, tuple, set, dict)):
+        return len(result)
+    return 1
+
+
+def _loaded_as_persistent(session, instance):
+    stats = _stats.get()
+    if stats is not None:
+        stats.objects += 1
+
+
+def listen(session):
+    '''
+    Register the event listeners that measure the work done by a session.
+
+    Registering the listeners more than once has no effect.
+
+    :param session: A :class:`sqlalchemy.orm.session.Session`.
+    '''
+    engine = session.get_bind()
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    if not event.contains(session, 'loaded_as_persistent', _loaded_as_persistent):
+        event.listen(session, 'loaded_as_persistent', _loaded_as_persistent)
+
+
+@contextlib.contextmanager
+def _measure(stats):
+    '''
+    Count the work done in the block towards `stats`.
+
+    The stats are only current while the block runs, so work done by other
+    code in between two blocks is never counted, not even on the same
+    thread.
+    '''
+    token = _stats.set(stats)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.duration += time.perf_counter() - start
+        _stats.reset(token)
+
+
+def _report(provider, stats):
+    try:
+        provider.instrumentation(stats)
+    except Exception:
+        log.exception('Instrumentation callback failed for %r.' % stats)
+
+
+def instrumented(method):
+    '''
+    Decorate a provider method so its calls are measured.
+
+    Nothing is measured unless the provider has an `instrumentation`
+    callback. Calls made while another call is being measured are counted
+    as part of that call. For generators, the measurement covers the work
+    done to produce each item, but not what the caller does in between.
+    The stats are reported when the generator is exhausted, closed or
+    garbage collected.
+    '''
+    if inspect.isgeneratorfunction(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.instrumentation is None or _stats.get() is not None:
+                yield from method(self, *args, **kwargs)
+                return
+            listen(self.session)
+            stats = ProviderCallStats(self, method.__name__)
+            gen = method(self, *args, **kwargs)
+            try:
+                while True:
+                    with _measure(stats):
+                        try:
+                            item = next(gen)
+                        except StopIteration:
+                            return
+                    stats.rows += 1
+                    yield item
+            finally:
+                with _measure(stats):
+                    gen.close()
+                _report(self, stats)
+    else:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.instrumentation is None or _stats.get() is not None:
+                return method(self, *args, **kwargs)
+            listen(self.session)
+            stats = ProviderCallStats(self, method.__name__)
+            try:
+                with _measure(stats):
+                    res = method(self, *args, **kwargs)
+                stats.rows = _count_rows(res)
+                return res
+            finally:
+                _report(self, stats)
+    return wrapper
@@ -0,0 +1,774 @@
+'''
+Load SKOS dumps straight into the model tables.
+
+:func:`skosprovider_sqlalchemy.utils.import_provider` needs a
+:class:`skosprovider.providers.VocabularyProvider`, which means holding the
+entire vocabulary in memory before it can be imported. The loaders in this
+module read a dump line by line instead. The statements that matter are
+copied into a temporary staging table in chunks, after which the concepts,
+labels, notes, sources, matches and relations are built from the staging
+table with one `INSERT ... SELECT` statement each. Memory use stays the same
+no matter how large the dump is.
+'''
+import csv
+import io
+import re
+
+from language_tags import tags
+from sqlalchemy import Column
+from sqlalchemy import Index
+from sqlalchemy import Integer
+from sqlalchemy import String
+from sqlalchemy import Table
+from sqlalchemy import Text
+from sqlalchemy import and_
+from sqlalchemy import case
+from sqlalchemy import cast
+from sqlalchemy import func
+from sqlalchemy import literal
+from sqlalchemy import null
+from sqlalchemy import select
+from sqlalchemy import union
+
+from skosprovider_sqlalchemy.bulk import removed_ids
+from skosprovider_sqlalchemy.bulk import reset_sequences
+from skosprovider_sqlalchemy.bulk import temporary_metadata
+from skosprovider_sqlalchemy.bulk import temporary_table
+from skosprovider_sqlalchemy.models import ConceptScheme
+from skosprovider_sqlalchemy.models import Label
+from skosprovider_sqlalchemy.models import Language
+from skosprovider_sqlalchemy.models import Match
+from skosprovider_sqlalchemy.models import Note
+from skosprovider_sqlalchemy.models import Source
+from skosprovider_sqlalchemy.models import Thing
+from skosprovider_sqlalchemy.models import collection_concept
+from skosprovider_sqlalchemy.models import concept_hierarchy_collection
+from skosprovider_sqlalchemy.models import concept_hierarchy_concept
+from skosprovider_sqlalchemy.models import concept_label
+from skosprovider_sqlalchemy.models import concept_note
+from skosprovider_sqlalchemy.models import concept_related_concept
+from skosprovider_sqlalchemy.models import concept_source
+from skosprovider_sqlalchemy.models import conceptscheme_label
+from skosprovider_sqlalchemy.models import conceptscheme_language
+from skosprovider_sqlalchemy.models import conceptscheme_note
+from skosprovider_sqlalchemy.models import conceptscheme_source
+from skosprovider_sqlalchemy.models import has_owner_columns
+
+CHUNK_SIZE = 5000
+'''
+The number of statements that are written to the staging table at once.
+'''
+
+RDF = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'
+SKOS = 'http://www.w3.org/2004/02/skos/core#'
+SKOS_THES = 'http://purl.org/iso25964/skos-thes#'
+DCTERMS = 'http://purl.org/dc/terms/'
+
+_PREDICATES = {RDF + 'type': ('type', None)}
+for _name in ('prefLabel', 'altLabel', 'hiddenLabel'):
+    _PREDICATES[SKOS + _name] = ('label', _name)
+for _name in (
+    'note', 'changeNote', 'definition', 'editorialNote',
+    'example', 'historyNote', 'scopeNote'
+):
+    _PREDICATES[SKOS + _name] = ('note', _name)
+for _name in ('close', 'exact', 'broad', 'narrow', 'related'):
+    _PREDICATES[SKOS + _name + 'Match'] = ('match', _name + 'Match')
+for _name in ('broader', 'narrower', 'related', 'member'):
+    _PREDICATES[SKOS + _name] = ('relation', _name)
+for _name in ('subordinateArray', 'superOrdinate'):
+    _PREDICATES[SKOS_THES + _name] = ('relation', _name)
+_PREDICATES[DCTERMS + 'identifier'] = ('identifier', None)
+_PREDICATES[DCTERMS + 'source'] = ('source', None)
+_PREDICATES[DCTERMS + 'bibliographicCitation'] = ('citation', None)
+
+_staging = Table(
+    'skos_load_statement',
+    temporary_metadata,
+    Column('id', Integer, primary_key=True),
+    Column('subject', String(512), nullable=False),
+    Column('kind', String(20), nullable=False),
+    Column('name', String(20)),
+    Column('object', Text, nullable=False),
+    Column('language', String(64)),
+    Column('markup', String(20)),
+    prefixes=['TEMPORARY'],
+    postgresql_on_commit='DROP'
+)
+Index('ix_skos_load_statement_subject_kind', _staging.c.subject, _staging.c.kind)
+Index('ix_skos_load_statement_kind', _staging.c.kind)
+
+_IRI = r'<([^>]*)>'
+_BNODE = r'(_:[A-Za-z0-9_\-.]+)'
+_LITERAL = r'"((?:[^"\\]|\\.)*)"(?:@([A-Za-z]+(?:-[A-Za-z0-9]+)*)|\^\^<([^>]*)>)?'
+
+_STATEMENT = re.compile(
+    r'\s*(?:%s|%s)\s*%s\s*(?:%s|%s|%s)\s*\.\s*(?:#.*)?$' % (
+        _IRI, _BNODE, _IRI, _IRI, _BNODE, _LITERAL
+    )
+)
+
+_ESCAPE = re.compile(r'\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))')
+
+_ESCAPES = {
+    't': '\t', 'b': '\b', 'n': '\n', 'r': '\r', 'f': '\f',
+    '"': '"', "'": "'", '\\': '\\'
+}
+
+
+def _unescape(value):
+    def _replace(m):
+        if m.group(3):
+            return _ESCAPES.get(m.group(3), m.group(0))
+        return chr(int(m.group(1) or m.group(2), 16))
+    return _ESCAPE.sub(_replace, value) if '\\' in value else value
+
+
+def parse_ntriples(lines):
+    '''
+    Parse N-Triples one line at a time.
+
+    :param lines: An iterable of lines, eg. a file opened in text mode.
+    :rtype: A generator of `(subject, predicate, object, language,
+        datatype)` tuples. `language` and `datatype` are only set for
+        literals. Blank nodes keep their `_:` prefix. For an object that is
+        not a literal, `datatype` is `None` and `language` is `False`.
+    :raises ValueError: When a line is not a valid statement.
+    '''
+    for number, line in enumerate(lines, 1):
+        stripped = line.strip()
+        if not stripped or stripped.startswith('#'):
+            continue
+        m = _STATEMENT.match(stripped)
+        if not m:
+            raise ValueError('Invalid N-Triples on line %d: %s' % (number, stripped))
+        (
+            s_iri, s_bnode, predicate, o_iri, o_bnode,
+            value, language, datatype
+        ) = m.groups()
+        subject = _unescape(s_iri) if s_iri is not None else s_bnode
+        if value is not None:
+            yield (
+                subject, _unescape(predicate), _unescape(value),
+                language, datatype and _unescape(datatype)
+            )
+        else:
+            obj = _unescape(o_iri) if o_iri is not None else o_bnode
+            yield subject, _unescape(predicate), obj, False, None
+
+
+def _statements(triples):
+    '''
+    Turn the triples that matter into rows for the staging table.
+    '''
+    for subject, predicate, obj, language, datatype in triples:
+        kind, name = _PREDICATES.get(predicate, (None, None))
+        if kind is None:
+            continue
+        literal_value = language is not False
+        if (kind in ('label', 'note', 'citation', 'identifier')) != literal_value:
+            continue
+        yield {
+            'subject': subject,
+            'kind': kind,
+            'name': name,
+            'object': obj,
+            'language': (language or 'und') if kind in ('label', 'note') else None,
+            'markup': 'HTML' if datatype == RDF + 'HTML' else None
+        }
+
+
+def _max_id(conn, column):
+    return conn.execute(select(func.max(column))).scalar() or 0
+
+
+def _stage(conn, table, rows, chunk_size):
+    '''
+    Write rows to a staging table in chunks.
+
+    On PostgreSQL the rows are sent with `COPY ... FROM STDIN`, elsewhere
+    with an `executemany`.
+
+    :param table: The staging table.
+    :param rows: An iterable of dicts with a value for every column of the
+        table except the `id`.
+    '''
+    columns = [c.name for c in table.columns if c.name != 'id']
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            _write_chunk(conn, table, columns, chunk)
+            chunk = []
+    if chunk:
+        _write_chunk(conn, table, columns, chunk)
+
+
+def _write_chunk(conn, table, columns, chunk):
+    if conn.dialect.name != 'postgresql':
+        conn.execute(table.insert(), chunk)
+        return
+    sql = 'COPY %s (%s) FROM STDIN' % (table.name, ', '.join(columns))
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):
+            # psycopg2
+            buffer = io.StringIO(''.join(
+                '\t'.join(_copy_value(row[c]) for c in columns) + '\n'
+                for row in chunk
+            ))
+            cursor.copy_expert(sql, buffer)
+        else:
+            # psycopg 3
+            with cursor.copy(sql) as copy:
+                for row in chunk:
+                    copy.write_row([row[c] for c in columns])
+    finally:
+        cursor.close()
+
+
+def _copy_value(value):
+    '''
+    Format a value for the text format of `COPY`.
+    '''
+    if value is None:
+        return '\\N'
+    return (
+        str(value).replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+def _add_languages(conn, used):
+    '''
+    Add languages that are not yet present to the language table.
+
+    :param list used: The ids of the languages.
+    :raises ValueError: When one of the languages is not a valid tag.
+    '''
+    known = set(conn.execute(
+        select(Language.id).where(Language.id.in_(used))
+    ).scalars())
+    missing = [language for language in used if language not in known]
+    for language in missing:
+        if not tags.check(language):
+            raise ValueError(
+                'Unable to load the dump. Invalid language tag: %s' % language
+            )
+    if missing:
+        conn.execute(Language.__table__.insert(), [
+            {'id': language, 'name': ', '.join(tags.description(language))}
+            for language in missing
+        ])
+
+
+def _owned(kind, owners):
+    '''
+    Select the staged statements of a kind together with the internal id of
+    their subject.
+    '''
+    return (
+        select(owners.c.id.label('owner_id'), _staging)
+        .select_from(_staging)
+        .join(owners, owners.c.uri == _staging.c.subject)
+        .where(_staging.c.kind == kind)
+    )
+
+
+def _concept_id(conn, owner_id, column):
+    '''
+    The `concept_id` of a label, note or source: its owner when that is a
+    concept or collection, `NULL` when it is the conceptscheme.
+
+    :rtype: A :class:`dict` with the column to insert, empty when the
+        database has no such column.
+    '''
+    if not has_owner_columns(conn):
+        return {}
+    return {'concept_id': owner_id if column == 'concept_id' else null()}
+
+
+def _load_descriptions(conn, owners, links, offsets):
+    '''
+    Insert the labels, notes and sources of the staged subjects.
+
+    :param owners: A selectable with the `id` and `uri` of the subjects.
+    :param dict links: The association tables for `label`, `note` and
+        `source`, and the name of the column that refers to the subject.
+    :param dict offsets: The offset to add to a staging id to get the id of
+        a new label, note or source.
+    '''
+    table, column = links['label']
+    labels = _owned('label', owners).subquery()
+    owner = _concept_id(conn, labels.c.owner_id, column)
+    conn.execute(Label.__table__.insert().from_select(
+        ['id', 'label', 'labeltype_id', 'language_id'] + list(owner),
+        select(
+            labels.c.id + offsets['label'], labels.c.object,
+            labels.c.name, labels.c.language, *owner.values()
+        )
+    ))
+    conn.execute(table.insert().from_select(
+        [column, 'label_id'],
+        select(labels.c.owner_id, labels.c.id + offsets['label'])
+    ))
+    table, column = links['note']
+    notes = _owned('note', owners).subquery()
+    owner = _concept_id(conn, notes.c.owner_id, column)
+    conn.execute(Note.__table__.insert().from_select(
+        ['id', 'note', 'notetype_id', 'language_id', 'markup'] + list(owner),
+        select(
+            notes.c.id + offsets['note'], notes.c.object, notes.c.name,
+            notes.c.language, notes.c.markup, *owner.values()
+        )
+    ))
+    conn.execute(table.insert().from_select(
+        [column, 'note_id'],
+        select(notes.c.owner_id, notes.c.id + offsets['note'])
+    ))
+    table, column = links['source']
+    citation = _staging.alias()
+    sources = (
+        select(
+            owners.c.id.label('owner_id'),
+            citation.c.id,
+            citation.c.object,
+            citation.c.markup
+        )
+        .select_from(_staging)
+        .join(owners, owners.c.uri == _staging.c.subject)
+        .join(citation, and_(
+            citation.c.subject == _staging.c.object,
+            citation.c.kind == 'citation'
+        ))
+        .where(_staging.c.kind == 'source')
+        .subquery()
+    )
+    owner = _concept_id(conn, sources.c.owner_id, column)
+    conn.execute(Source.__table__.insert().from_select(
+        ['id', 'citation', 'markup'] + list(owner),
+        select(
+            sources.c.id + offsets['source'], sources.c.object,
+            sources.c.markup, *owner.values()
+        )
+    ))
+    conn.execute(table.insert().from_select(
+        [column, 'source_id'],
+        select(sources.c.owner_id, sources.c.id + offsets['source'])
+    ))
+
+
+def _relation(subjects, objects, name, reverse=False):
+    source = subjects.alias()
+    target = objects.alias()
+    columns = (target.c.id, source.c.id) if reverse else (source.c.id, target.c.id)
+    return (
+        select(*columns)
+        .select_from(_staging)
+        .join(source, source.c.uri == _staging.c.subject)
+        .join(target, target.c.uri == _staging.c.object)
+        .where(_staging.c.kind == 'relation', _staging.c.name == name)
+    )
+
+
+def _load_relations(conn, things):
+    concepts = select(things.c.id, things.c.uri).where(
+        things.c.type == 'concept'
+    ).subquery()
+    collections = select(things.c.id, things.c.uri).where(
+        things.c.type == 'collection'
+    ).subquery()
+    for table, columns, selects in (
+        (
+            concept_hierarchy_concept,
+            ['concept_id_broader', 'concept_id_narrower'],
+            [
+                _relation(concepts, concepts, 'narrower'),
+                _relation(concepts, concepts, 'broader', reverse=True),
+            ]
+        ),
+        (
+            concept_related_concept,
+            ['concept_id_from', 'concept_id_to'],
+            [
+                _relation(concepts, concepts, 'related'),
+                _relation(concepts, concepts, 'related', reverse=True),
+            ]
+        ),
+        (
+            collection_concept,
+            ['collection_id', 'concept_id'],
+            [_relation(collections, things, 'member')]
+        ),
+        (
+            concept_hierarchy_collection,
+            ['concept_id_broader', 'collection_id_narrower'],
+            [
+                _relation(concepts, collections, 'subordinateArray'),
+                _relation(collections, concepts, 'superOrdinate', reverse=True),
+            ]
+        ),
+    ):
+        relations = union(*selects).subquery()
+        conn.execute(table.insert().from_select(
+            columns, select(*relations.c)
+        ))
+
+
+def load_ntriples(conn, lines, conceptscheme_id=None, chunk_size=CHUNK_SIZE):
+    '''
+    Load a SKOS dump in N-Triples format into the database.
+
+    Concepts, collections and the conceptscheme are recognised by their
+    `rdf:type`. Their labels, notes, sources (`dcterms:source` with a
+    `dcterms:bibliographicCitation`), matches, hierarchical, associative and
+    collection relations are loaded as well. Relations to concepts that are
+    not part of the dump are dropped. The `dcterms:identifier` of a concept
+    is used as its id. Concepts without one get their internal id.
+
+    :param conn: A :class:`sqlalchemy.engine.Connection`. All rows are
+        written in its current transaction.
+    :param lines: An iterable of lines, eg. a file opened in text mode.
+    :param int conceptscheme_id: The conceptscheme to load the dump into.
+        This should be an empty scheme so that there are no possible id
+        clashes. When `None`, a conceptscheme is created with the
+        :term:`URI` of the `skos:ConceptScheme` in the dump.
+    :param int chunk_size: How many statements to stage at once.
+    :return: The id of the conceptscheme.
+    :raises ValueError: When the dump is not valid N-Triples, uses an
+        invalid language tag or doesn't describe a conceptscheme when one is
+        needed.
+    '''
+    with temporary_table(conn, _staging):
+        _stage(conn, _staging, _statements(parse_ntriples(lines)), chunk_size)
+        return _load_staged(conn, conceptscheme_id)
+
+
+def _load_staged(conn, conceptscheme_id):
+    scheme_uri = conn.execute(
+        select(_staging.c.subject)
+        .where(
+            _staging.c.kind == 'type',
+            _staging.c.object == SKOS + 'ConceptScheme'
+        )
+        .order_by(_staging.c.id)
+        .limit(1)
+    ).scalar()
+    if conceptscheme_id is None:
+        if scheme_uri is None:
+            raise ValueError(
+                'Unable to load the dump. It does not describe a '
+                'skos:ConceptScheme.'
+            )
+        conceptscheme_id = _max_id(conn, ConceptScheme.id) + 1
+        conn.execute(
+            ConceptScheme.__table__.insert(),
+            [{'id': conceptscheme_id, 'uri': scheme_uri}]
+        )
+    _add_languages(conn, conn.execute(
+        select(_staging.c.language).distinct()
+        .where(_staging.c.language.is_not(None))
+    ).scalars().all())
+    offsets = {
+        'label': _max_id(conn, Label.id),
+        'note': _max_id(conn, Note.id),
+        'source': _max_id(conn, Source.id),
+    }
+    scheme = select(
+        literal(conceptscheme_id, Integer).label('id'),
+        literal(scheme_uri, String).label('uri')
+    ).subquery()
+    _load_descriptions(conn, scheme, {
+        'label': (conceptscheme_label, 'conceptscheme_id'),
+        'note': (conceptscheme_note, 'conceptscheme_id'),
+        'source': (conceptscheme_source, 'conceptscheme_id'),
+    }, offsets)
+
+    thing_offset = _max_id(conn, Thing.id)
+    typed = (
+        select(
+            _staging.c.subject,
+            func.min(_staging.c.id).label('id'),
+            case(
+                (_staging.c.object == SKOS + 'Collection', 'collection'),
+                else_='concept'
+            ).label('type')
+        )
+        .where(
+            _staging.c.kind == 'type',
+            _staging.c.object.in_([SKOS + 'Concept', SKOS + 'Collection'])
+        )
+        .group_by(_staging.c.subject, _staging.c.object)
+        .subquery()
+    )
+    identifier = _staging.alias()
+    conn.execute(Thing.__table__.insert().from_select(
+        ['id', 'type', 'concept_id', 'uri', 'conceptscheme_id'],
+        select(
+            typed.c.id + thing_offset,
+            typed.c.type,
+            func.coalesce(
+                select(func.min(identifier.c.object))
+                .where(
+                    identifier.c.subject == typed.c.subject,
+                    identifier.c.kind == 'identifier'
+                )
+                .scalar_subquery(),
+                cast(typed.c.id + thing_offset, String)
+            ),
+            typed.c.subject,
+            literal(conceptscheme_id, Integer)
+        )
+    ))
+    thing_table = Thing.__table__
+    things = (
+        select(thing_table.c.id, thing_table.c.uri, thing_table.c.type)
+        .where(
+            thing_table.c.conceptscheme_id == conceptscheme_id,
+            thing_table.c.id > thing_offset
+        )
+        .subquery()
+    )
+    _load_descriptions(conn, things, {
+        'label': (concept_label, 'concept_id'),
+        'note': (concept_note, 'concept_id'),
+        'source': (concept_source, 'concept_id'),
+    }, offsets)
+    matches = (
+        _owned('match', things)
+        .where(things.c.type == 'concept')
+        .with_only_columns(things.c.id, _staging.c.name, _staging.c.object)
+        .distinct()
+        .subquery()
+    )
+    conn.execute(Match.__table__.insert().from_select(
+        ['concept_id', 'matchtype_id', 'uri'], select(*matches.c)
+    ))
+    _load_relations(conn, things)
+
+    languages = (
+        select(_staging.c.language).distinct()
+        .where(
+            _staging.c.kind == 'label',
+            _staging.c.language.not_in(
+                select(conceptscheme_language.c.language_id)
+                .where(conceptscheme_language.c.conceptscheme_id == conceptscheme_id)
+            )
+        )
+        .subquery()
+    )
+    conn.execute(conceptscheme_language.insert().from_select(
+        ['conceptscheme_id', 'language_id'],
+        select(literal(conceptscheme_id, Integer), languages.c.language)
+    ))
+    reset_sequences(conn)
+    return conceptscheme_id
+
+
+_csv_staging = Table(
+    'skos_load_row',
+    temporary_metadata,
+    Column('id', Integer, primary_key=True),
+    Column('concept_id', String(512), nullable=False),
+    Column('uri', String(512)),
+    Column('label', Text),
+    Column('note', Text),
+    Column('citation', Text),
+    prefixes=['TEMPORARY'],
+    postgresql_on_commit='DROP'
+)
+Index('ix_skos_load_row_concept_id', _csv_staging.c.concept_id)
+
+
+def _csv_rows(rows, uri_generator):
+    for row in rows:
+        if not row or not row[0].strip():
+            continue
+        row = list(row) + [''] * (4 - len(row))
+        concept_id = row[0].strip()
+        yield {
+            'concept_id': concept_id,
+            'uri': uri_generator.generate(type='concept', id=concept_id)
+            if uri_generator else None,
+            'label': row[1] or None,
+            'note': row[2] or None,
+            'citation': row[3] or None,
+        }
+
+
+def load_csv(
+    conn, lines, conceptscheme_id, language='und', delimiter=',',
+    header=False, uri_generator=None, chunk_size=CHUNK_SIZE
+):
+    '''
+    Load or update a flat list of concepts from a CSV or TSV file.
+
+    The file uses the format of :class:`skosprovider.providers.SimpleCsvProvider`:
+    `<id>,<prefLabel>,<note>,<source>`. The note and source are optional.
+    The rows are staged with `COPY` on PostgreSQL and an `executemany`
+    elsewhere, and merged into the model tables with set-based statements.
+
+    Concepts that are not yet present in the conceptscheme are added. For
+    concepts that are, the prefLabel and note in `language` and all sources
+    are replaced by those in the file. When an id is present more than once,
+    the last row wins.
+
+    :param conn: A :class:`sqlalchemy.engine.Connection`. All rows are
+        written in its current transaction.
+    :param lines: An iterable of lines, eg. a file opened in text mode with
+        `newline=''`.
+    :param int conceptscheme_id: The id of an existing conceptscheme.
+    :param str language: The language of the labels and notes.
+    :param str delimiter: The delimiter, eg. `\\t` for TSV files.
+    :param bool header: Skip the first row.
+    :param uri_generator: A :class:`skosprovider.uri.UriGenerator` to store
+        the :term:`URI` of every concept with. When `None`, no :term:`URIs
+        <URI>` are stored and providers generate them when needed.
+    :param int chunk_size: How many rows to stage at once.
+    :return: A :class:`dict` with the number of concepts that were
+        `created` and `updated`.
+    :raises ValueError: When the conceptscheme doesn't exist or the language
+        is not a valid tag.
+    '''
+    if conn.execute(
+        select(ConceptScheme.id).where(ConceptScheme.id == conceptscheme_id)
+    ).scalar() is None:
+        raise ValueError('Conceptscheme %s does not exist.' % conceptscheme_id)
+    _add_languages(conn, [language])
+    rows = csv.reader(lines, delimiter=delimiter)
+    if header:
+        next(rows, None)
+    with temporary_table(conn, _csv_staging), temporary_table(conn, removed_ids):
+        _stage(conn, _csv_staging, _csv_rows(rows, uri_generator), chunk_size)
+        return _merge_rows(conn, conceptscheme_id, language)
+
+
+def _merge_rows(conn, conceptscheme_id, language):
+    staged = _csv_staging
+    thing = Thing.__table__
+    latest = (
+        select(staged)
+        .where(staged.c.id.in_(
+            select(func.max(staged.c.id)).group_by(staged.c.concept_id)
+        ))
+        .subquery()
+    )
+    existing = (
+        select(thing.c.id, thing.c.concept_id)
+        .where(
+            thing.c.conceptscheme_id == conceptscheme_id,
+            thing.c.concept_id.in_(select(latest.c.concept_id))
+        )
+    )
+
+    # Remove what the file replaces from the existing concepts.
+    for owned, link, column, filters in (
+        (
+            Label, concept_label, 'label_id',
+            (Label.labeltype_id == 'prefLabel', Label.language_id == language)
+        ),
+        (
+            Note, concept_note, 'note_id',
+            (Note.notetype_id == 'note', Note.language_id == language)
+        ),
+        (Source, concept_source, 'source_id', ()),
+    ):
+        ids = (
+            select(owned.id)
+            .join(link, link.c[column] == owned.id)
+            .where(
+                link.c.concept_id.in_(existing.with_only_columns(thing.c.id)),
+                *filters
+            )
+        )
+        conn.execute(removed_ids.delete())
+        conn.execute(removed_ids.insert().from_select(['id'], ids))
+        conn.execute(link.delete().where(
+            link.c[column].in_(select(removed_ids.c.id))
+        ))
+        conn.execute(owned.__table__.delete().where(
+            owned.__table__.c.id.in_(select(removed_ids.c.id))
+        ))
+    updated = conn.execute(
+        select(func.count()).select_from(existing.subquery())
+    ).scalar()
+    conn.execute(
+        thing.update()
+        .where(
+            thing.c.conceptscheme_id == conceptscheme_id,
+            thing.c.concept_id.in_(
+                select(latest.c.concept_id).where(latest.c.uri.is_not(None))
+            )
+        )
+        .values(uri=(
+            select(latest.c.uri)
+            .where(latest.c.concept_id == thing.c.concept_id)
+            .scalar_subquery()
+        ))
+    )
+
+    thing_offset = _max_id(conn, Thing.id)
+    new = conn.execute(thing.insert().from_select(
+        ['id', 'type', 'concept_id', 'uri', 'conceptscheme_id'],
+        select(
+            latest.c.id + thing_offset,
+            literal('concept', String),
+            latest.c.concept_id,
+            latest.c.uri,
+            literal(conceptscheme_id, Integer)
+        ).where(~latest.c.concept_id.in_(
+            existing.with_only_columns(thing.c.concept_id)
+        ))
+    )).rowcount
+
+    owners = (
+        select(thing.c.id.label('owner_id'), latest)
+        .join(latest, and_(
+            latest.c.concept_id == thing.c.concept_id,
+            thing.c.conceptscheme_id == conceptscheme_id
+        ))
+        .subquery()
+    )
+    for owned, link, column, values in (
+        (
+            Label, concept_label, 'label_id',
+            {
+                'label': owners.c.label,
+                'labeltype_id': literal('prefLabel', String),
+                'language_id': literal(language, String),
+            }
+        ),
+        (
+            Note, concept_note, 'note_id',
+            {
+                'note': owners.c.note,
+                'notetype_id': literal('note', String),
+                'language_id': literal(language, String),
+            }
+        ),
+        (Source, concept_source, 'source_id', {'citation': owners.c.citation}),
+    ):
+        offset = _max_id(conn, owned.id)
+        present = next(iter(values.values())).is_not(None)
+        values.update(_concept_id(conn, owners.c.owner_id, 'concept_id'))
+        conn.execute(owned.__table__.insert().from_select(
+            ['id'] + list(values),
+            select(owners.c.id + offset, *values.values()).where(present)
+        ))
+        conn.execute(link.insert().from_select(
+            ['concept_id', column],
+            select(owners.c.owner_id, owners.c.id + offset).where(present)
+        ))
+
+    conn.execute(conceptscheme_language.insert().from_select(
+        ['conceptscheme_id', 'language_id'],
+        select(literal(conceptscheme_id, Integer), literal(language, String))
+        .where(~select(conceptscheme_language).where(
+            conceptscheme_language.c.conceptscheme_id == conceptscheme_id,
+            conceptscheme_language.c.language_id == language
+        ).exists())
+    ))
+    reset_sequences(conn)
+    return {'created': new, 'updated': updated}
@@ -1,16 +1,29 @@
+import itertools
 import logging
+import weakref
+from collections import defaultdict
 
+from language_tags import tags
 from skosprovider.skos import label as skoslabel
 from sqlalchemy import Boolean
 from sqlalchemy import Column
+from sqlalchemy import FetchedValue
 from sqlalchemy import ForeignKey
+from sqlalchemy import Index
 from sqlalchemy import Integer
 from sqlalchemy import String
 from sqlalchemy import Table
 from sqlalchemy import Text
 from sqlalchemy import UniqueConstraint
+from sqlalchemy import and_
+from sqlalchemy import bindparam
+from sqlalchemy import case
 from sqlalchemy import event
+from sqlalchemy import func
+from sqlalchemy import inspect
+from sqlalchemy import or_
 from sqlalchemy import orm
+from sqlalchemy import select
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import backref
 from sqlalchemy.orm import relationship
@@ -22,7 +35,13 @@ concept_label = Table(
     'concept_label',
     Base.metadata,
     Column('concept_id', Integer, ForeignKey('concept.id'), primary_key=True),
-    Column('label_id', Integer, ForeignKey('label.id'), primary_key=True)
+    Column(
+        'label_id',
+        Integer,
+        ForeignKey('label.id'),
+        primary_key=True,
+        index=True
+    )
 )
 
 conceptscheme_label = Table(
@@ -106,7 +125,13 @@ collection_concept = Table(
         ForeignKey('concept.id'),
         primary_key=True
     ),
-    Column('concept_id', Integer, ForeignKey('concept.id'), primary_key=True)
+    Column(
+        'concept_id',
+        Integer,
+        ForeignKey('concept.id'),
+        primary_key=True,
+        index=True
+    )
 )
 
 concept_related_concept = Table(
@@ -122,7 +147,8 @@ concept_related_concept = Table(
         'concept_id_to',
         Integer,
         ForeignKey('concept.id'),
-        primary_key=True
+        primary_key=True,
+        index=True
     )
 )
 
@@ -139,7 +165,8 @@ concept_hierarchy_concept = Table(
         'concept_id_narrower',
         Integer,
         ForeignKey('concept.id'),
-        primary_key=True
+        primary_key=True,
+        index=True
     )
 )
 
@@ -156,7 +183,8 @@ concept_hierarchy_collection = Table(
         'collection_id_narrower',
         Integer,
         ForeignKey('concept.id'),
-        primary_key=True
+        primary_key=True,
+        index=True
     )
 )
 
@@ -168,6 +196,7 @@ class Thing(Base):
     __tablename__ = 'concept'
     __table_args__ = (
         UniqueConstraint('conceptscheme_id', 'concept_id'),
+        Index('ix_concept_uri_conceptscheme_id', 'uri', 'conceptscheme_id'),
     )
     id = Column(Integer, primary_key=True)
     type = Column(String(30))
@@ -209,7 +238,6 @@ class Thing(Base):
         index=True
     )
 
-
     def label(self, language='any'):
         return skoslabel(self.labels, language)
 
@@ -239,6 +267,73 @@ class Thing(Base):
         return self.__class__.__name__ + '-' + str(self.id)
 
 
+_owner_columns = weakref.WeakKeyDictionary()
+
+
+def has_owner_columns(bind, refresh=False):
+    '''
+    Check if the labels, notes and sources in a database have a
+    `concept_id` column.
+
+    Databases created with version 2.2 or older only get these columns when
+    they are upgraded with :func:`skosprovider_sqlalchemy.utils.upgrade_database`.
+    Until then, they are neither read nor written, except by the `direct`
+    :attr:`~skosprovider_sqlalchemy.providers.SQLAlchemyProvider.label_strategy`.
+
+    :param bind: A :class:`sqlalchemy.engine.Engine` or
+        :class:`sqlalchemy.engine.Connection`.
+    :param bool refresh: The answer is cached per engine. Pass `True` to
+        check the database again, eg. after it was upgraded by another
+        process.
+    :rtype: bool
+    '''
+    engine = bind.engine
+    if refresh or engine not in _owner_columns:
+        inspector = inspect(bind)
+        _owner_columns[engine] = all(
+            'concept_id' in [c['name'] for c in inspector.get_columns(name)]
+            for name in ('label', 'note', 'source')
+        )
+    return _owner_columns[engine]
+
+
+def owner_flush_listener(session, flush_context):
+    '''
+    Listener that fills the `concept_id` of the labels, notes and sources
+    that were added to or removed from a concept or collection, once they
+    and their owners have been written. Databases without the column are
+    left alone.
+    '''
+    owned = defaultdict(list)
+    for o in itertools.chain(session.new, session.dirty):
+        if (
+            isinstance(o, (Label, Note, Source))
+            and o not in session.deleted
+            and inspect(o).attrs.concept.history.has_changes()
+        ):
+            owned[type(o)].append(o)
+    if not owned or not has_owner_columns(session.connection()):
+        return
+    for model, items in owned.items():
+        table = model.__table__
+        session.connection().execute(
+            table.update()
+            .where(table.c.id == bindparam('owned_id'))
+            .values(concept_id=bindparam('owner_id')),
+            [
+                {'owned_id': o.id, 'owner_id': o.concept.id if o.concept else None}
+                for o in items
+            ]
+        )
+        for o in items:
+            orm.attributes.set_committed_value(
+                o, 'concept_id', o.concept.id if o.concept else None
+            )
+
+
+event.listen(orm.Session, 'after_flush', owner_flush_listener)
+
+
 class Concept(Thing):
     '''
     A concept as know by :term:`skosprovider:SKOS`.
@@ -414,6 +509,17 @@ class Label(Base):
     :class:`ConceptScheme`.
     '''
     __tablename__ = 'label'
+    __table_args__ = (
+        Index(
+            'ix_label_concept_id_language_id_labeltype_id',
+            'concept_id', 'language_id', 'labeltype_id'
+        ),
+    )
+    __mapper_args__ = {
+        # The concept_id is filled after the insert, by
+        # owner_flush_listener.
+        'eager_defaults': False
+    }
     id = Column(Integer, primary_key=True)
     label = Column(
         String(512),
@@ -436,6 +542,23 @@ class Label(Base):
         index=True
     )
 
+    concept_id = orm.deferred(Column(
+        Integer,
+        ForeignKey('concept.id'),
+        nullable=True,
+        server_default=FetchedValue()
+    ))
+    '''
+    The id of the concept or collection this label belongs to, or `None`
+    for the labels of a conceptscheme. This duplicates the
+    `concept_label` table so labels can be queried without joining it.
+
+    The column is never part of an insert and is only loaded when asked
+    for, so databases created with version 2.2 or older, that don't have
+    it, keep working. :func:`owner_flush_listener` fills it once a label
+    has been written, see :func:`has_owner_columns`.
+    '''
+
     def __init__(self, label, labeltype_id='prefLabel', language_id=None):
         self.labeltype_id = labeltype_id
         self.language_id = language_id
@@ -453,6 +576,17 @@ class Label(Base):
         return self.label
 
 
+Index(
+    'ix_label_label_lower',
+    func.lower(Label.label).label('label_lower'),
+    postgresql_ops={'label_lower': 'text_pattern_ops'}
+)
+'''
+An index on the lowercased labels, for prefix searches such as
+:meth:`skosprovider_sqlalchemy.providers.SQLAlchemyProvider.suggest`.
+'''
+
+
 class NoteType(Base):
     '''
     A noteType according to :term:`skosprovider:SKOS`.
@@ -476,6 +610,11 @@ class Note(Base):
     :class:`ConceptScheme`.
     '''
     __tablename__ = 'note'
+    __mapper_args__ = {
+        # The concept_id is filled after the insert, by
+        # owner_flush_listener.
+        'eager_defaults': False
+    }
     id = Column(Integer, primary_key=True)
     note = Column(
         Text,
@@ -499,6 +638,18 @@ class Note(Base):
     )
     markup = Column(String(20), nullable=True)
 
+    concept_id = orm.deferred(Column(
+        Integer,
+        ForeignKey('concept.id'),
+        nullable=True,
+        server_default=FetchedValue(),
+        index=True
+    ))
+    '''
+    The id of the concept or collection this note belongs to, or `None`
+    for the notes of a conceptscheme. See :attr:`Label.concept_id`.
+    '''
+
     def __init__(self, note, notetype_id, language_id, markup=None):
         self.notetype_id = notetype_id
         self.language_id = language_id
@@ -514,6 +665,11 @@ class Source(Base):
     The source where a certain piece of information came from.
     '''
     __tablename__ = 'source'
+    __mapper_args__ = {
+        # The concept_id is filled after the insert, by
+        # owner_flush_listener.
+        'eager_defaults': False
+    }
     id = Column(Integer, primary_key=True)
     citation = Column(
         Text,
@@ -521,6 +677,18 @@ class Source(Base):
     )
     markup = Column(String(20), nullable=True)
 
+    concept_id = orm.deferred(Column(
+        Integer,
+        ForeignKey('concept.id'),
+        nullable=True,
+        server_default=FetchedValue(),
+        index=True
+    ))
+    '''
+    The id of the concept or collection this source belongs to, or `None`
+    for the sources of a conceptscheme. See :attr:`Label.concept_id`.
+    '''
+
     def __init__(self, citation, markup=None):
         self.citation = citation
         self.markup = markup
@@ -571,7 +739,8 @@ class Match(Base):
 
     uri = Column(
         String(512),
-        primary_key=True
+        primary_key=True,
+        index=True
     )
 
     def __str__(self):
@@ -613,6 +782,42 @@ class Visitation(Base):
         return self.__class__.__name__ + '-' + str(self.id)
 
 
+class TopLevel(Base):
+    '''
+    Holds the precomputed top levels of the hierarchies of a conceptscheme.
+
+    Each row marks a :class:`Thing` as being part of the top level of a
+    hierarchy. The `hierarchy` is either `concept`, for the top concepts of
+    a conceptscheme, or `display`, for the top of the display hierarchy.
+
+    Like the :class:`Visitation` table, actually creating the data in this
+    table needs to be scheduled.
+    '''
+    __tablename__ = 'toplevel'
+    __table_args__ = (
+        Index('ix_toplevel_conceptscheme_id_hierarchy', 'conceptscheme_id', 'hierarchy'),
+    )
+    id = Column(Integer, primary_key=True)
+    hierarchy = Column(String(20), nullable=False)
+
+    conceptscheme = relationship('ConceptScheme')
+    conceptscheme_id = Column(
+        Integer,
+        ForeignKey('conceptscheme.id'),
+        nullable=False
+    )
+    concept = relationship('Thing')
+    concept_id = Column(
+        Integer,
+        ForeignKey('concept.id'),
+        nullable=False,
+        index=True
+    )
+
+    def __str__(self):
+        return self.__class__.__name__ + '-' + str(self.id)
+
+
 def label(labels=[], language='any', sortLabel=False):
     '''
     Provide a label for a list of labels.
@@ -634,6 +839,97 @@ def label(labels=[], language='any', sortLabel=False):
     return skoslabel(labels, language, sortLabel)
 
 
+def language_clause(column, language, broader=True):
+    '''
+    A clause that checks if a language column holds a certain language.
+
+    Just like :func:`skosprovider.skos.filter_labels_by_language`, tags are
+    compared without regard to case.
+
+    :param column: A column holding language tags, eg.
+        :attr:`Label.language_id`.
+    :param str language: A valid IANA language tag, eg. `nl-BE`.
+    :param boolean broader: Should languages with the same base language,
+        eg. `nl` and `nl-NL`, match as well?
+    '''
+    tag = tags.tag(language)
+    lowered = func.lower(column)
+    if not broader:
+        return lowered == tag.format.lower()
+    base = tag.language.format.lower()
+    return or_(lowered == base, lowered.like(base + '-%'))
+
+
+def best_label(language='any', sortLabel=False, owner=None, direct=False):
+    '''
+    A SQL expression for the best label of a concept or collection.
+
+    This is the SQL equivalent of :func:`skosprovider.skos.label` and uses
+    the same precedence rules: for every language in turn, sortLabels (if
+    requested), prefLabels and altLabels, first in the exact language and
+    then in a language with the same base language. When nothing is found,
+    a label in any language is used. Hidden labels are never used. When
+    several labels are equally good, the one with the lowest id wins.
+
+    The expression is a correlated subquery that can be selected, sorted
+    on or filtered on without loading any :class:`Label`.
+
+    .. code-block:: python
+
+        label = best_label('nl')
+        session.execute(
+            select(Thing.concept_id, label.label('label'))
+            .filter(Thing.conceptscheme_id == 1)
+            .order_by(func.lower(label))
+        )
+
+    :param language: A language tag or a list of language tags, as accepted
+        by :func:`skosprovider.skos.label`.
+    :param boolean sortLabel: Should sortLabels be considered or not?
+    :param owner: The id column of the concept or collection, eg. of an
+        alias of :class:`Thing`. Defaults to :attr:`Thing.id`.
+    :param boolean direct: Find the labels through :attr:`Label.concept_id`
+        instead of the `concept_label` table.
+    :rtype: A scalar subquery.
+    '''
+    if owner is None:
+        owner = Thing.id
+    languages = [language] if isinstance(language, str) else list(language or [])
+    languages = [lan for lan in languages if tags.tag(lan).language] or ['und']
+    types = (['sortLabel'] if sortLabel else []) + ['prefLabel', 'altLabel']
+
+    label = orm.aliased(Label)
+    tiers = []
+    for lan in languages + ([] if 'any' in languages else ['any']):
+        for labeltype in types:
+            is_type = label.labeltype_id == labeltype
+            if lan == 'any':
+                tiers.append(is_type)
+            else:
+                tiers.append(and_(
+                    is_type, language_clause(label.language_id, lan, False)
+                ))
+                tiers.append(and_(
+                    is_type, language_clause(label.language_id, lan)
+                ))
+    rank = case(*[(tier, i) for i, tier in enumerate(tiers)])
+
+    q = select(label.label)
+    if direct:
+        q = q.where(label.concept_id == owner)
+    else:
+        link = concept_label.alias()
+        q = q.join(link, link.c.label_id == label.id).where(
+            link.c.concept_id == owner
+        )
+    return (
+        q.where(label.labeltype_id.in_(types))
+        .order_by(rank, label.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
 class Initialiser:
     '''
     Initialises a database.
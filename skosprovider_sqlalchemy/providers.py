@@ -1,5 +1,9 @@
 import logging
+import time
+from collections import defaultdict
+from collections import namedtuple
 
+from language_tags import tags
 from skosprovider.providers import VocabularyProvider
 from skosprovider.skos import Collection
 from skosprovider.skos import Concept
@@ -7,21 +11,88 @@ from skosprovider.skos import ConceptScheme
 from skosprovider.skos import Label
 from skosprovider.skos import Note
 from skosprovider.skos import Source
+from skosprovider.skos import label as skoslabel
 from skosprovider.uri import DefaultUrnGenerator
+from sqlalchemy import String
+from sqlalchemy import case
+from sqlalchemy import cast
+from sqlalchemy import func
+from sqlalchemy import literal
+from sqlalchemy import or_
 from sqlalchemy import select
+from sqlalchemy import union_all
 from sqlalchemy.exc import NoResultFound
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import configure_mappers
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
+from skosprovider_sqlalchemy.instrumentation import instrumented
 from skosprovider_sqlalchemy.models import Collection as CollectionModel
 from skosprovider_sqlalchemy.models import Concept as ConceptModel
 from skosprovider_sqlalchemy.models import ConceptScheme as ConceptSchemeModel
 from skosprovider_sqlalchemy.models import Label as LabelModel
 from skosprovider_sqlalchemy.models import Match as MatchModel
+from skosprovider_sqlalchemy.models import Note as NoteModel
+from skosprovider_sqlalchemy.models import Source as SourceModel
 from skosprovider_sqlalchemy.models import Thing
+from skosprovider_sqlalchemy.models import TopLevel
 from skosprovider_sqlalchemy.models import Visitation
+from skosprovider_sqlalchemy.models import best_label
+from skosprovider_sqlalchemy.models import collection_concept
+from skosprovider_sqlalchemy.models import concept_hierarchy_collection
+from skosprovider_sqlalchemy.models import concept_hierarchy_concept
+from skosprovider_sqlalchemy.models import concept_label
+from skosprovider_sqlalchemy.models import concept_note
+from skosprovider_sqlalchemy.models import concept_related_concept
+from skosprovider_sqlalchemy.models import concept_source
+from skosprovider_sqlalchemy.models import language_clause
 
 log = logging.getLogger(__name__)
 
+LabelRecord = namedtuple('LabelRecord', ['label', 'type', 'language'])
+'''
+A lightweight label, compatible with :func:`skosprovider.skos.label`.
+'''
+
+NoteRecord = namedtuple('NoteRecord', ['note', 'type', 'language', 'markup'])
+'''
+A lightweight note.
+'''
+
+SourceRecord = namedtuple('SourceRecord', ['citation', 'markup'])
+'''
+A lightweight source.
+'''
+
+ThingRecord = namedtuple(
+    'ThingRecord',
+    [
+        'id', 'uri', 'type', 'labels', 'notes', 'sources',
+        'broader', 'narrower', 'related', 'member_of', 'members',
+        'subordinate_arrays', 'superordinates', 'matches',
+        'infer_concept_relations'
+    ]
+)
+'''
+A lightweight concept or collection as returned by
+:meth:`SQLAlchemyProvider.iter_raw`.
+
+Holds the same information as a :class:`skosprovider.skos.Concept` or
+:class:`skosprovider.skos.Collection`, but without the per object overhead.
+Attributes that do not apply to the type of the record are empty.
+'''
+
+
+def _escape_like(value):
+    '''
+    Escape the wildcards of a `LIKE` pattern, using a backslash.
+    '''
+    return (
+        value.replace('\\', '\\\\')
+        .replace('%', '\\%')
+        .replace('_', '\\_')
+    )
+
 
 class SQLAlchemyProvider(VocabularyProvider):
     '''
@@ -35,6 +106,39 @@ class SQLAlchemyProvider(VocabularyProvider):
     directly.
     '''
 
+    _conceptscheme_loaded = None
+    '''
+    When the concept scheme was loaded, as returned by :func:`time.monotonic`.
+    '''
+
+    _uri_map = None
+    '''
+    A :class:`dict` mapping the :term:`URI` of every concept and collection
+    in the conceptscheme to its internal id, once it has been loaded. Only
+    used when :attr:`uri_cache` is enabled.
+    '''
+
+    _uri_map_loaded = None
+    '''
+    When the :attr:`_uri_map` was loaded, as returned by :func:`time.monotonic`.
+    '''
+
+    cache_ttl = None
+    '''
+    The number of seconds data cached by the provider, such as the
+    :attr:`concept_scheme`, remains valid. When `None`, the default, cached
+    data never expires and :meth:`clear_cache` needs to be called to pick
+    up changes made in the database.
+    '''
+
+    instrumentation = None
+    '''
+    A callable that is called after every call to a public method of the
+    provider, with a
+    :class:`skosprovider_sqlalchemy.instrumentation.ProviderCallStats`
+    describing the call. When `None`, the default, nothing is measured.
+    '''
+
     expand_strategy = 'recurse'
     '''
     Determines how the expand method will operate. Options are:
@@ -48,6 +152,63 @@ class SQLAlchemyProvider(VocabularyProvider):
       Actually creating the data in this table needs to be scheduled.
     '''
 
+    uri_cache = False
+    '''
+    Should :meth:`get_by_uri` and :meth:`get_by_uris` resolve
+    :term:`URIs <URI>` through an in-process map of all
+    :term:`URIs <URI>` in the conceptscheme? This turns dereferencing a
+    :term:`URI` into a lookup by primary key. The map is loaded on first
+    use and reloaded when the :attr:`cache_ttl` has expired or
+    :meth:`clear_cache` is called. :term:`URIs <URI>` that are missing
+    from the map or that point to a concept whose :term:`URI` has changed
+    are looked up in the database, so the results are always current.
+    '''
+
+    top_strategy = 'query'
+    '''
+    Determines how :meth:`get_top_concepts` and :meth:`get_top_display`
+    will operate. Options are:
+
+    * `query`: Determine the top levels by querying the hierarchy. For the
+      top concepts this also requires checking if a concept has a broader
+      concept through a collection, which can take a long time for large
+      conceptschemes.
+    * `precomputed`: Query the database's
+      :class:`TopLevel <skosprovider_sqlalchemy.models.TopLevel>` table.
+      Actually creating the data in this table needs to be scheduled. If no
+      data is present for a conceptscheme, the `query` strategy is used.
+    '''
+
+    label_strategy = 'association'
+    '''
+    Determines how the labels, notes and sources of concepts and
+    collections are loaded. Options are:
+
+    * `association`: Join the `concept_label`, `concept_note` and
+      `concept_source` tables.
+    * `direct`: Query the `concept_id` column of the labels, notes and
+      sources, saving a join in every query that loads them. Databases
+      created with version 2.2 or older need to be upgraded with the
+      `upgrade_skos_db` script first.
+    '''
+
+    listing_strategy = 'load'
+    '''
+    Determines how :meth:`get_all` and :meth:`find` choose and sort on the
+    labels of the concepts and collections they return. Options are:
+
+    * `load`: Load the labels that can be chosen and choose in Python. See
+      :meth:`_get_listing_labels`.
+    * `sql`: Choose the label in the database with
+      :func:`skosprovider_sqlalchemy.models.best_label`, so no labels need
+      to be loaded at all. Sorting compares labels lowercased by the
+      database, which may order accented characters differently.
+
+    Both choose the same labels as :func:`skosprovider.skos.label`: only
+    the requested languages are considered before falling back to any
+    language.
+    '''
+
     def __init__(self, metadata, session, **kwargs):
         '''
         Create a new provider
@@ -56,7 +217,15 @@ class SQLAlchemyProvider(VocabularyProvider):
         id, a conceptscheme_id can also be passed.
         :param :class:`sqlachemy.orm.session.Session` session: The database
         session. This can also be a callable that returns a Session.
+        :param concept_scheme: The conceptscheme, when it has already been
+        loaded, eg. by a :class:`skosprovider_sqlalchemy.factory.ProviderFactory`.
+        Either a :class:`skosprovider.skos.ConceptScheme` or a
+        :class:`skosprovider_sqlalchemy.models.ConceptScheme` with its
+        labels, notes, languages and sources. It's cached as if the
+        provider had loaded it itself, so it expires after the
+        :attr:`cache_ttl`.
         '''
+        concept_scheme = kwargs.pop('concept_scheme', None)
         super().__init__(
             metadata,
             allowed_instance_scopes=['single', 'threaded_thread'],
@@ -85,20 +254,91 @@ class SQLAlchemyProvider(VocabularyProvider):
                     'Unknown expand strategy.'
                 )
 
+        if 'top_strategy' in kwargs:
+            if kwargs['top_strategy'] in ['query', 'precomputed']:
+                self.top_strategy = kwargs['top_strategy']
+            else:
+                raise ValueError(
+                    'Unknown top strategy.'
+                )
+
+        if 'label_strategy' in kwargs:
+            if kwargs['label_strategy'] in ['association', 'direct']:
+                self.label_strategy = kwargs['label_strategy']
+            else:
+                raise ValueError(
+                    'Unknown label strategy.'
+                )
+
+        if 'listing_strategy' in kwargs:
+            if kwargs['listing_strategy'] in ['load', 'sql']:
+                self.listing_strategy = kwargs['listing_strategy']
+            else:
+                raise ValueError(
+                    'Unknown listing strategy.'
+                )
+
+        if 'cache_ttl' in kwargs:
+            self.cache_ttl = kwargs['cache_ttl']
+
+        if 'instrumentation' in kwargs:
+            self.instrumentation = kwargs['instrumentation']
+
+        if 'uri_cache' in kwargs:
+            self.uri_cache = kwargs['uri_cache']
+
+        if concept_scheme is not None:
+            if isinstance(concept_scheme, ConceptSchemeModel):
+                concept_scheme = self._conceptscheme_from_model(concept_scheme)
+            self._conceptscheme = concept_scheme
+            self._conceptscheme_loaded = time.monotonic()
+
     @property
     def concept_scheme(self):
-        if self._conceptscheme is None:
+        if (
+            self._conceptscheme is None
+            or self._cache_expired(self._conceptscheme_loaded)
+        ):
             self._conceptscheme = self._get_concept_scheme()
+            self._conceptscheme_loaded = time.monotonic()
         return self._conceptscheme
 
     @concept_scheme.setter
     def concept_scheme(self, _):
         """Ignore the super class setting a concept_scheme."""
 
+    def _cache_expired(self, loaded):
+        '''
+        Check if something that was cached at a certain moment has expired.
+
+        :param float loaded: When the data was cached, as returned by
+            :func:`time.monotonic`.
+        :rtype: bool
+        '''
+        if self.cache_ttl is None or loaded is None:
+            return False
+        return time.monotonic() - loaded > self.cache_ttl
+
+    def clear_cache(self):
+        '''
+        Clear all data cached by this provider.
+
+        The next call that needs the data will reload it from the database.
+        Long-lived providers can call this to pick up changes to, eg. the
+        metadata of the conceptscheme.
+        '''
+        self._conceptscheme = None
+        self._conceptscheme_loaded = None
+        self._uri_map = None
+        self._uri_map_loaded = None
+
     def _get_concept_scheme(self):
         '''
         Find a :class:`skosprovider.skos.ConceptScheme` for this provider.
 
+        The labels, notes, languages and sources are each loaded with a
+        separate query to avoid fetching their cartesian product.
+
         :rtype: :class:`skosprovider.skos.ConceptScheme`
         '''
         csm = (
@@ -107,13 +347,24 @@ class SQLAlchemyProvider(VocabularyProvider):
                 ConceptSchemeModel,
                 self.conceptscheme_id,
                 options=[
-                    joinedload(ConceptSchemeModel.labels),
-                    joinedload(ConceptSchemeModel.notes),
-                    joinedload(ConceptSchemeModel.languages),
-                    joinedload(ConceptSchemeModel.sources),
-                ]
+                    selectinload(ConceptSchemeModel.labels),
+                    selectinload(ConceptSchemeModel.notes),
+                    selectinload(ConceptSchemeModel.languages),
+                    selectinload(ConceptSchemeModel.sources),
+                ],
+                populate_existing=True
             )
         )
+        return self._conceptscheme_from_model(csm)
+
+    def _conceptscheme_from_model(self, csm):
+        '''
+        Turn a conceptscheme model into a :class:`skosprovider.skos.ConceptScheme`.
+
+        :param skosprovider_sqlalchemy.models.ConceptScheme csm: The model,
+            with its labels, notes, languages and sources.
+        :rtype: :class:`skosprovider.skos.ConceptScheme`
+        '''
         return ConceptScheme(
             uri=csm.uri,
             labels=[
@@ -174,7 +425,7 @@ class SQLAlchemyProvider(VocabularyProvider):
                 uri = self.uri_generator.generate(type='concept', id=thing.concept_id)
             matches = {}
             for m in thing.matches:
-                key = m.matchtype.name[:m.matchtype.name.find('Match')]
+                key = m.matchtype_id[:m.matchtype_id.find('Match')]
                 if key not in matches:
                     matches[key] = []
                 matches[key].append(m.uri)
@@ -204,13 +455,12 @@ class SQLAlchemyProvider(VocabularyProvider):
                 matches=matches
             )
 
+    @instrumented
     def get_by_id(self, concept_id):
         try:
             thing = self.session.execute(
                 select(Thing)
-                .options(joinedload(Thing.labels))
-                .options(joinedload(Thing.notes))
-                .options(joinedload(Thing.sources))
+                .options(*self._owned_options(Thing))
                 .filter(
                     Thing.concept_id == str(concept_id),
                     Thing.conceptscheme_id == self.conceptscheme_id
@@ -218,8 +468,44 @@ class SQLAlchemyProvider(VocabularyProvider):
             ).unique().scalar_one()
         except NoResultFound:
             return False
+        self._load_owned([thing])
         return self._from_thing(thing)
 
+    @instrumented
+    def get_by_ids(self, concept_ids, chunk_size=1000):
+        '''Get all information on several concepts or collections, based on
+        their ids.
+
+        This is the bulk equivalent of :meth:`get_by_id`. The concepts and
+        collections are loaded in batches, together with all their relations,
+        so the number of queries does not depend on the number of ids.
+
+        :param list concept_ids: The concept or collection ids to look up.
+        :param int chunk_size: How many ids to look up in one query.
+        :rtype: A :class:`dict` mapping each id to a
+            :class:`skosprovider.skos.Concept` or
+            :class:`skosprovider.skos.Collection` or `False` if the concept or
+            collection is unknown to the provider.
+        '''
+        concept_ids = list(dict.fromkeys(concept_ids))
+        keys = list({str(id) for id in concept_ids})
+        resolved = {}
+        for i in range(0, len(keys), chunk_size):
+            resolved.update(self.session.execute(
+                select(Thing.concept_id, Thing.id)
+                .filter(
+                    Thing.concept_id.in_(keys[i:i + chunk_size]),
+                    Thing.conceptscheme_id == self.conceptscheme_id
+                )
+            ).all())
+        things = self._load_things(set(resolved.values()), chunk_size)
+        res = {}
+        for id in concept_ids:
+            thing = things.get(resolved.get(str(id)))
+            res[id] = self._from_thing(thing) if thing is not None else False
+        return res
+
+    @instrumented
     def get_by_uri(self, uri):
         '''Get all information on a concept or collection, based on a
         :term:`URI`.
@@ -233,12 +519,12 @@ class SQLAlchemyProvider(VocabularyProvider):
             :class:`skosprovider.skos.Collection` or `False` if the concept or
             collection is unknown to the provider.
         '''
+        if self.uri_cache:
+            return self.get_by_uris([uri])[uri]
         try:
             thing = self.session.execute(
                 select(Thing)
-                .options(joinedload(Thing.labels))
-                .options(joinedload(Thing.notes))
-                .options(joinedload(Thing.sources))
+                .options(*self._owned_options(Thing))
                 .filter(
                     Thing.uri == uri,
                     Thing.conceptscheme_id == self.conceptscheme_id
@@ -246,14 +532,153 @@ class SQLAlchemyProvider(VocabularyProvider):
             ).unique().scalar_one()
         except NoResultFound:
             return False
+        self._load_owned([thing])
         return self._from_thing(thing)
 
-    def _get_id_and_label(self, c, lan):
+    @instrumented
+    def get_by_uris(self, uris, chunk_size=1000):
+        '''Get all information on several concepts or collections, based on
+        their :term:`URIs <URI>`.
+
+        This is the bulk equivalent of :meth:`get_by_uri`. The concepts and
+        collections are loaded in batches, together with all their relations,
+        so the number of queries does not depend on the number of
+        :term:`URIs <URI>`.
+
+        :param list uris: The :term:`URIs <URI>` to look up.
+        :param int chunk_size: How many :term:`URIs <URI>` to look up in one
+            query.
+        :rtype: A :class:`dict` mapping each :term:`URI` to a
+            :class:`skosprovider.skos.Concept` or
+            :class:`skosprovider.skos.Collection` or `False` if the concept or
+            collection is unknown to the provider.
+        '''
+        uris = list(dict.fromkeys(uris))
+        resolved = self._resolve_uris(uris, chunk_size, self.uri_cache)
+        things = self._load_things(set(resolved.values()), chunk_size)
+        stale = [
+            uri for uri, id in resolved.items()
+            if id not in things or things[id].uri != uri
+        ]
+        if stale and self.uri_cache:
+            # The map is out of date for these, ask the database instead.
+            for uri in stale:
+                self._uri_map.pop(uri, None)
+                del resolved[uri]
+            fresh = self._resolve_uris(stale, chunk_size, False)
+            things.update(self._load_things(set(fresh.values()), chunk_size))
+            resolved.update(fresh)
+            self._uri_map.update(fresh)
+        res = {}
+        for uri in uris:
+            thing = things.get(resolved.get(uri))
+            if thing is not None and thing.uri == uri:
+                res[uri] = self._from_thing(thing)
+            else:
+                res[uri] = False
+        return res
+
+    def _resolve_uris(self, uris, chunk_size, use_cache):
+        '''
+        Find the internal ids of concepts and collections by :term:`URI`.
+
+        :param list uris: The :term:`URIs <URI>` to look up.
+        :param int chunk_size: How many :term:`URIs <URI>` to look up in one
+            query.
+        :param bool use_cache: Should the :attr:`_uri_map` be used?
+        :rtype: A :class:`dict` mapping each :term:`URI` that was found
+            to an internal id.
+        '''
+        res = {}
+        missing = uris
+        if use_cache:
+            uri_map = self._get_uri_map()
+            res = {uri: uri_map[uri] for uri in uris if uri in uri_map}
+            missing = [uri for uri in uris if uri not in uri_map]
+        for i in range(0, len(missing), chunk_size):
+            for uri, id in self.session.execute(
+                select(Thing.uri, Thing.id)
+                .filter(
+                    Thing.uri.in_(missing[i:i + chunk_size]),
+                    Thing.conceptscheme_id == self.conceptscheme_id
+                )
+            ):
+                res[uri] = id
+                if use_cache:
+                    self._uri_map[uri] = id
+        return res
+
+    def _get_uri_map(self):
+        '''
+        Get the :attr:`_uri_map`, loading it if needed.
+
+        :rtype: dict
+        '''
+        if self._uri_map is None or self._cache_expired(self._uri_map_loaded):
+            self._uri_map = dict(self.session.execute(
+                select(Thing.uri, Thing.id)
+                .filter(
+                    Thing.conceptscheme_id == self.conceptscheme_id,
+                    Thing.uri.is_not(None)
+                )
+            ).all())
+            self._uri_map_loaded = time.monotonic()
+        return self._uri_map
+
+    def _load_things(self, ids, chunk_size):
+        '''
+        Load concepts and collections with everything :meth:`_from_thing`
+        needs, using a fixed number of queries per chunk.
+
+        :param set ids: Internal ids of concepts and collections.
+        :param int chunk_size: How many things to load in one query.
+        :rtype: A :class:`dict` mapping each internal id to a
+            :class:`skosprovider_sqlalchemy.models.Thing`.
+        '''
+        ids = list(ids)
+        res = {}
+        for i in range(0, len(ids), chunk_size):
+            chunk = ids[i:i + chunk_size]
+            for model, relations in (
+                (ConceptModel, (
+                    ConceptModel.broader_concepts,
+                    ConceptModel.narrower_concepts,
+                    ConceptModel.related_concepts,
+                    ConceptModel.narrower_collections,
+                    ConceptModel.matches,
+                )),
+                (CollectionModel, (
+                    CollectionModel.broader_concepts,
+                    CollectionModel.members,
+                )),
+            ):
+                res.update(
+                    (thing.id, thing)
+                    for thing in self._load_owned(self.session.execute(
+                        select(model)
+                        .options(*self._owned_options(model))
+                        .options(selectinload(model.member_of))
+                        .options(*[selectinload(r) for r in relations])
+                        .filter(
+                            model.id.in_(chunk),
+                            model.conceptscheme_id == self.conceptscheme_id
+                        )
+                    ).scalars().all())
+                )
+        return res
+
+    def _get_id_and_label(self, c, lan, labels=None):
         '''
         :param skosprovider_sqlalchemy.models.Thing c: A concept or collection.
         :param string lan: A language (eg. "en", "nl", "la", "fr")
+        :param dict labels: The labels to choose from, as returned by
+            :meth:`_get_listing_labels`. When `None`, the labels of the
+            concept or collection are used.
         '''
-        label = c.label(lan)
+        if labels is None:
+            label = c.label(lan)
+        else:
+            label = skoslabel(labels[c.id], lan)
         return {
             'id': c.concept_id,
             'uri': c.uri,
@@ -261,6 +686,7 @@ class SQLAlchemyProvider(VocabularyProvider):
             'label': label.label if label is not None else None
         }
 
+    @instrumented
     def find(self, query, **kwargs):
         lan = self._get_language(**kwargs)
         model = Thing
@@ -273,36 +699,34 @@ class SQLAlchemyProvider(VocabularyProvider):
             model = ConceptModel
             q = (
                 select(model)
-                .options(joinedload(model.labels))
                 .join(MatchModel)
                 .filter(model.conceptscheme_id == self.conceptscheme_id)
             )
             mtype = query['matches'].get('type')
             if mtype and mtype in Concept.matchtypes:
-                mtype += 'Match'
-                mtypes = [mtype]
-                if mtype == 'closeMatch':
-                    mtypes.append('exactMatch')
                 q = q.filter(
                     MatchModel.uri == match_uri,
-                    MatchModel.matchtype_id.in_(mtypes)
+                    MatchModel.matchtype_id.in_(self._get_matchtype_ids([mtype]))
                 )
             else:
                 q = q.filter(MatchModel.uri == match_uri)
         else:
             q = (
                 select(model)
-                .options(joinedload(model.labels))
                 .filter(model.conceptscheme_id == self.conceptscheme_id)
             )
             if 'type' in query and query['type'] in ['concept', 'collection']:
                 q = q.filter(model.type == query['type'])
         if 'label' in query:
-            q = q.filter(
-                model.labels.any(
-                    LabelModel.label.ilike('%' + query['label'].lower() + '%')
+            matching = LabelModel.label.ilike('%' + query['label'].lower() + '%')
+            if self.label_strategy == 'direct':
+                q = q.filter(
+                    select(LabelModel.id)
+                    .where(LabelModel.concept_id == model.id, matching)
+                    .exists()
                 )
-            )
+            else:
+                q = q.filter(model.labels.any(matching))
         if 'collection' in query:
             coll = self.get_by_id(query['collection']['id'])
             if not coll or not isinstance(coll, Collection):
@@ -314,58 +738,493 @@ class SQLAlchemyProvider(VocabularyProvider):
             else:
                 members = coll.members
             q = q.filter(model.concept_id.in_(members))
+        sort = self._get_sort(**kwargs)
+        sort_order = self._get_sort_order(**kwargs)
+        if self.listing_strategy == 'sql':
+            return self._query_listing(q, model, lan, sort, sort_order == 'desc')
         things = self.session.execute(q).unique().scalars().all()
+        return self._get_listing(things, lan, sort, sort_order == 'desc')
+
+    @instrumented
+    def find_by_matches(self, uris, types=None, chunk_size=1000, **kwargs):
+        '''
+        Find the concepts that match any of a list of external :term:`URI`.
+
+        This is the bulk equivalent of calling :meth:`find` with a `matches`
+        query for every :term:`URI`. The :term:`URIs <URI>` are looked up in
+        batches, so only a handful of queries is needed for thousands of
+        them. Just like with :meth:`find`, a `close` match also includes
+        `exact` matches.
+
+        :param list uris: The external :term:`URIs <URI>` to look for.
+        :param list types: Only consider these types of matches, eg.
+            `['close', 'exact']`. When `None`, all matches are considered.
+        :param int chunk_size: How many :term:`URIs <URI>` to look up in one
+            query.
+        :rtype: A :class:`dict` mapping each :term:`URI` to a list of
+            concepts, just like the ones returned by :meth:`find`. A
+            :term:`URI` without matches maps to an empty list.
+        '''
+        if types is not None:
+            unknown = set(types) - set(Concept.matchtypes)
+            if unknown:
+                raise ValueError(
+                    'Unknown match types: %s.' % ', '.join(sorted(unknown))
+                )
+        uris = list(dict.fromkeys(uris))
+        matched = defaultdict(set)
+        for i in range(0, len(uris), chunk_size):
+            q = (
+                select(MatchModel.uri, MatchModel.concept_id)
+                .filter(MatchModel.uri.in_(uris[i:i + chunk_size]))
+            )
+            if types is not None:
+                q = q.filter(
+                    MatchModel.matchtype_id.in_(self._get_matchtype_ids(types))
+                )
+            for uri, concept_id in self.session.execute(q):
+                matched[concept_id].add(uri)
+        found = {uri: [] for uri in uris}
+        ids = list(matched)
+        for i in range(0, len(ids), chunk_size):
+            for thing in self.session.execute(
+                select(ConceptModel)
+                .filter(
+                    ConceptModel.id.in_(ids[i:i + chunk_size]),
+                    ConceptModel.conceptscheme_id == self.conceptscheme_id
+                )
+            ).scalars():
+                for uri in matched[thing.id]:
+                    found[uri].append(thing)
+        lan = self._get_language(**kwargs)
         sort = self._get_sort(**kwargs)
         sort_order = self._get_sort_order(**kwargs)
+        labels = self._get_listing_labels(ids, lan)
+        return {
+            uri: self._get_listing(
+                things, lan, sort, sort_order == 'desc', labels
+            )
+            for uri, things in found.items()
+        }
+
+    @instrumented
+    def suggest(self, prefix, language=None, limit=10, infix=True):
+        '''
+        Suggest concepts and collections for a label that is being typed.
+
+        This is meant for autocompletion. Labels that start with `prefix`
+        are looked up through an index on the lowercased labels. Only when
+        they don't fill the `limit`, labels that contain `prefix` somewhere
+        else are searched as well. This needs to read all labels, so it can
+        be turned off with `infix`.
+
+        Every concept or collection is suggested once, for its best matching
+        label. Exact matches come before prefix matches and prefix matches
+        before infix matches. Within each of these, prefLabels come before
+        altLabels, altLabels before hiddenLabels and labels in the requested
+        language before labels in other languages. Both the ranking and the limit are
+        applied by the database.
+
+        :param str prefix: What has been typed so far. Case is ignored.
+        :param str language: The language to prefer, eg. `nl-BE`. Defaults
+            to the `default_language` of the provider.
+        :param int limit: The maximum number of suggestions.
+        :param boolean infix: Search for labels that contain `prefix` when
+            there are not enough labels that start with it?
+        :rtype: A list of dicts with the `id`, `uri`, `type` and `label`
+            of each concept or collection, just like :meth:`find`, and the
+            label that matched as `match`.
+        '''
+        if not isinstance(limit, int) or limit < 1:
+            raise ValueError('The limit should be a positive integer.')
+        prefix = (prefix or '').strip().lower()
+        if not prefix:
+            return []
+        lan = language or self._get_language()
+        found = self._suggest(prefix, lan, limit)
+        if infix and len(found) < limit:
+            found += self._suggest(
+                prefix, lan, limit - len(found), exclude=[row.id for row in found]
+            )
+        return [
+            {
+                'id': row.concept_id,
+                'uri': row.uri,
+                'type': row.type,
+                'label': row.label,
+                'match': row.match
+            }
+            for row in found
+        ]
+
+    def _suggest(self, prefix, lan, limit, exclude=None):
+        '''
+        Find the best matching label of concepts and collections for
+        :meth:`suggest`.
+
+        :param str prefix: A lowercased prefix.
+        :param str lan: The language to prefer.
+        :param int limit: The maximum number of rows.
+        :param list exclude: When set, search for labels that contain the
+            prefix and skip the concepts and collections with these ids.
+            Otherwise, search for labels that start with the prefix.
+        :rtype: A list of rows.
+        '''
+        lowered = func.lower(LabelModel.label)
+        pattern = _escape_like(prefix)
+        if exclude is None:
+            matching = [lowered.like(pattern + '%', escape='\\')]
+            if self.session.get_bind().dialect.name == 'sqlite':
+                # SQLite only uses an index for LIKE on case-insensitive
+                # columns, but can use it for the equivalent range.
+                upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+                matching += [lowered >= prefix, lowered < upper]
+            rank = case((lowered == prefix, 0), else_=100)
+        else:
+            matching = [lowered.like('%' + pattern + '%', escape='\\')]
+            rank = literal(200)
+        rank = rank + case(
+            {'prefLabel': 0, 'altLabel': 10}, value=LabelModel.labeltype_id, else_=20
+        )
+        if lan != 'any' and tags.tag(lan).language:
+            rank = rank + case(
+                (language_clause(LabelModel.language_id, lan), 0), else_=1
+            )
+
+        direct = self.label_strategy == 'direct'
+        if direct:
+            owner = LabelModel.concept_id
+            q = select(LabelModel.label)
+        else:
+            owner = concept_label.c.concept_id
+            q = select(LabelModel.label).join(
+                concept_label, concept_label.c.label_id == LabelModel.id
+            )
+        matches = (
+            q.add_columns(
+                owner.label('owner'),
+                rank.label('rank'),
+                func.row_number().over(
+                    partition_by=owner, order_by=(rank, LabelModel.id)
+                ).label('position')
+            )
+            .join(Thing, Thing.id == owner)
+            .where(
+                Thing.conceptscheme_id == self.conceptscheme_id,
+                LabelModel.labeltype_id != 'sortLabel',
+                *matching
+            )
+        )
+        if exclude:
+            matches = matches.where(Thing.id.not_in(exclude))
+        matches = matches.subquery()
+        return self.session.execute(
+            select(
+                Thing.id, Thing.concept_id, Thing.uri, Thing.type,
+                best_label(lan, direct=direct).label('label'),
+                matches.c.label.label('match')
+            )
+            .join(matches, matches.c.owner == Thing.id)
+            .where(matches.c.position == 1)
+            .order_by(matches.c.rank, func.lower(matches.c.label), Thing.id)
+            .limit(limit)
+        ).all()
+
+    def _get_listing(self, things, lan, sort=None, reverse=False, labels=None):
+        '''
+        Turn concepts or collections into a sorted list with their id,
+        :term:`URI`, type and label.
+
+        :param list things: A list of
+            :class:`skosprovider_sqlalchemy.models.Thing`.
+        :param string lan: A language (eg. "en", "nl", "la", "fr")
+        :param string sort: What to sort on: `id`, `uri`, `label` or
+            `sortlabel`.
+        :param boolean reverse: Reverse the sort order?
+        :param dict labels: The labels to choose from, as returned by
+            :meth:`_get_listing_labels`. When `None`, they are loaded.
+        :rtype: list
+        '''
+        if labels is None:
+            labels = self._get_listing_labels([t.id for t in things], lan)
+        return [
+            self._get_id_and_label(c, lan, labels)
+            for c in self._sort(things, sort, lan, reverse, labels)
+        ]
+
+    def _query_listing(self, q, model, lan, sort=None, reverse=False):
+        '''
+        Like :meth:`_get_listing`, but choose and sort on the labels in the
+        database, without loading any concept, collection or label.
+
+        :param q: A query that selects the concepts or collections to list.
+        :param model: The model selected by the query, eg.
+            :class:`skosprovider_sqlalchemy.models.Thing`.
+        :param string lan: A language (eg. "en", "nl", "la", "fr")
+        :param string sort: What to sort on: `id`, `uri`, `label` or
+            `sortlabel`.
+        :param boolean reverse: Reverse the sort order?
+        :rtype: list
+        '''
+        direct = self.label_strategy == 'direct'
+        label = best_label(lan, direct=direct)
+        listing = (
+            select(Thing.concept_id, Thing.uri, Thing.type, label.label('label'))
+            .filter(Thing.id.in_(q.with_only_columns(model.id)))
+        )
+        if sort:
+            if sort == 'id':
+                key = cast(Thing.id, String)
+            elif sort == 'uri':
+                key = func.coalesce(Thing.uri, '')
+            else:
+                if sort == 'sortlabel':
+                    label = best_label(lan, sortLabel=True, direct=direct)
+                key = func.coalesce(func.lower(label), '')
+            listing = listing.order_by(key.desc() if reverse else key, Thing.id)
         return [
-            self._get_id_and_label(c, lan)
-            for c in self._sort(things, sort, lan, sort_order == 'desc')
+            {'id': row.concept_id, 'uri': row.uri, 'type': row.type, 'label': row.label}
+            for row in self.session.execute(listing)
+        ]
+
+    def _get_listing_labels(self, ids, language):
+        '''
+        Load the labels needed to show and sort concepts or collections in
+        a listing.
+
+        Only the labels :func:`skosprovider.skos.label` can choose are
+        loaded: the prefLabels, altLabels and sortLabels in the requested
+        language or in a language with the same base language. Concepts or
+        collections without a prefLabel or altLabel in any of these
+        languages fall back to a label in any language, so all of their
+        labels are loaded with a second query.
+
+        The labels are looked up by the ids of their owners, so the cost
+        only depends on the number of ids, not on the size of the database.
+
+        :param ids: Internal ids of concepts or collections.
+        :param language: A language (eg. "en", "nl-BE") or list of
+            languages, as accepted by :func:`skosprovider.skos.label`.
+        :rtype: A :class:`dict` mapping each id to a list of
+            :class:`LabelRecord`, in the order of their ids.
+        '''
+        ids = list(ids)
+        res = defaultdict(list)
+        if not ids:
+            return res
+        languages = [language] if isinstance(language, str) else list(language or [])
+        languages = [lan for lan in languages if tags.tag(lan).language] or ['und']
+        types = ('prefLabel', 'altLabel', 'sortLabel')
+
+        label = LabelModel
+        if self.label_strategy == 'direct':
+            q = select(
+                label.concept_id, label.id, label.label, label.labeltype_id,
+                label.language_id
+            )
+            owner = label.concept_id
+        else:
+            q = (
+                select(
+                    concept_label.c.concept_id, label.id, label.label,
+                    label.labeltype_id, label.language_id
+                )
+                .join(label, label.id == concept_label.c.label_id)
+            )
+            owner = concept_label.c.concept_id
+
+        def _load(owners, *criteria):
+            rows = defaultdict(list)
+            for i in range(0, len(owners), 500):
+                for cid, id, text, labeltype_id, language_id in self.session.execute(
+                    q.filter(owner.in_(owners[i:i + 500]), *criteria)
+                ):
+                    # Hidden labels are skipped here instead of in the query,
+                    # so the database finds the labels through their owner.
+                    if labeltype_id in types:
+                        rows[cid].append(
+                            (id, LabelRecord(text, labeltype_id, language_id))
+                        )
+            return {
+                cid: [record for id, record in sorted(labels)]
+                for cid, labels in rows.items()
+            }
+
+        if 'any' in languages:
+            res.update(_load(ids))
+            return res
+        res.update(_load(ids, or_(*[
+            language_clause(label.language_id, lan) for lan in languages
+        ])))
+        # Fall back to any language, just like skosprovider.skos.label.
+        missing = [
+            id for id in ids
+            if not any(r.type in ('prefLabel', 'altLabel') for r in res[id])
         ]
+        if missing:
+            res.update(_load(missing))
+        return res
+
+    def _sort(self, concepts, sort=None, language='any', reverse=False, labels=None):
+        '''
+        Returns a sorted version of a list of concepts or collections.
+
+        :param dict labels: The labels to sort on, as returned by
+            :meth:`_get_listing_labels`. When `None`, the labels of the
+            concepts or collections are used.
+        '''
+        if labels is None or sort not in ('label', 'sortlabel'):
+            return super()._sort(concepts, sort, language, reverse)
 
+        def _sortkey(thing):
+            label = skoslabel(labels[thing.id], language, sort == 'sortlabel')
+            return label.label.lower() if label else ''
+
+        return sorted(concepts, key=_sortkey, reverse=reverse)
+
+    def _get_matchtype_ids(self, types):
+        '''
+        Turn match types into the ids used by the `matchtype` table.
+
+        A `close` match also includes `exact` matches.
+
+        :param list types: Match types, eg. `['close', 'broad']`.
+        :rtype: list
+        '''
+        ids = [t + 'Match' for t in types]
+        if 'close' in types and 'exact' not in types:
+            ids.append('exactMatch')
+        return ids
+
+    @instrumented
     def get_all(self, **kwargs):
-        things = self.session.execute(
-            select(Thing)
-            .options(joinedload(Thing.labels))
-            .filter(Thing.conceptscheme_id == self.conceptscheme_id)
-        ).unique().scalars().all()
+        q = select(Thing).filter(Thing.conceptscheme_id == self.conceptscheme_id)
         lan = self._get_language(**kwargs)
         sort = self._get_sort(**kwargs)
         sort_order = self._get_sort_order(**kwargs)
-        return [
-            self._get_id_and_label(c, lan)
-            for c in self._sort(things, sort, lan, sort_order == 'desc')
-        ]
+        if self.listing_strategy == 'sql':
+            return self._query_listing(q, Thing, lan, sort, sort_order == 'desc')
+        things = self.session.execute(q).unique().scalars().all()
+        return self._get_listing(things, lan, sort, sort_order == 'desc')
 
+    @instrumented
     def get_top_concepts(self, **kwargs):
-        # get the concepts that have no direct broader concept
-        top = self.session.execute(
+        top = None
+        if self.top_strategy == 'precomputed':
+            top = list(self._get_precomputed_top('concept'))
+        if not top:
+            top = self._get_top_concepts()
+        lan = self._get_language(**kwargs)
+        sort = self._get_sort(**kwargs)
+        sort_order = self._get_sort_order(**kwargs)
+        return self._get_listing(top, lan, sort, sort_order == 'desc')
+
+    def _get_top_concepts(self):
+        # get the concepts that have no direct broader concept and no
+        # indirect broader concept through a collection
+        # broader_concepts and member_of are backrefs that only exist once
+        # the mappers have been configured.
+        configure_mappers()
+        return self.session.execute(
             select(ConceptModel)
-            .options(joinedload(ConceptModel.labels))
             .filter(
                 ConceptModel.conceptscheme_id == self.conceptscheme_id,
-                ~ConceptModel.broader_concepts.any()
+                ~ConceptModel.broader_concepts.any(),
+                ~ConceptModel.member_of.any(
+                    CollectionModel.id.in_(self._get_higher_collections())
+                )
             )
         ).unique().scalars().all()
 
-        # check if they have an indirect broader concept
-        def _has_higher_concept(c):
-            for coll in c.member_of:
-                if (
-                    coll.infer_concept_relations
-                    and coll.broader_concepts or _has_higher_concept(coll)
-                ):
-                    return True
-            return False
-        top = [c for c in top if not _has_higher_concept(c)]
-        lan = self._get_language(**kwargs)
-        sort = self._get_sort(**kwargs)
-        sort_order = self._get_sort_order(**kwargs)
+    def _get_higher_collections(self):
+        '''
+        Find the collections that give their members a broader concept.
 
-        return [
-            self._get_id_and_label(c, lan)
-            for c in self._sort(top, sort, lan, sort_order == 'desc')
-        ]
+        These are the collections that infer concept relations and have a
+        superordinate concept, and all collections that are a member of
+        such a collection, however deeply nested.
+
+        :rtype: A :class:`set` of internal ids.
+        '''
+        collection_table = Thing.__table__
+        chcol = concept_hierarchy_collection.c
+        higher = set(self.session.execute(
+            select(collection_table.c.id)
+            .join(
+                concept_hierarchy_collection,
+                chcol.collection_id_narrower == collection_table.c.id
+            )
+            .filter(
+                collection_table.c.conceptscheme_id == self.conceptscheme_id,
+                collection_table.c.infer_concept_relations
+            )
+        ).scalars())
+        if not higher:
+            return higher
+
+        # Nested collections, as a mapping of collection to its members
+        # that are collections themselves.
+        member_table = collection_table.alias()
+        cc = collection_concept.c
+        nested = defaultdict(list)
+        for collection_id, member_id in self.session.execute(
+            select(cc.collection_id, cc.concept_id)
+            .join(member_table, member_table.c.id == cc.concept_id)
+            .filter(
+                member_table.c.conceptscheme_id == self.conceptscheme_id,
+                member_table.c.type == 'collection'
+            )
+        ):
+            nested[collection_id].append(member_id)
+        frontier = set(higher)
+        while frontier:
+            frontier = {m for c in frontier for m in nested[c]} - higher
+            higher |= frontier
+        return higher
+
+    def query_top_level(self, hierarchy):
+        '''
+        Determine the top level of a hierarchy by querying it, whatever the
+        :attr:`top_strategy`.
 
+        This is what the `query` strategy returns and what
+        :class:`skosprovider_sqlalchemy.utils.TopLevelCalculator` stores
+        for the `precomputed` strategy.
+
+        :param str hierarchy: Either `concept`, for the top concepts, or
+            `display`, for the top of the display hierarchy.
+        :rtype: A list of :class:`skosprovider_sqlalchemy.models.Thing`.
+        '''
+        if hierarchy == 'concept':
+            return self._get_top_concepts()
+        if hierarchy == 'display':
+            return list(self._get_top_display())
+        raise ValueError(
+            'Unknown hierarchy %s. Use concept or display.' % hierarchy
+        )
+
+    def _get_precomputed_top(self, hierarchy, child_count=False):
+        '''
+        Read the top level of a hierarchy from the
+        :class:`TopLevel <skosprovider_sqlalchemy.models.TopLevel>` table.
+
+        :param str hierarchy: Either `concept` or `display`.
+        :param bool child_count: Should the display children be counted?
+        :rtype: A :class:`dict` mapping each
+            :class:`skosprovider_sqlalchemy.models.Thing` to the number of
+            children or `None` if they were not counted.
+        '''
+        return self._execute_with_child_count(
+            select(Thing)
+            .join(TopLevel, TopLevel.concept_id == Thing.id)
+            .filter(
+                TopLevel.conceptscheme_id == self.conceptscheme_id,
+                TopLevel.hierarchy == hierarchy
+            ),
+            child_count
+        )
+
+    @instrumented
     def expand(self, concept_id):
         try:
             thing = self.session.execute(
@@ -384,18 +1243,72 @@ class SQLAlchemyProvider(VocabularyProvider):
             return self._expand_recurse(thing)
 
     def _expand_recurse(self, thing):
-        ret = []
+        '''
+        Expand a concept or collection by walking the hierarchy.
+
+        The hierarchy is walked one level at a time, so the number of
+        queries depends on the depth of the hierarchy and not on the
+        number of concepts in it.
+
+        :param skosprovider_sqlalchemy.models.Thing thing: A concept or
+            collection.
+        :rtype: A list of concept ids.
+        '''
+        concept_table = Thing.__table__
+        collection_table = concept_table.alias()
+        chc = concept_hierarchy_concept.c
+        chcol = concept_hierarchy_collection.c
+        cc = collection_concept.c
+
+        ret = set()
+        seen = {thing.id}
         if thing.type == 'collection':
-            for m in thing.members:
-                ret += self._expand_recurse(m)
+            concepts, collections = set(), {thing.id}
         else:
-            ret.append(thing.concept_id)
-            for n in thing.narrower_concepts:
-                ret += self._expand_recurse(n)
-            for n in thing.narrower_collections:
-                if n.infer_concept_relations:
-                    ret += self._expand_recurse(n)
-        return list(set(ret))
+            ret.add(thing.concept_id)
+            concepts, collections = {thing.id}, set()
+        while concepts or collections:
+            queries = []
+            if concepts:
+                queries.append(
+                    select(chc.concept_id_narrower.label('id'))
+                    .filter(chc.concept_id_broader.in_(concepts))
+                )
+                queries.append(
+                    select(chcol.collection_id_narrower)
+                    .join(
+                        collection_table,
+                        collection_table.c.id == chcol.collection_id_narrower
+                    )
+                    .filter(
+                        chcol.concept_id_broader.in_(concepts),
+                        collection_table.c.infer_concept_relations
+                    )
+                )
+            if collections:
+                queries.append(
+                    select(cc.concept_id.label('id'))
+                    .filter(cc.collection_id.in_(collections))
+                )
+            children = union_all(*queries).subquery()
+            concepts, collections = set(), set()
+            for id, type, concept_id in self.session.execute(
+                select(
+                    concept_table.c.id,
+                    concept_table.c.type,
+                    concept_table.c.concept_id
+                )
+                .filter(concept_table.c.id.in_(select(children.c.id)))
+            ):
+                if id in seen:
+                    continue
+                seen.add(id)
+                if type == 'collection':
+                    collections.add(id)
+                else:
+                    ret.add(concept_id)
+                    concepts.add(id)
+        return list(ret)
 
     def _expand_visit(self, thing):
         if thing.type == 'collection':
@@ -424,6 +1337,7 @@ class SQLAlchemyProvider(VocabularyProvider):
             ).scalars().all()
         return list(set(concept_ids))
 
+    @instrumented
     def get_top_display(self, **kwargs):
         '''
         Returns all concepts or collections that form the top-level of a display
@@ -435,35 +1349,129 @@ class SQLAlchemyProvider(VocabularyProvider):
         :rtype: Returns a list of concepts and collections. For each an
             id is present and a label. The label is determined by looking at
             the `**kwargs` parameter, the default language of the provider
-            and falls back to `en` if nothing is present.
+            and falls back to `en` if nothing is present. If the `child_count`
+            keyword is `True`, a `child_count` and `has_children` are present
+            as well.
         '''
-        top_concepts = self.session.execute(
-            select(ConceptModel)
-            .options(joinedload(ConceptModel.labels))
-            .filter(
-                ConceptModel.conceptscheme_id == self.conceptscheme_id,
-                ~ConceptModel.broader_concepts.any(),
-                ~ConceptModel.member_of.any()
-            )
-        ).unique().scalars().all()
-        top_collections = self.session.execute(
-            select(CollectionModel)
-            .options(joinedload(CollectionModel.labels))
-            .filter(
-                CollectionModel.conceptscheme_id == self.conceptscheme_id,
-                ~CollectionModel.broader_concepts.any(),
-                ~CollectionModel.member_of.any()
-            )
-        ).unique().scalars().all()
-        res = top_concepts + top_collections
+        child_count = kwargs.get('child_count', False)
+        res = None
+        if self.top_strategy == 'precomputed':
+            res = self._get_precomputed_top('display', child_count)
+        if not res:
+            res = self._get_top_display(child_count)
         lan = self._get_language(**kwargs)
         sort = self._get_sort(**kwargs)
         sort_order = self._get_sort_order(**kwargs)
+        labels = self._get_listing_labels([c.id for c in res], lan)
         return [
-            self._get_id_and_label(c, lan)
-            for c in self._sort(res, sort, lan, sort_order == 'desc')
+            self._get_display_item(c, lan, res[c], labels, **kwargs)
+            for c in self._sort(list(res), sort, lan, sort_order == 'desc', labels)
         ]
 
+    def _get_top_display(self, child_count=False):
+        configure_mappers()
+        res = {}
+        for model in (ConceptModel, CollectionModel):
+            res.update(self._execute_with_child_count(
+                select(model)
+                .filter(
+                    model.conceptscheme_id == self.conceptscheme_id,
+                    ~model.broader_concepts.any(),
+                    ~model.member_of.any()
+                ),
+                child_count
+            ))
+        return res
+
+    def _execute_with_child_count(self, q, child_count=False):
+        '''
+        Execute a query for concepts or collections, optionally counting
+        their display children in the same query.
+
+        :param q: A query that selects one
+            :class:`skosprovider_sqlalchemy.models.Thing` per row.
+        :param bool child_count: Should the children be counted?
+        :rtype: A :class:`dict` mapping each thing to the number of
+            children or `None` if they were not counted.
+        '''
+        if not child_count:
+            return dict.fromkeys(self.session.execute(q).unique().scalars().all())
+        return dict(
+            self.session.execute(
+                q.add_columns(self._child_count_clause())
+            ).unique().all()
+        )
+
+    def _owned_options(self, model):
+        '''
+        The loader options for the labels, notes and sources of the
+        concepts or collections selected by a query.
+
+        With the `direct` :attr:`label_strategy` there are none, the query
+        results need to be passed to :meth:`_load_owned` instead.
+
+        :param model: The model being queried, eg.
+            :class:`skosprovider_sqlalchemy.models.Thing`.
+        :rtype: list
+        '''
+        if self.label_strategy == 'direct':
+            return []
+        return [
+            selectinload(model.labels),
+            selectinload(model.notes),
+            selectinload(model.sources),
+        ]
+
+    def _load_owned(self, things):
+        '''
+        Load the labels, notes and sources of concepts and collections
+        through their `concept_id` column, when using the `direct`
+        :attr:`label_strategy`. Collections that are already loaded are left
+        alone.
+
+        :param things: A list of
+            :class:`skosprovider_sqlalchemy.models.Thing`.
+        :return: The things that were passed.
+        '''
+        if self.label_strategy != 'direct':
+            return things
+        by_id = {thing.id: thing for thing in things}
+        for attribute, model in (
+            ('labels', LabelModel),
+            ('notes', NoteModel),
+            ('sources', SourceModel),
+        ):
+            ids = [id for id, thing in by_id.items() if attribute not in thing.__dict__]
+            found = defaultdict(list)
+            for i in range(0, len(ids), 500):
+                for item, owner in self.session.execute(
+                    select(model, model.concept_id)
+                    .filter(model.concept_id.in_(ids[i:i + 500]))
+                ):
+                    found[owner].append(item)
+            for id in ids:
+                # By id, like the association strategy.
+                set_committed_value(
+                    by_id[id], attribute, sorted(found[id], key=lambda o: o.id)
+                )
+        return things
+
+    def _get_display_item(self, thing, lan, count, labels=None, **kwargs):
+        '''
+        :param skosprovider_sqlalchemy.models.Thing thing: A concept or
+            collection.
+        :param string lan: A language (eg. "en", "nl", "la", "fr")
+        :param int count: The number of display children of the thing.
+        :param dict labels: The labels to choose from, as returned by
+            :meth:`_get_listing_labels`.
+        '''
+        item = self._get_id_and_label(thing, lan, labels)
+        if kwargs.get('child_count', False):
+            item['child_count'] = count
+            item['has_children'] = count > 0
+        return item
+
+    @instrumented
     def get_children_display(self, thing_id, **kwargs):
         '''
         Return a list of concepts or collections that should be displayed
@@ -474,11 +1482,12 @@ class SQLAlchemyProvider(VocabularyProvider):
             id is present and a label. The label is determined by looking at
             the `**kwargs` parameter, the default language of the provider
             and falls back to `en` if nothing is present. If the id does not
-            exist, return `False`.
+            exist, return `False`. If the `child_count` keyword is `True`,
+            a `child_count` and `has_children` are present as well.
         '''
         try:
-            thing = self.session.execute(
-                select(Thing)
+            thing_id = self.session.execute(
+                select(Thing.id)
                 .filter(
                     Thing.concept_id == str(thing_id),
                     Thing.conceptscheme_id == self.conceptscheme_id
@@ -487,17 +1496,404 @@ class SQLAlchemyProvider(VocabularyProvider):
         except NoResultFound:
             return False
         lan = self._get_language(**kwargs)
-        res = []
-        if thing.type == 'concept':
-            if len(thing.narrower_collections) > 0:
-                res += thing.narrower_collections
-            elif len(thing.narrower_concepts) > 0:
-                res += thing.narrower_concepts
-        if thing.type == 'collection' and hasattr(thing, 'members'):
-            res += thing.members
+        edges = self._get_display_edges({thing_id})
+        children = dict(self._get_display_things(
+            edges[thing_id], kwargs.get('child_count', False)
+        ).values())
         sort = self._get_sort(**kwargs)
         sort_order = self._get_sort_order(**kwargs)
+        labels = self._get_listing_labels([c.id for c in children], lan)
         return [
-            self._get_id_and_label(c, lan)
-            for c in self._sort(res, sort, lan, sort_order == 'desc')
+            self._get_display_item(c, lan, children[c], labels, **kwargs)
+            for c in self._sort(
+                list(children), sort, lan, sort_order == 'desc', labels
+            )
         ]
+
+    @instrumented
+    def get_display_tree(self, root_ids, depth=1, **kwargs):
+        '''
+        Return the display children of several concepts or collections,
+        possibly several levels deep.
+
+        This is the batched equivalent of calling
+        :meth:`get_children_display` for every node of a subtree. It
+        only issues a constant number of queries per level.
+
+        :param list root_ids: A list of concept or collection ids.
+        :param int depth: How many levels of children should be returned.
+        :rtype: A :class:`dict` mapping each root id to a list of concepts
+            and collections or `False` if the id does not exist. For each
+            child an id, uri, type and label are present, just like with
+            :meth:`get_children_display`. A `has_children` flag indicates if
+            the child has children of its own. When the `child_count`
+            keyword is `True`, the number of children is present as well.
+            Children that are less than
+            `depth` levels removed from the root also have a list of
+            `children`.
+        :raises ValueError: When `depth` is smaller than 1.
+        '''
+        if depth < 1:
+            raise ValueError('Please provide a depth of at least 1.')
+        lan = self._get_language(**kwargs)
+        sort = self._get_sort(**kwargs)
+        sort_order = self._get_sort_order(**kwargs)
+        root_ids = list(root_ids)
+        roots = []
+        for i in range(0, len(root_ids), 500):
+            roots += self.session.execute(
+                select(Thing.id, Thing.concept_id)
+                .filter(
+                    Thing.conceptscheme_id == self.conceptscheme_id,
+                    Thing.concept_id.in_([str(r) for r in root_ids[i:i + 500]])
+                )
+            ).all()
+
+        edges = {}
+        things = {}
+        labels = {}
+        frontier = {root.id for root in roots}
+        for _ in range(depth):
+            frontier -= set(edges)
+            if not frontier:
+                break
+            level = self._get_display_edges(frontier)
+            edges.update(level)
+            children = {c for cs in level.values() for c in cs}
+            new = children - set(things)
+            things.update(self._get_display_things(new))
+            labels.update(self._get_listing_labels(new, lan))
+            frontier = {c for c in children if things[c][1] > 0}
+
+        def _build(parent_id, level):
+            children = dict(things[c] for c in edges.get(parent_id, []))
+            res = []
+            for c in self._sort(
+                list(children), sort, lan, sort_order == 'desc', labels
+            ):
+                child = self._get_display_item(c, lan, children[c], labels, **kwargs)
+                child['has_children'] = children[c] > 0
+                if level < depth:
+                    child['children'] = _build(c.id, level + 1)
+                res.append(child)
+            return res
+
+        tree = {str(r): False for r in root_ids}
+        for root in roots:
+            tree[root.concept_id] = _build(root.id, 1)
+        return tree
+
+    def _get_display_edges(self, parent_ids):
+        '''
+        Find the display children of several concepts or collections.
+
+        :param set parent_ids: Internal ids of concepts or collections.
+        :rtype: A :class:`dict` mapping each parent id to a list of internal
+            ids of its children.
+        '''
+        chc = concept_hierarchy_concept.c
+        chcol = concept_hierarchy_collection.c
+        cc = collection_concept.c
+        subordinate = {parent_id: [] for parent_id in parent_ids}
+        other = {parent_id: [] for parent_id in parent_ids}
+        parent_ids = list(parent_ids)
+        for i in range(0, len(parent_ids), 500):
+            chunk = parent_ids[i:i + 500]
+            q = union_all(
+                select(
+                    chcol.concept_id_broader, chcol.collection_id_narrower,
+                    literal(True)
+                ).filter(chcol.concept_id_broader.in_(chunk)),
+                select(
+                    chc.concept_id_broader, chc.concept_id_narrower,
+                    literal(False)
+                ).filter(chc.concept_id_broader.in_(chunk)),
+                select(
+                    cc.collection_id, cc.concept_id,
+                    literal(False)
+                ).filter(cc.collection_id.in_(chunk))
+            )
+            for parent_id, child_id, is_subordinate in self.session.execute(q):
+                if is_subordinate:
+                    subordinate[parent_id].append(child_id)
+                else:
+                    other[parent_id].append(child_id)
+        # A concept shows its subordinate arrays instead of its narrower
+        # concepts when it has any, just like get_children_display
+        return {
+            parent_id: subordinate[parent_id] or other[parent_id]
+            for parent_id in parent_ids
+        }
+
+    def _get_display_things(self, ids, child_count=True):
+        '''
+        Load several concepts or collections and optionally count their
+        display children.
+
+        :param set ids: Internal ids of concepts or collections.
+        :param bool child_count: Should the children be counted?
+        :rtype: A :class:`dict` mapping each id to a tuple of the
+            :class:`skosprovider_sqlalchemy.models.Thing` and the number of
+            display children it has or `None` if they were not counted.
+        '''
+        ids = list(ids)
+        res = {}
+        for i in range(0, len(ids), 500):
+            res.update(
+                (thing.id, (thing, count))
+                for thing, count in self._execute_with_child_count(
+                    select(Thing)
+                    .filter(Thing.id.in_(ids[i:i + 500])),
+                    child_count
+                ).items()
+            )
+        return res
+
+    def _child_count_clause(self):
+        '''
+        A clause that counts the display children of the :class:`Thing`
+        being queried, following the rules of :meth:`get_children_display`.
+        '''
+        collections = (
+            select(func.count())
+            .where(concept_hierarchy_collection.c.concept_id_broader == Thing.id)
+            .scalar_subquery()
+        )
+        concepts = (
+            select(func.count())
+            .where(concept_hierarchy_concept.c.concept_id_broader == Thing.id)
+            .scalar_subquery()
+        )
+        members = (
+            select(func.count())
+            .where(collection_concept.c.collection_id == Thing.id)
+            .scalar_subquery()
+        )
+        return case(
+            (collections > 0, collections),
+            else_=concepts + members
+        ).label('child_count')
+
+    @instrumented
+    def iter_raw(self, concept_ids=None, chunk_size=1000, relation_uris=False):
+        '''
+        Iterate over concepts and collections as lightweight records.
+
+        This is meant for internal batch jobs such as exports, matching or
+        indexing. Instead of building full :class:`skosprovider.skos.Concept`
+        and :class:`skosprovider.skos.Collection` objects, this method yields
+        :class:`ThingRecord` instances. The database is read in chunks,
+        ordered by the internal id, and all labels, notes, sources, matches
+        and relations of a chunk are fetched with a fixed number of queries.
+
+        :param list concept_ids: Only return the concepts or collections with
+            these ids. When `None`, everything in the conceptscheme is
+            returned.
+        :param int chunk_size: How many concepts or collections to read from
+            the database at once.
+        :param bool relation_uris: Refer to related concepts and collections
+            by their :term:`URI` instead of their id. Saves exports from
+            having to look up every related concept.
+        :rtype: A generator of :class:`ThingRecord` instances.
+        '''
+        concept_table = Thing.__table__
+        last_id = None
+        while True:
+            q = (
+                select(
+                    concept_table.c.id,
+                    concept_table.c.concept_id,
+                    concept_table.c.uri,
+                    concept_table.c.type,
+                    concept_table.c.infer_concept_relations
+                )
+                .filter(concept_table.c.conceptscheme_id == self.conceptscheme_id)
+                .order_by(concept_table.c.id)
+                .limit(chunk_size)
+            )
+            if concept_ids is not None:
+                q = q.filter(
+                    concept_table.c.concept_id.in_([str(c) for c in concept_ids])
+                )
+            if last_id is not None:
+                q = q.filter(concept_table.c.id > last_id)
+            rows = self.session.execute(q).all()
+            if not rows:
+                return
+            yield from self._raw_chunk(rows, relation_uris)
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1].id
+
+    def _raw_chunk(self, rows, relation_uris=False):
+        '''
+        Turn a chunk of rows from the concept table into records.
+
+        :param list rows: Rows with an id, concept_id, uri, type and
+            infer_concept_relations.
+        :param bool relation_uris: Refer to related things by their
+            :term:`URI` instead of their id.
+        :rtype: A generator of :class:`ThingRecord` instances.
+        '''
+        ids = [row.id for row in rows]
+        labels = defaultdict(list)
+        for cid, label, labeltype_id, language_id in self.session.execute(
+            self._owned_select(
+                LabelModel, concept_label, 'label_id', ids,
+                LabelModel.label, LabelModel.labeltype_id, LabelModel.language_id
+            )
+        ):
+            labels[cid].append(LabelRecord(label, labeltype_id, language_id))
+        notes = defaultdict(list)
+        for cid, note, notetype_id, language_id, markup in self.session.execute(
+            self._owned_select(
+                NoteModel, concept_note, 'note_id', ids,
+                NoteModel.note, NoteModel.notetype_id, NoteModel.language_id,
+                NoteModel.markup
+            )
+        ):
+            notes[cid].append(NoteRecord(note, notetype_id, language_id, markup))
+        sources = defaultdict(list)
+        for cid, citation, markup in self.session.execute(
+            self._owned_select(
+                SourceModel, concept_source, 'source_id', ids,
+                SourceModel.citation, SourceModel.markup
+            )
+        ):
+            sources[cid].append(SourceRecord(citation, markup))
+        matches = defaultdict(list)
+        for cid, matchtype_id, uri in self.session.execute(
+            select(MatchModel.concept_id, MatchModel.matchtype_id, MatchModel.uri)
+            .filter(MatchModel.concept_id.in_(ids))
+        ):
+            matches[cid].append((matchtype_id, uri))
+
+        chc = concept_hierarchy_concept.c
+        chcol = concept_hierarchy_collection.c
+        crc = concept_related_concept.c
+        cc = collection_concept.c
+        broader = self._raw_relations(
+            ids, chc.concept_id_narrower, chc.concept_id_broader, relation_uris
+        )
+        narrower = self._raw_relations(
+            ids, chc.concept_id_broader, chc.concept_id_narrower, relation_uris
+        )
+        superordinates = self._raw_relations(
+            ids, chcol.collection_id_narrower, chcol.concept_id_broader, relation_uris
+        )
+        subordinate_arrays = self._raw_relations(
+            ids, chcol.concept_id_broader, chcol.collection_id_narrower, relation_uris
+        )
+        related = self._raw_relations(
+            ids, crc.concept_id_to, crc.concept_id_from, relation_uris
+        )
+        member_of = self._raw_relations(
+            ids, cc.concept_id, cc.collection_id, relation_uris
+        )
+        members = self._raw_relations(
+            ids, cc.collection_id, cc.concept_id, relation_uris
+        )
+
+        for row in rows:
+            if row.type == 'collection':
+                yield ThingRecord(
+                    id=row.concept_id,
+                    uri=row.uri or self.uri_generator.generate(
+                        type='collection', id=row.concept_id
+                    ),
+                    type='collection',
+                    labels=labels[row.id],
+                    notes=notes[row.id],
+                    sources=sources[row.id],
+                    broader=[],
+                    narrower=[],
+                    related=[],
+                    member_of=member_of[row.id],
+                    members=members[row.id],
+                    subordinate_arrays=[],
+                    superordinates=superordinates[row.id],
+                    matches={},
+                    infer_concept_relations=row.infer_concept_relations
+                )
+            else:
+                thing_matches = {key: [] for key in Concept.matchtypes}
+                for matchtype_id, uri in matches[row.id]:
+                    thing_matches[matchtype_id[:matchtype_id.find('Match')]].append(uri)
+                yield ThingRecord(
+                    id=row.concept_id,
+                    uri=row.uri or self.uri_generator.generate(
+                        type='concept', id=row.concept_id
+                    ),
+                    type='concept',
+                    labels=labels[row.id],
+                    notes=notes[row.id],
+                    sources=sources[row.id],
+                    broader=broader[row.id],
+                    narrower=narrower[row.id],
+                    related=related[row.id],
+                    member_of=member_of[row.id],
+                    members=[],
+                    subordinate_arrays=subordinate_arrays[row.id],
+                    superordinates=[],
+                    matches=thing_matches,
+                    infer_concept_relations=None
+                )
+
+    def _owned_select(self, model, link, column, ids, *columns):
+        '''
+        Select the labels, notes or sources of several concepts or
+        collections, preceded by the internal id of their owner.
+
+        :param model: :class:`skosprovider_sqlalchemy.models.Label`,
+            :class:`skosprovider_sqlalchemy.models.Note` or
+            :class:`skosprovider_sqlalchemy.models.Source`.
+        :param link: The association table between the owners and the
+            model, used by the `association` :attr:`label_strategy`.
+        :param str column: The column of the association table that refers
+            to the model.
+        :param list ids: Internal ids of the owners.
+        :param columns: The columns of the model to select.
+        '''
+        if self.label_strategy == 'direct':
+            return (
+                select(model.concept_id, *columns)
+                .filter(model.concept_id.in_(ids))
+            )
+        return (
+            select(link.c.concept_id, *columns)
+            .join(model, model.id == link.c[column])
+            .filter(link.c.concept_id.in_(ids))
+        )
+
+    def _raw_relations(self, ids, source, target, uris=False):
+        '''
+        Read one relation from an association table for a list of things.
+
+        :param list ids: Internal ids of the things to read the relation for.
+        :param source: The column of the association table pointing to the
+            things.
+        :param target: The column of the association table pointing to the
+            related things.
+        :param bool uris: Return the :term:`URIs <URI>` of the related things
+            instead of their concept ids.
+        :rtype: A :class:`dict` mapping each internal id to a list of
+            concept ids or :term:`URIs <URI>`.
+        '''
+        target_table = Thing.__table__.alias()
+        res = defaultdict(list)
+        for source_id, target_id, uri, type in self.session.execute(
+            select(
+                source,
+                target_table.c.concept_id,
+                target_table.c.uri,
+                target_table.c.type
+            )
+            .join(target_table, target_table.c.id == target)
+            .filter(source.in_(ids))
+        ):
+            if uris:
+                target_id = uri or self.uri_generator.generate(
+                    type=type, id=target_id
+                )
+            res[source_id].append(target_id)
+        return res
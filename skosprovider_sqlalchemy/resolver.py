@@ -0,0 +1,206 @@
+'''
+Find out which conceptscheme and concept a :term:`URI` belongs to.
+
+Without a resolver, finding the concept behind an arbitrary :term:`URI`
+means asking every provider in turn. The :class:`UriResolver` looks in all
+conceptschemes at once. Concepts and collections that have no :term:`URI`
+stored in the database are found as well, by recognising the
+:term:`URIs <URI>` the `uri_generator` of their provider generates.
+'''
+import time
+
+from sqlalchemy import and_
+from sqlalchemy import func
+from sqlalchemy import or_
+from sqlalchemy import select
+
+from skosprovider_sqlalchemy.models import Thing
+
+_SENTINEL = 'SkosProviderId'
+
+
+class GeneratedUriPattern:
+    '''
+    Recognises the :term:`URIs <URI>` generated by a
+    :class:`skosprovider.uri.UriGenerator`.
+
+    The generator is asked to generate a :term:`URI` for a sentinel id. What
+    comes before and after the sentinel is the same for every generated
+    :term:`URI`. These are kept as `prefix` and `suffix`. When the generator
+    lowercases the id, `lowercase` is `True`.
+
+    :param int conceptscheme_id: The id of the conceptscheme the
+        :term:`URIs <URI>` are generated for.
+    :param generator: A :class:`skosprovider.uri.UriGenerator`.
+    :param str type: Either `concept` or `collection`.
+    :raises ValueError: When the generated :term:`URIs <URI>` are not a
+        fixed prefix and suffix around the id.
+    '''
+
+    def __init__(self, conceptscheme_id, generator, type):
+        self.conceptscheme_id = conceptscheme_id
+        self.type = type
+        generated = generator.generate(type=type, id=_SENTINEL)
+        self.lowercase = _SENTINEL not in generated
+        if self.lowercase:
+            generated = generated.replace(_SENTINEL.lower(), _SENTINEL)
+        if generated.count(_SENTINEL) != 1:
+            raise ValueError('Unable to recognise the generated URIs.')
+        self.prefix, self.suffix = generated.split(_SENTINEL)
+
+    def match(self, uri):
+        '''
+        :param str uri: A :term:`URI`.
+        :rtype: The concept id the :term:`URI` was generated for, or `None`.
+        '''
+        if (
+            len(uri) > len(self.prefix) + len(self.suffix)
+            and uri.startswith(self.prefix)
+            and uri.endswith(self.suffix)
+        ):
+            return uri[len(self.prefix):len(uri) - len(self.suffix)]
+        return None
+
+
+class UriResolver:
+    '''
+    Resolves :term:`URIs <URI>` to conceptschemes and concepts.
+
+    :param session: A database session. This can also be a callable that
+        returns a Session.
+    :param list providers: Providers whose generated :term:`URIs <URI>`
+        should be recognised. See :meth:`add_provider`.
+    :param bool cache: Should resolved :term:`URIs <URI>` be kept in memory?
+    :param int cache_ttl: The number of seconds the cache remains valid.
+        When `None`, the cache never expires and :meth:`clear_cache` needs
+        to be called to pick up changes made in the database.
+    '''
+
+    def __init__(self, session, providers=(), cache=False, cache_ttl=None):
+        try:
+            self.session = session()
+        except TypeError:
+            self.session = session
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+        self._cache = {}
+        self._cache_loaded = time.monotonic()
+        self._patterns = []
+        for provider in providers:
+            self.add_provider(provider)
+
+    def add_provider(self, provider):
+        '''
+        Recognise the :term:`URIs <URI>` generated by a provider.
+
+        Only needed for concepts and collections that have no :term:`URI`
+        stored in the database.
+
+        :param provider: A
+            :class:`skosprovider_sqlalchemy.providers.SQLAlchemyProvider`.
+        '''
+        for type in ('concept', 'collection'):
+            try:
+                pattern = GeneratedUriPattern(
+                    provider.conceptscheme_id, provider.uri_generator, type
+                )
+            except ValueError:
+                continue
+            self._patterns.append(pattern)
+
+    def clear_cache(self):
+        '''
+        Forget all :term:`URIs <URI>` that were resolved before.
+        '''
+        self._cache = {}
+        self._cache_loaded = time.monotonic()
+
+    def resolve(self, uri):
+        '''
+        Find the conceptscheme and concept a :term:`URI` belongs to.
+
+        :param str uri: The :term:`URI` of a concept or collection.
+        :rtype: A tuple of a conceptscheme id and a concept id, or `False`
+            if the :term:`URI` is unknown.
+        '''
+        return self.resolve_uris([uri]).get(uri, False)
+
+    def resolve_uris(self, uris, chunk_size=1000):
+        '''
+        Find the conceptschemes and concepts several :term:`URIs <URI>`
+        belong to.
+
+        Stored :term:`URIs <URI>` are looked up in all conceptschemes with a
+        single indexed query per chunk. :term:`URIs <URI>` that look like
+        they were generated by a provider are looked up with one extra
+        query.
+
+        :param list uris: The :term:`URIs <URI>` of concepts or collections.
+        :param int chunk_size: How many :term:`URIs <URI>` to look up in one
+            query.
+        :rtype: A :class:`dict` mapping every :term:`URI` that was found to
+            a tuple of a conceptscheme id and a concept id. Should a
+            :term:`URI` be present in several conceptschemes, the one with the
+            lowest id is used.
+        '''
+        if self.cache and self.cache_ttl is not None and (
+            time.monotonic() - self._cache_loaded > self.cache_ttl
+        ):
+            self.clear_cache()
+        uris = list(dict.fromkeys(uris))
+        res = {uri: self._cache[uri] for uri in uris if uri in self._cache}
+        missing = [uri for uri in uris if uri not in res]
+        for i in range(0, len(missing), chunk_size):
+            chunk = missing[i:i + chunk_size]
+            found = self._resolve_stored(chunk)
+            found.update(self._resolve_generated(
+                [uri for uri in chunk if uri not in found]
+            ))
+            res.update(found)
+            if self.cache:
+                self._cache.update(found)
+        return res
+
+    def _resolve_stored(self, uris):
+        res = {}
+        for uri, conceptscheme_id, concept_id in self.session.execute(
+            select(Thing.uri, Thing.conceptscheme_id, Thing.concept_id)
+            .filter(Thing.uri.in_(uris))
+            .order_by(Thing.conceptscheme_id.desc())
+        ):
+            res[uri] = (conceptscheme_id, concept_id)
+        return res
+
+    def _resolve_generated(self, uris):
+        candidates = {}
+        for uri in uris:
+            for pattern in self._patterns:
+                concept_id = pattern.match(uri)
+                if concept_id is not None:
+                    key = (pattern.conceptscheme_id, concept_id, pattern.type)
+                    candidates.setdefault(key, (pattern, []))[1].append(uri)
+        if not candidates:
+            return {}
+        clauses = [
+            and_(
+                Thing.conceptscheme_id == conceptscheme_id,
+                func.lower(Thing.concept_id) == concept_id
+                if pattern.lowercase else Thing.concept_id == concept_id
+            )
+            for (conceptscheme_id, concept_id, _), (pattern, _) in candidates.items()
+        ]
+        res = {}
+        for conceptscheme_id, concept_id, type in self.session.execute(
+            select(Thing.conceptscheme_id, Thing.concept_id, Thing.type)
+            .filter(Thing.uri.is_(None), or_(*clauses))
+            .order_by(Thing.conceptscheme_id.desc())
+        ):
+            for key in {
+                (conceptscheme_id, concept_id, type),
+                (conceptscheme_id, concept_id.lower(), type),
+            }:
+                pattern, pattern_uris = candidates.get(key, (None, []))
+                if pattern and (pattern.lowercase or key[1] == concept_id):
+                    for uri in pattern_uris:
+                        res[uri] = (conceptscheme_id, concept_id)
+        return res
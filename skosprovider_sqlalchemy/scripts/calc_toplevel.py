@@ -0,0 +1,41 @@
+import os
+import sys
+
+from sqlalchemy import create_engine
+from sqlalchemy import delete
+from sqlalchemy.orm import sessionmaker
+
+from ..models import ConceptScheme
+from ..models import TopLevel
+from ..utils import TopLevelCalculator
+
+
+
+def usage(argv):
+    cmd = os.path.basename(argv[0])
+    print('usage: %s <connect_uri> <concept_scheme_id>\n'
+          '(example: "%s sqlite:///skos.db 1")' % (cmd, cmd))
+    sys.exit(1)
+
+
+def main(argv=sys.argv):
+    if len(argv) != 3:
+        usage(argv)
+    connect_uri = argv[1]
+    scheme_id = argv[2]
+    engine = create_engine(connect_uri)
+    session = sessionmaker(
+        bind=engine,
+    )()
+    tc = TopLevelCalculator(session)
+    cs = session.get(ConceptScheme, scheme_id)
+    session.execute(
+        delete(TopLevel).where(TopLevel.conceptscheme_id == cs.id)
+    )
+    for t in tc.calculate(cs):
+        session.add(TopLevel(
+            conceptscheme=cs,
+            concept_id=t['id'],
+            hierarchy=t['hierarchy']
+        ))
+    session.commit()
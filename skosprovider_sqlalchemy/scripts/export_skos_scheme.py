@@ -0,0 +1,52 @@
+import argparse
+import sys
+
+from skosprovider.uri import UriPatternGenerator
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from ..export import export_jsonld
+from ..export import export_ntriples
+from ..export import export_turtle
+from ..providers import SQLAlchemyProvider
+
+EXPORTERS = {
+    'nt': export_ntriples,
+    'ttl': export_turtle,
+    'jsonld': export_jsonld,
+}
+
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(
+        prog=argv[0],
+        description='Export a conceptscheme as N-Triples, Turtle or JSON-LD.'
+    )
+    parser.add_argument('connect_uri')
+    parser.add_argument('conceptscheme_id', type=int)
+    parser.add_argument('output', help='The file to write to, or - for stdout.')
+    parser.add_argument('--format', choices=sorted(EXPORTERS), default='nt')
+    parser.add_argument(
+        '--pattern',
+        help='A pattern such as http://id.example.com/%%s, used for concepts '
+             'without a stored URI.'
+    )
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args(argv[1:])
+    engine = create_engine(args.connect_uri)
+    session = sessionmaker(
+        bind=engine,
+    )()
+    kwargs = {}
+    if args.pattern:
+        kwargs['uri_generator'] = UriPatternGenerator(args.pattern)
+    provider = SQLAlchemyProvider(
+        {'id': str(args.conceptscheme_id)}, session, **kwargs
+    )
+    export = EXPORTERS[args.format]
+    if args.output == '-':
+        count = export(provider, sys.stdout, args.chunk_size)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            count = export(provider, f, args.chunk_size)
+    print('Exported %d concepts and collections' % count, file=sys.stderr)
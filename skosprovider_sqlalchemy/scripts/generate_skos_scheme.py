@@ -0,0 +1,44 @@
+import argparse
+import sys
+
+from sqlalchemy import create_engine
+
+from ..generator import generate_scheme
+
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(
+        prog=argv[0],
+        description='Generate a synthetic conceptscheme in an existing '
+                    'database, eg. one created with init_skos_db.'
+    )
+    parser.add_argument('connect_uri')
+    parser.add_argument('--size', type=int, default=1000)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--branching', type=int, default=5)
+    parser.add_argument('--polyhierarchy', type=float, default=0.05)
+    parser.add_argument('--related', type=float, default=0.02)
+    parser.add_argument('--collections', type=int, default=10)
+    parser.add_argument('--languages', default='nl,en,fr')
+    parser.add_argument('--labels-per-concept', type=int, default=2)
+    parser.add_argument('--notes', type=float, default=0.5)
+    parser.add_argument('--matches', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv[1:])
+    engine = create_engine(args.connect_uri)
+    with engine.begin() as conn:
+        cs_id = generate_scheme(
+            conn,
+            size=args.size,
+            depth=args.depth,
+            branching=args.branching,
+            polyhierarchy=args.polyhierarchy,
+            related=args.related,
+            collections=args.collections,
+            languages=args.languages.split(','),
+            labels_per_concept=args.labels_per_concept,
+            notes=args.notes,
+            matches=args.matches,
+            seed=args.seed
+        )
+    print('Created conceptscheme %d' % cs_id)
@@ -0,0 +1,44 @@
+import argparse
+import sys
+
+from skosprovider.uri import UriPatternGenerator
+from sqlalchemy import create_engine
+
+from ..loaders import CHUNK_SIZE
+from ..loaders import load_csv
+
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(
+        prog=argv[0],
+        description='Load or update concepts in a conceptscheme from a CSV '
+                    'or TSV file with <id>,<prefLabel>,<note>,<source> rows.'
+    )
+    parser.add_argument('connect_uri')
+    parser.add_argument('conceptscheme_id', type=int)
+    parser.add_argument('file', help='The CSV or TSV file, or - for stdin.')
+    parser.add_argument('--language', default='und')
+    parser.add_argument('--tsv', action='store_true')
+    parser.add_argument('--header', action='store_true')
+    parser.add_argument(
+        '--pattern',
+        help='A pattern such as http://id.example.com/%%s to store the URIs '
+             'of the concepts with.'
+    )
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv[1:])
+    kwargs = {
+        'language': args.language,
+        'delimiter': '\t' if args.tsv else ',',
+        'header': args.header,
+        'uri_generator': UriPatternGenerator(args.pattern) if args.pattern else None,
+        'chunk_size': args.chunk_size,
+    }
+    engine = create_engine(args.connect_uri)
+    with engine.begin() as conn:
+        if args.file == '-':
+            res = load_csv(conn, sys.stdin, args.conceptscheme_id, **kwargs)
+        else:
+            with open(args.file, encoding='utf-8', newline='') as f:
+                res = load_csv(conn, f, args.conceptscheme_id, **kwargs)
+    print('Created %(created)d and updated %(updated)d concepts' % res)
@@ -0,0 +1,36 @@
+import argparse
+import sys
+
+from sqlalchemy import create_engine
+
+from ..loaders import CHUNK_SIZE
+from ..loaders import load_ntriples
+
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(
+        prog=argv[0],
+        description='Load a SKOS dump in N-Triples format into an existing '
+                    'database, eg. one created with init_skos_db.'
+    )
+    parser.add_argument('connect_uri')
+    parser.add_argument('dump', help='The N-Triples file, or - for stdin.')
+    parser.add_argument(
+        '--conceptscheme-id', type=int,
+        help='An empty conceptscheme to load the dump into. By default a new '
+             'conceptscheme is created.'
+    )
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv[1:])
+    engine = create_engine(args.connect_uri)
+    with engine.begin() as conn:
+        if args.dump == '-':
+            cs_id = load_ntriples(
+                conn, sys.stdin, args.conceptscheme_id, args.chunk_size
+            )
+        else:
+            with open(args.dump, encoding='utf-8') as f:
+                cs_id = load_ntriples(
+                    conn, f, args.conceptscheme_id, args.chunk_size
+                )
+    print('Loaded conceptscheme %d' % cs_id)
@@ -0,0 +1,43 @@
+import argparse
+import sys
+
+from skosprovider.uri import DefaultUrnGenerator
+from skosprovider.uri import UriPatternGenerator
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from ..utils import materialize_uris
+
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(
+        prog=argv[0],
+        description='Store the generated URIs of the concepts and collections '
+                    'in a conceptscheme that have no URI.'
+    )
+    parser.add_argument('connect_uri')
+    parser.add_argument('conceptscheme_id', type=int)
+    parser.add_argument(
+        '--pattern',
+        help='A pattern such as http://id.example.com/%%s. When absent, the '
+             'URN a provider generates by default is stored.'
+    )
+    parser.add_argument(
+        '--vocabulary-id',
+        help='The id of the provider, used for the default URN. Defaults to '
+             'the conceptscheme id.'
+    )
+    args = parser.parse_args(argv[1:])
+    if args.pattern:
+        uri_generator = UriPatternGenerator(args.pattern)
+    else:
+        uri_generator = DefaultUrnGenerator(
+            args.vocabulary_id or str(args.conceptscheme_id)
+        )
+    engine = create_engine(args.connect_uri)
+    session = sessionmaker(
+        bind=engine,
+    )()
+    count = materialize_uris(session, args.conceptscheme_id, uri_generator)
+    session.commit()
+    print('Stored %d URIs' % count)
@@ -0,0 +1,22 @@
+import os
+import sys
+
+from sqlalchemy import create_engine
+
+from ..utils import upgrade_database
+
+
+def usage(argv):
+    cmd = os.path.basename(argv[0])
+    print('usage: %s <connect_uri>\n'
+          '(example: "%s sqlite:///skos.db")' % (cmd, cmd))
+    sys.exit(1)
+
+
+def main(argv=sys.argv):
+    if len(argv) != 2:
+        usage(argv)
+    connect_uri = argv[1]
+    engine = create_engine(connect_uri)
+    for name in upgrade_database(engine):
+        print('Created %s' % name)
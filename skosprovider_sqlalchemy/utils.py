@@ -1,13 +1,31 @@
+import itertools
 import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
 from language_tags import tags
 from skosprovider.skos import Collection
 from skosprovider.skos import Concept
 from skosprovider.providers import VocabularyProvider
+from sqlalchemy import event
+from sqlalchemy import Integer
+from sqlalchemy import func
+from sqlalchemy import inspect
+from sqlalchemy import literal
+from sqlalchemy import or_
 from sqlalchemy import select
+from sqlalchemy import text
+from sqlalchemy import union
+from sqlalchemy import update
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.orm.session import Session
+from sqlalchemy.schema import CreateColumn
 
+from skosprovider_sqlalchemy.bulk import removed_ids
+from skosprovider_sqlalchemy.bulk import reset_sequences
+from skosprovider_sqlalchemy.bulk import temporary_table
+from skosprovider_sqlalchemy.models import Base
 from skosprovider_sqlalchemy.models import ConceptScheme as ConceptSchemeModel
 from skosprovider_sqlalchemy.models import Collection as CollectionModel
 from skosprovider_sqlalchemy.models import Concept as ConceptModel
@@ -17,9 +35,37 @@ from skosprovider_sqlalchemy.models import Match as MatchModel
 from skosprovider_sqlalchemy.models import Note as NoteModel
 from skosprovider_sqlalchemy.models import Source as SourceModel
 from skosprovider_sqlalchemy.models import Thing as ThingModel
+from skosprovider_sqlalchemy.models import TopLevel as TopLevelModel
+from skosprovider_sqlalchemy.models import Visitation as VisitationModel
+from skosprovider_sqlalchemy.models import collection_concept
+from skosprovider_sqlalchemy.models import concept_hierarchy_collection
+from skosprovider_sqlalchemy.models import concept_hierarchy_concept
+from skosprovider_sqlalchemy.models import concept_label
+from skosprovider_sqlalchemy.models import concept_note
+from skosprovider_sqlalchemy.models import concept_related_concept
+from skosprovider_sqlalchemy.models import concept_source
+from skosprovider_sqlalchemy.models import conceptscheme_label
+from skosprovider_sqlalchemy.models import conceptscheme_language
+from skosprovider_sqlalchemy.models import conceptscheme_note
+from skosprovider_sqlalchemy.models import conceptscheme_source
+from skosprovider_sqlalchemy.models import has_owner_columns
+from skosprovider_sqlalchemy.providers import SQLAlchemyProvider
+from skosprovider_sqlalchemy.resolver import GeneratedUriPattern
 
 log = logging.getLogger(__name__)
 
+ImportReport = namedtuple(
+    'ImportReport',
+    ['provider_id', 'conceptscheme_id', 'concepts', 'duration', 'error']
+)
+'''
+The outcome of importing one provider with :func:`import_providers`.
+
+Holds the id of the provider, the id of the conceptscheme it was imported
+into, the number of concepts and collections, the duration in seconds and
+the exception that stopped the import, if any.
+'''
+
 
 def import_provider(provider: VocabularyProvider, session: Session, conceptscheme: ConceptSchemeModel = None) -> ConceptSchemeModel:
     '''
@@ -40,10 +86,31 @@ def import_provider(provider: VocabularyProvider, session: Session, conceptschem
         was created by this function.
     :rtype: skosprovider_sqlalchemy.models.Conceptscheme
     '''
+    return _import_things(
+        provider.concept_scheme, _read_things(provider), session, conceptscheme
+    )
 
 
+def _read_things(provider):
+    '''
+    Read the concepts and collections of a provider one at a time.
+
+    :rtype: A generator of :class:`skosprovider.skos.Concept` and
+        :class:`skosprovider.skos.Collection` instances.
+    '''
+    for stuff in provider.get_all():
+        yield provider.get_by_id(stuff['id'])
+
+
+def _import_things(cs, things, session, conceptscheme=None):
+    '''
+    Import a conceptscheme and the concepts and collections read from a
+    provider. See :func:`import_provider`.
+
+    The concepts and collections are only iterated once. Apart from their
+    relations, nothing is kept of them once they have been flushed.
+    '''
     # Copy information about the scheme
-    cs = provider.concept_scheme
 
     if not conceptscheme:
         conceptscheme = ConceptSchemeModel(
@@ -60,23 +127,33 @@ def import_provider(provider: VocabularyProvider, session: Session, conceptschem
     for l in cs.languages:
         language = _check_language(l, session)
         conceptscheme.languages.append(language)
+    session.flush()
 
-    # First pass: load all concepts and collections
-    for stuff in provider.get_all():
-        c = provider.get_by_id(stuff['id'])
+    # First pass: load all concepts and collections, remember their relations
+    relations = []
+    for i, c in enumerate(things, 1):
         log.warning(c)
         if isinstance(c, Concept):
             cm = ConceptModel(
                 concept_id=str(c.id),
                 uri=c.uri,
-                conceptscheme=conceptscheme
+                conceptscheme_id=conceptscheme.id
             )
+            if c.narrower or c.subordinate_arrays or c.related:
+                relations.append(Concept(
+                    c.id,
+                    narrower=c.narrower,
+                    subordinate_arrays=c.subordinate_arrays,
+                    related=c.related
+                ))
         elif isinstance(c, Collection):
             cm = CollectionModel(
                 concept_id=str(c.id),
                 uri=c.uri,
-                conceptscheme=conceptscheme
+                conceptscheme_id=conceptscheme.id
             )
+            if c.members:
+                relations.append(Collection(c.id, members=c.members))
         session.add(cm)
         _add_labels(cm, c.labels, session)
         _add_notes(cm, c.notes, session)
@@ -87,12 +164,13 @@ def import_provider(provider: VocabularyProvider, session: Session, conceptschem
                 for m in c.matches[mt]:
                     match = MatchModel(matchtype_id=matchtype, uri=m)
                     cm.matches.append(match)
+        if i % 1000 == 0:
+            session.flush()
 
     session.flush()
 
     # Second pass: link
-    for stuff in provider.get_all():
-        c = provider.get_by_id(stuff['id'])
+    for c in relations:
         log.warning(c)
         if isinstance(c, Concept):
             cm = session.execute(
@@ -172,6 +250,544 @@ def import_provider(provider: VocabularyProvider, session: Session, conceptschem
     return conceptscheme
 
 
+def import_providers(providers, session_maker, max_workers=4):
+    '''
+    Import several providers at the same time.
+
+    Every provider is imported with :func:`import_provider` into a new
+    conceptscheme, in its own session and transaction, by a pool of threads.
+    Should reading or importing one provider fail, its error is logged and
+    reported, only its transaction is rolled back and the others carry on.
+
+    All providers share the `language` table. To keep the imports from
+    inserting the same language at the same time, which can lead to
+    deadlocks or duplicate keys, the languages used by all providers are
+    added first, in a single transaction and in a fixed order. They are
+    collected in a first pass over every provider that does not keep the
+    concepts and collections it reads, so a provider is read twice but never
+    held in memory.
+
+    :param list providers: The
+        :class:`skosprovider.providers.VocabularyProvider` instances to
+        import.
+    :param session_maker: A :class:`sqlalchemy.orm.sessionmaker`. Each
+        import gets a session, and thereby a connection, of its own.
+    :param int max_workers: The number of providers imported at once.
+    :rtype: A list with an :class:`ImportReport` per provider, in the order
+        of `providers`.
+    '''
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        read = list(executor.map(_read_languages, providers))
+        languages = set()
+        for provider_languages, _, error in read:
+            if error is None:
+                languages |= provider_languages
+        session = session_maker()
+        try:
+            for language in sorted(languages):
+                if tags.check(language):
+                    _check_language(language, session)
+            session.commit()
+        finally:
+            session.close()
+        reports = list(executor.map(
+            lambda args: _import_in_session(*args, session_maker),
+            zip(providers, read)
+        ))
+    for report in reports:
+        log.info(
+            'Imported %s into conceptscheme %s: %d concepts in %.2fs.',
+            report.provider_id, report.conceptscheme_id,
+            report.concepts, report.duration
+        )
+    return reports
+
+
+def _read_languages(provider):
+    '''
+    Collect the languages used by the conceptscheme, concepts and
+    collections of a provider, without keeping them.
+
+    :rtype: A tuple of the set of languages, the duration in seconds and
+        the exception raised while reading, if any.
+    '''
+    start = time.perf_counter()
+    try:
+        cs = provider.concept_scheme
+        languages = set(cs.languages)
+        for thing in itertools.chain([cs], _read_things(provider)):
+            languages.update(label.language for label in thing.labels)
+            languages.update(note.language for note in thing.notes)
+    except Exception as e:
+        log.exception('Unable to read %s.', provider.get_vocabulary_id())
+        return None, time.perf_counter() - start, e
+    return (
+        {language or 'und' for language in languages},
+        time.perf_counter() - start,
+        None
+    )
+
+
+def _import_in_session(provider, read, session_maker):
+    '''
+    Import a provider in a session and transaction of its own, once its
+    languages have been read.
+
+    :rtype: :class:`ImportReport`
+    '''
+    _, duration, error = read
+    if error is not None:
+        return ImportReport(provider.get_vocabulary_id(), None, 0, duration, error)
+    session = session_maker()
+    start = time.perf_counter() - duration
+    try:
+        conceptscheme = import_provider(provider, session)
+        count = session.execute(
+            select(func.count())
+            .select_from(ThingModel)
+            .filter(ThingModel.conceptscheme_id == conceptscheme.id)
+        ).scalar()
+        session.commit()
+        return ImportReport(
+            provider.get_vocabulary_id(), conceptscheme.id,
+            count, time.perf_counter() - start, None
+        )
+    except Exception as e:
+        session.rollback()
+        log.exception('Unable to import %s.', provider.get_vocabulary_id())
+        return ImportReport(
+            provider.get_vocabulary_id(), None, 0,
+            time.perf_counter() - start, e
+        )
+    finally:
+        session.close()
+
+
+def clone_conceptscheme(session, source_id, uri=None):
+    '''
+    Make a copy of a conceptscheme inside the database.
+
+    Concepts, collections, labels, notes, sources, matches, relations and
+    the precomputed visitation and top level rows are copied with one
+    `INSERT ... SELECT` statement per table, so the copy never passes
+    through Python.
+
+    The copies get new ids by adding a fixed offset per table to the ids of
+    the originals. The offset places the copies right after the highest id
+    currently in use, which keeps relations intact without needing a table
+    that maps old ids to new ones.
+
+    :param session: A :class:`sqlalchemy.orm.session.Session`. The copy is
+        made in its current transaction.
+    :param int source_id: The id of the conceptscheme to copy.
+    :param str uri: The :term:`URI` of the copy. Defaults to the
+        :term:`URI` of the original. Concepts and collections keep their
+        :term:`URI`.
+    :rtype: :class:`skosprovider_sqlalchemy.models.ConceptScheme`
+    :raises ValueError: When the conceptscheme doesn't exist.
+    '''
+    session.flush()
+    source = session.get(ConceptSchemeModel, source_id)
+    if source is None:
+        raise ValueError('Conceptscheme %s does not exist.' % source_id)
+    clone_id = _max_id(session, ConceptSchemeModel.id) + 1
+    session.execute(ConceptSchemeModel.__table__.insert().values(
+        id=clone_id, uri=uri or source.uri
+    ))
+    session.execute(conceptscheme_language.insert().from_select(
+        ['conceptscheme_id', 'language_id'],
+        select(literal(clone_id, Integer), conceptscheme_language.c.language_id)
+        .where(conceptscheme_language.c.conceptscheme_id == source_id)
+    ))
+
+    thing = ThingModel.__table__
+    things = select(thing.c.id).where(thing.c.conceptscheme_id == source_id)
+    thing_offset = _offset(session, thing.c.id, things)
+    session.execute(thing.insert().from_select(
+        [
+            'id', 'type', 'concept_id', 'uri', 'conceptscheme_id',
+            'infer_concept_relations'
+        ],
+        select(
+            thing.c.id + thing_offset, thing.c.type, thing.c.concept_id,
+            thing.c.uri, literal(clone_id, Integer),
+            thing.c.infer_concept_relations
+        ).where(thing.c.conceptscheme_id == source_id)
+    ))
+
+    direct = has_owner_columns(session.connection())
+    for model, column, scheme_link, concept_link in (
+        (LabelModel, 'label_id', conceptscheme_label, concept_label),
+        (NoteModel, 'note_id', conceptscheme_note, concept_note),
+        (SourceModel, 'source_id', conceptscheme_source, concept_source),
+    ):
+        table = model.__table__
+        scheme_owned = select(scheme_link.c[column]).where(
+            scheme_link.c.conceptscheme_id == source_id
+        )
+        concept_owned = select(concept_link.c[column]).where(
+            concept_link.c.concept_id.in_(things)
+        )
+        owned = union(scheme_owned, concept_owned).subquery()
+        offset = _offset(session, table.c.id, select(owned.c[column]))
+        columns = [
+            c for c in table.c if c.name != 'concept_id' or direct
+        ]
+        session.execute(table.insert().from_select(
+            [c.name for c in columns],
+            select(*[
+                c + offset if c.name == 'id'
+                else c + thing_offset if c.name == 'concept_id'
+                else c
+                for c in columns
+            ]).where(table.c.id.in_(select(owned.c[column])))
+        ))
+        session.execute(scheme_link.insert().from_select(
+            ['conceptscheme_id', column],
+            select(literal(clone_id, Integer), scheme_link.c[column] + offset)
+            .where(scheme_link.c.conceptscheme_id == source_id)
+        ))
+        session.execute(concept_link.insert().from_select(
+            ['concept_id', column],
+            select(
+                concept_link.c.concept_id + thing_offset,
+                concept_link.c[column] + offset
+            ).where(concept_link.c.concept_id.in_(things))
+        ))
+
+    match = MatchModel.__table__
+    session.execute(match.insert().from_select(
+        ['concept_id', 'matchtype_id', 'uri'],
+        select(match.c.concept_id + thing_offset, match.c.matchtype_id, match.c.uri)
+        .where(match.c.concept_id.in_(things))
+    ))
+    for table in (
+        collection_concept, concept_related_concept,
+        concept_hierarchy_concept, concept_hierarchy_collection
+    ):
+        first, second = table.c
+        session.execute(table.insert().from_select(
+            [first.name, second.name],
+            select(first + thing_offset, second + thing_offset)
+            .where(first.in_(things), second.in_(things))
+        ))
+    for model, columns in (
+        (VisitationModel, ['lft', 'rght', 'depth']),
+        (TopLevelModel, ['hierarchy']),
+    ):
+        table = model.__table__
+        session.execute(table.insert().from_select(
+            columns + ['conceptscheme_id', 'concept_id'],
+            select(
+                *[table.c[c] for c in columns],
+                literal(clone_id, Integer),
+                table.c.concept_id + thing_offset
+            ).where(table.c.conceptscheme_id == source_id)
+        ))
+    reset_sequences(session.connection())
+    return session.get(ConceptSchemeModel, clone_id)
+
+
+def delete_conceptscheme(session, conceptscheme_id):
+    '''
+    Delete a conceptscheme and everything in it.
+
+    Deleting through the ORM loads every concept, label, note and match
+    into memory and deletes them one by one. This function removes the
+    rows with a fixed number of `DELETE` statements instead, in an order
+    that respects all foreign keys. The labels, notes and sources of the
+    conceptscheme and its concepts, relations to concepts in other
+    conceptschemes, and the visitation and top level rows are removed as
+    well.
+
+    :param session: A :class:`sqlalchemy.orm.session.Session`. The rows are
+        deleted in its current transaction. Pending changes are flushed
+        first and all loaded objects are expired afterwards.
+    :param int conceptscheme_id: The id of the conceptscheme to delete.
+    :return: The number of concepts and collections that were deleted.
+    :raises ValueError: When the conceptscheme doesn't exist.
+    '''
+    session.flush()
+    if session.get(ConceptSchemeModel, conceptscheme_id) is None:
+        raise ValueError('Conceptscheme %s does not exist.' % conceptscheme_id)
+    thing = ThingModel.__table__
+    things = select(thing.c.id).where(thing.c.conceptscheme_id == conceptscheme_id)
+
+    with temporary_table(session.connection(), removed_ids):
+        for model, column, scheme_link, concept_link in (
+            (LabelModel, 'label_id', conceptscheme_label, concept_label),
+            (NoteModel, 'note_id', conceptscheme_note, concept_note),
+            (SourceModel, 'source_id', conceptscheme_source, concept_source),
+        ):
+            session.execute(removed_ids.insert().from_select(['id'], union(
+                select(scheme_link.c[column]).where(
+                    scheme_link.c.conceptscheme_id == conceptscheme_id
+                ),
+                select(concept_link.c[column]).where(
+                    concept_link.c.concept_id.in_(things)
+                )
+            )))
+            session.execute(scheme_link.delete().where(
+                scheme_link.c.conceptscheme_id == conceptscheme_id
+            ))
+            session.execute(concept_link.delete().where(
+                concept_link.c.concept_id.in_(things)
+            ))
+            session.execute(model.__table__.delete().where(
+                model.__table__.c.id.in_(select(removed_ids.c.id))
+            ))
+            session.execute(removed_ids.delete())
+
+    match = MatchModel.__table__
+    session.execute(match.delete().where(match.c.concept_id.in_(things)))
+    for table in (
+        collection_concept, concept_related_concept,
+        concept_hierarchy_concept, concept_hierarchy_collection
+    ):
+        first, second = table.c
+        session.execute(table.delete().where(
+            or_(first.in_(things), second.in_(things))
+        ))
+    for model in (VisitationModel, TopLevelModel):
+        table = model.__table__
+        session.execute(table.delete().where(or_(
+            table.c.conceptscheme_id == conceptscheme_id,
+            table.c.concept_id.in_(things)
+        )))
+    session.execute(conceptscheme_language.delete().where(
+        conceptscheme_language.c.conceptscheme_id == conceptscheme_id
+    ))
+    deleted = session.execute(
+        thing.delete().where(thing.c.conceptscheme_id == conceptscheme_id)
+    ).rowcount
+    session.execute(ConceptSchemeModel.__table__.delete().where(
+        ConceptSchemeModel.__table__.c.id == conceptscheme_id
+    ))
+    session.expire_all()
+    return deleted
+
+
+def _max_id(session, column):
+    return session.execute(select(func.max(column))).scalar() or 0
+
+
+def _offset(session, column, ids):
+    '''
+    The number to add to `ids` so they end up after the highest id in use.
+    '''
+    lowest = session.execute(select(func.min(ids.subquery().c[0]))).scalar()
+    return _max_id(session, column) + 1 - (lowest or 0)
+
+
+def upgrade_database(engine):
+    '''
+    Bring an existing database up to date with the models.
+
+    Creates all tables, columns and indexes defined by the models that are
+    not yet present in the database. Existing tables, indexes and data are
+    left untouched, so this is safe to run on a database that is already up
+    to date.
+
+    The `concept_id` of labels, notes and sources that don't have one yet
+    is filled in from the `concept_label`, `concept_note` and
+    `concept_source` tables. A `concept_id` that doesn't match these tables,
+    eg. because it was left out by code that writes to the database
+    directly, is corrected and logged as a warning.
+
+    :param engine: A :class:`sqlalchemy.engine.Engine`.
+    :return: A list of the names of the columns, as `table.column`, and
+        indexes that were created.
+    '''
+    created = []
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn)
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    log.info('Adding column %s.%s.' % (table.name, column.name))
+                    _add_column(conn, table, column)
+                    created.append('%s.%s' % (table.name, column.name))
+        for table in Base.metadata.sorted_tables:
+            existing = _index_names(conn, inspector, table)
+            for index in table.indexes:
+                if index.name not in existing:
+                    log.info('Creating index %s.' % index.name)
+                    index.create(conn)
+                    created.append(index.name)
+        _fill_concept_ids(conn)
+    has_owner_columns(engine, refresh=True)
+    return created
+
+
+def _index_names(conn, inspector, table):
+    '''
+    The names of the indexes on a table. SQLite does not reflect indexes on
+    expressions, so there they are read from the catalog.
+    '''
+    if conn.dialect.name == 'sqlite':
+        return set(conn.execute(
+            text(
+                "SELECT name FROM sqlite_master "
+                "WHERE type = 'index' AND tbl_name = :table"
+            ),
+            {'table': table.name}
+        ).scalars())
+    return {i['name'] for i in inspector.get_indexes(table.name)}
+
+
+def _add_column(conn, table, column):
+    preparer = conn.dialect.identifier_preparer
+    ddl = 'ALTER TABLE %s ADD COLUMN %s' % (
+        preparer.format_table(table),
+        CreateColumn(column).compile(dialect=conn.dialect)
+    )
+    for fk in column.foreign_keys:
+        ddl += ' REFERENCES %s (%s)' % (
+            preparer.format_table(fk.column.table),
+            preparer.format_column(fk.column)
+        )
+    conn.execute(text(ddl))
+
+
+def _fill_concept_ids(conn):
+    '''
+    Copy the owner of every label, note and source that belongs to a
+    concept or collection from its association table to its `concept_id`,
+    and correct the `concept_id` of those that don't match it.
+    '''
+    for model, link, column in (
+        (LabelModel, concept_label, 'label_id'),
+        (NoteModel, concept_note, 'note_id'),
+        (SourceModel, concept_source, 'source_id'),
+    ):
+        table = model.__table__
+        filled = conn.execute(
+            table.update()
+            .where(
+                table.c.concept_id.is_(None),
+                table.c.id.in_(select(link.c[column]))
+            )
+            .values(concept_id=(
+                select(link.c.concept_id)
+                .where(link.c[column] == table.c.id)
+                .scalar_subquery()
+            ))
+        ).rowcount
+        if filled:
+            log.info('Filled the concept_id of %d rows in %s.' % (filled, table.name))
+        owner = (
+            select(link.c.concept_id)
+            .where(link.c[column] == table.c.id)
+            .scalar_subquery()
+        )
+        repaired = conn.execute(
+            table.update()
+            .where(table.c.concept_id.is_distinct_from(owner))
+            .values(concept_id=owner)
+        ).rowcount
+        if repaired:
+            log.warning(
+                'Corrected the concept_id of %d rows in %s that did not match %s.'
+                % (repaired, table.name, link.name)
+            )
+
+
+def materialize_uris(session, conceptscheme_id, uri_generator, chunk_size=1000):
+    '''
+    Store the generated :term:`URI` of every concept and collection in a
+    conceptscheme that has no :term:`URI` yet.
+
+    A provider generates a :term:`URI` for these concepts and collections
+    every time it reads them, and can't find them with
+    :meth:`skosprovider_sqlalchemy.providers.SQLAlchemyProvider.get_by_uri`.
+    Once stored, they are read and looked up through the indexed `uri`
+    column like any other concept.
+
+    When the generated :term:`URIs <URI>` consist of a fixed prefix and
+    suffix around the concept id, as with a
+    :class:`skosprovider.uri.UriPatternGenerator`, they are stored with one
+    `UPDATE` statement per type. Otherwise they are generated in Python and
+    stored in chunks.
+
+    :param session: A :class:`sqlalchemy.orm.session.Session`.
+    :param int conceptscheme_id: The id of the conceptscheme.
+    :param uri_generator: The :class:`skosprovider.uri.UriGenerator` of the
+        provider for this conceptscheme.
+    :param int chunk_size: How many :term:`URIs <URI>` to store with one
+        statement when they are generated in Python.
+    :return: The number of concepts and collections that received a
+        :term:`URI`.
+    '''
+    count = 0
+    for type in ('concept', 'collection'):
+        filters = (
+            ThingModel.conceptscheme_id == conceptscheme_id,
+            ThingModel.type == type,
+            ThingModel.uri.is_(None),
+        )
+        try:
+            pattern = GeneratedUriPattern(conceptscheme_id, uri_generator, type)
+        except ValueError:
+            pattern = None
+        if pattern:
+            concept_id = ThingModel.concept_id
+            if pattern.lowercase:
+                concept_id = func.lower(concept_id)
+            count += session.execute(
+                update(ThingModel)
+                .where(*filters)
+                .values(
+                    uri=literal(pattern.prefix) + concept_id + literal(pattern.suffix)
+                )
+            ).rowcount
+            continue
+        rows = session.execute(
+            select(ThingModel.id, ThingModel.concept_id).where(*filters)
+        ).all()
+        for i in range(0, len(rows), chunk_size):
+            session.execute(update(ThingModel), [
+                {'id': id, 'uri': uri_generator.generate(type=type, id=concept_id)}
+                for id, concept_id in rows[i:i + chunk_size]
+            ])
+        count += len(rows)
+    return count
+
+
+def materialize_uris_on_flush(session, uri_generators):
+    '''
+    Store the generated :term:`URI` of concepts and collections that are
+    added to a session without one.
+
+    This keeps a conceptscheme whose :term:`URIs <URI>` were stored with
+    :func:`materialize_uris` complete while it's being edited.
+
+    :param session: A :class:`sqlalchemy.orm.session.Session`, a
+        :class:`sqlalchemy.orm.sessionmaker` or the Session class.
+    :param dict uri_generators: A :class:`dict` mapping conceptscheme ids
+        to the :class:`skosprovider.uri.UriGenerator` of their provider.
+        Concepts in other conceptschemes are left alone.
+    :return: The listener, so it can be removed with
+        :func:`sqlalchemy.event.remove`.
+    '''
+    def before_flush(session, flush_context, instances):
+        for thing in session.new:
+            if not isinstance(thing, ThingModel) or thing.uri is not None:
+                continue
+            conceptscheme_id = thing.conceptscheme_id
+            if conceptscheme_id is None and thing.conceptscheme is not None:
+                conceptscheme_id = thing.conceptscheme.id
+            uri_generator = uri_generators.get(conceptscheme_id)
+            if uri_generator:
+                thing.uri = uri_generator.generate(
+                    type=thing.type, id=thing.concept_id
+                )
+
+    event.listen(session, 'before_flush', before_flush)
+    return before_flush
+
+
 def _check_language(language_tag, session):
     '''
     Checks if a certain language is already present, if not import.
@@ -191,6 +807,7 @@ def _check_language(language_tag, session):
         session.add(l)
     return l
 
+
 def _add_labels(target, labels, session):
     '''
     Adds the labels to the target
@@ -208,6 +825,7 @@ def _add_labels(target, labels, session):
         ))
     return target
 
+
 def _add_notes(target, notes, session):
     '''
     Adds the notes to the target
@@ -226,6 +844,7 @@ def _add_notes(target, notes, session):
         ))
     return target
 
+
 def _add_sources(target, sources, session):
     '''
     Adds the sources to the target
@@ -316,3 +935,44 @@ class VisitationCalculator:
             log.debug('Visiting collection %s.' % concept.id)
             for m in concept.members:
                 self._visit_concept(m)
+
+
+class TopLevelCalculator:
+    '''
+    Determines the top levels of the hierarchies of a conceptscheme.
+
+    The result can be stored in the
+    :class:`TopLevel <skosprovider_sqlalchemy.models.TopLevel>` table, so
+    that a :class:`skosprovider_sqlalchemy.providers.SQLAlchemyProvider`
+    with a `top_strategy` of `precomputed` can read it.
+    '''
+
+    def __init__(self, session):
+        '''
+        :param :class:`sqlalchemy.orm.session.Session` session: A database
+            session.
+        '''
+        self.session = session
+
+    def calculate(self, conceptscheme):
+        '''
+        Calculate the top concepts and top of the display hierarchy of a
+        :class:`skosprovider_sqlalchemy.models.Conceptscheme`.
+
+        :param conceptscheme: A
+            :class:`skosprovider_sqlalchemy.models.Conceptscheme` for which
+            the top levels will be calculated.
+        :rtype: A list of dicts, each with the `id` of a concept or
+            collection and the `hierarchy` it's at the top of.
+        '''
+        # The same queries the provider uses when nothing was precomputed,
+        # so there is a single definition of the top of a hierarchy.
+        provider = SQLAlchemyProvider(
+            {'id': str(conceptscheme.id), 'conceptscheme_id': conceptscheme.id},
+            self.session
+        )
+        return [
+            {'id': c.id, 'hierarchy': hierarchy}
+            for hierarchy in ('concept', 'display')
+            for c in provider.query_top_level(hierarchy)
+        ]
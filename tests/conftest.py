@@ -191,3 +191,125 @@ def create_visitation(session):
             )
             session.add(vrow)
     session.commit()
+
+
+def create_toplevel(session):
+    from skosprovider_sqlalchemy.utils import (
+        TopLevelCalculator
+    )
+    from skosprovider_sqlalchemy.models import (
+        TopLevel,
+        ConceptScheme
+    )
+    tc = TopLevelCalculator(session)
+    conceptschemes = session.execute(select(ConceptScheme)).scalars().all()
+    for cs in conceptschemes:
+        for t in tc.calculate(cs):
+            session.add(TopLevel(
+                conceptscheme=cs,
+                concept_id=t['id'],
+                hierarchy=t['hierarchy']
+            ))
+    session.commit()
+
+
+def create_unmigrated_schema(engine):
+    '''
+    Turn the labels, notes and sources into the tables created by version
+    2.2, without a `concept_id` column. Only works on SQLite.
+    '''
+    from sqlalchemy import text
+    from skosprovider_sqlalchemy.models import Base
+
+    links = [
+        Base.metadata.tables[name] for name in (
+            'concept_label', 'conceptscheme_label', 'concept_note',
+            'conceptscheme_note', 'concept_source', 'conceptscheme_source'
+        )
+    ]
+    with engine.begin() as conn:
+        for link in links:
+            link.drop(conn)
+        for name in ('label', 'note', 'source'):
+            Base.metadata.tables[name].drop(conn)
+        conn.execute(text(
+            'CREATE TABLE label ('
+            'id INTEGER PRIMARY KEY, '
+            'label VARCHAR(512) NOT NULL, '
+            'labeltype_id VARCHAR(20) NOT NULL, '
+            'language_id VARCHAR(64))'
+        ))
+        conn.execute(text(
+            'CREATE TABLE note ('
+            'id INTEGER PRIMARY KEY, '
+            'note TEXT NOT NULL, '
+            'notetype_id VARCHAR(20) NOT NULL, '
+            'language_id VARCHAR(64), '
+            'markup VARCHAR(20))'
+        ))
+        conn.execute(text(
+            'CREATE TABLE source ('
+            'id INTEGER PRIMARY KEY, '
+            'citation TEXT NOT NULL, '
+            'markup VARCHAR(20))'
+        ))
+        for link in links:
+            link.create(conn)
+
+
+def count_stale_concept_ids(conn):
+    '''
+    Count the labels, notes and sources whose `concept_id` doesn't match
+    their association table.
+    '''
+    from sqlalchemy import func
+    from skosprovider_sqlalchemy.models import Label, Note, Source
+    from skosprovider_sqlalchemy.models import (
+        concept_label,
+        concept_note,
+        concept_source
+    )
+
+    stale = 0
+    for model, link, column in (
+        (Label, concept_label, 'label_id'),
+        (Note, concept_note, 'note_id'),
+        (Source, concept_source, 'source_id'),
+    ):
+        table = model.__table__
+        owner = (
+            select(link.c.concept_id)
+            .where(link.c[column] == table.c.id)
+            .scalar_subquery()
+        )
+        stale += conn.execute(
+            select(func.count())
+            .select_from(table)
+            .where(table.c.concept_id.is_distinct_from(owner))
+        ).scalar()
+    return stale
+
+
+@pytest.fixture()
+def synthetic_scheme(engine, session_maker):
+    '''
+    A function that generates a synthetic conceptscheme and returns its id.
+
+    Takes the same keyword arguments as
+    :func:`skosprovider_sqlalchemy.generator.generate_scheme`.
+    '''
+    from skosprovider_sqlalchemy.generator import generate_scheme
+    from skosprovider_sqlalchemy.models import Base, Initialiser
+
+    Base.metadata.create_all(engine)
+    session = session_maker()
+    Initialiser(session).init_all()
+    session.commit()
+    session.close()
+
+    def _generate(**kwargs):
+        with engine.begin() as conn:
+            return generate_scheme(conn, **kwargs)
+
+    yield _generate
+    Base.metadata.drop_all(engine)
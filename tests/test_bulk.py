@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy import func
+from sqlalchemy import inspect
+from sqlalchemy import select
+
+from skosprovider_sqlalchemy.bulk import removed_ids
+from skosprovider_sqlalchemy.bulk import temporary_table
+from tests import DBTestCase
+
+
+class TestTemporaryTable(DBTestCase):
+
+    def _temp_tables(self, conn):
+        if conn.dialect.name == 'postgresql':
+            return [removed_ids.name] if inspect(conn).has_table(
+                removed_ids.name
+            ) else []
+        return inspect(conn).get_temp_table_names()
+
+    def test_dropped(self):
+        with self.engine.begin() as conn:
+            with temporary_table(conn, removed_ids):
+                conn.execute(removed_ids.insert(), [{'id': 1}, {'id': 2}])
+                assert 2 == conn.execute(
+                    select(func.count()).select_from(removed_ids)
+                ).scalar()
+            assert removed_ids.name not in self._temp_tables(conn)
+
+    def test_error(self):
+        with self.engine.connect() as conn:
+            with pytest.raises(ZeroDivisionError):
+                with temporary_table(conn, removed_ids):
+                    conn.execute(removed_ids.insert(), [{'id': 1}])
+                    1 / 0
+            conn.rollback()
+            # The table can be used again on the same connection.
+            with temporary_table(conn, removed_ids):
+                assert 0 == conn.execute(
+                    select(func.count()).select_from(removed_ids)
+                ).scalar()
+            assert removed_ids.name not in self._temp_tables(conn)
@@ -0,0 +1,103 @@
+import io
+import json
+
+from skosprovider.uri import UriPatternGenerator
+from sqlalchemy.orm import session
+
+from skosprovider_sqlalchemy.export import export_jsonld
+from skosprovider_sqlalchemy.export import export_ntriples
+from skosprovider_sqlalchemy.export import export_turtle
+from skosprovider_sqlalchemy.models import Base
+from skosprovider_sqlalchemy.models import Concept
+from skosprovider_sqlalchemy.models import Initialiser
+from skosprovider_sqlalchemy.models import Note
+from skosprovider_sqlalchemy.providers import SQLAlchemyProvider
+from tests import DBTestCase
+from tests.conftest import create_data
+
+SKOS = 'http://www.w3.org/2004/02/skos/core#'
+
+
+class TestExport(DBTestCase):
+
+    def setUp(self):
+        Base.metadata.create_all(self.engine)
+        self.session = self.session_maker()
+        Initialiser(self.session).init_all()
+        create_data(self.session)
+        concept = Concept(id=100, concept_id='10', conceptscheme_id=1)
+        concept.notes.append(Note('Quotes " and\nnew lines', 'note', 'en'))
+        self.session.add(concept)
+        self.session.commit()
+        self.provider = SQLAlchemyProvider(
+            {'id': 'SOORTEN', 'conceptscheme_id': 1},
+            self.session,
+            uri_generator=UriPatternGenerator('http://id.example.com/soorten/%s')
+        )
+
+    def tearDown(self):
+        self.session.rollback()
+        session.close_all_sessions()
+        Base.metadata.drop_all(self.engine)
+
+    def _ntriples(self, **kwargs):
+        out = io.StringIO()
+        count = export_ntriples(self.provider, out, **kwargs)
+        return count, out.getvalue().splitlines()
+
+    def test_ntriples(self):
+        count, lines = self._ntriples()
+        assert 10 == count
+        for line in lines:
+            assert line.endswith(' .')
+        assert (
+            '<urn:x-skosprovider:test:1> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> '
+            '<%sConcept> .' % SKOS
+        ) in lines
+        assert (
+            '<urn:x-skosprovider:test:1> <%sprefLabel> "Churches"@en .' % SKOS
+        ) in lines
+        assert (
+            '<urn:x-skosprovider:test:3> <%snarrower> <urn:x-skosprovider:test:5> .'
+            % SKOS
+        ) in lines
+        assert (
+            '<urn:x-skosprovider:test:2> <%smember> <urn:x-skosprovider:test:4> .'
+            % SKOS
+        ) in lines
+        assert (
+            '<urn:x-skosprovider:test> <%shasTopConcept> <urn:x-skosprovider:test:1> .'
+            % SKOS
+        ) in lines
+
+    def test_ntriples_generated_uri_and_escaping(self):
+        _, lines = self._ntriples()
+        assert (
+            '<http://id.example.com/soorten/10> <%snote> '
+            '"Quotes \\" and\\nnew lines"@en .' % SKOS
+        ) in lines
+
+    def test_ntriples_chunked(self):
+        assert sorted(self._ntriples()[1]) == sorted(self._ntriples(chunk_size=2)[1])
+
+    def test_turtle(self):
+        out = io.StringIO()
+        assert 10 == export_turtle(self.provider, out)
+        ttl = out.getvalue()
+        assert '@prefix skos: <%s> .' % SKOS in ttl
+        assert '<urn:x-skosprovider:test:1>\n    a skos:Concept ;\n' in ttl
+        assert '    skos:prefLabel "Churches"@en ;\n' in ttl
+        assert '<urn:x-skosprovider:test:2>\n    a skos:Collection ;\n' in ttl
+
+    def test_jsonld(self):
+        out = io.StringIO()
+        assert 10 == export_jsonld(self.provider, out)
+        doc = json.loads(out.getvalue())
+        assert SKOS == doc['@context']['skos']
+        nodes = {node['@id']: node for node in doc['@graph']}
+        assert 11 == len(nodes)
+        church = nodes['urn:x-skosprovider:test:1']
+        assert 'skos:Concept' == church['@type']
+        assert {'@value': 'Churches', '@language': 'en'} in church['skos:prefLabel']
+        assert {'@id': 'urn:x-skosprovider:test'} in church['skos:inScheme']
+        assert 'skos:ConceptScheme' == nodes['urn:x-skosprovider:test']['@type']
@@ -0,0 +1,135 @@
+from sqlalchemy.orm import session
+
+from skosprovider_sqlalchemy.factory import ProviderFactory
+from skosprovider_sqlalchemy.models import Base
+from skosprovider_sqlalchemy.models import Concept
+from skosprovider_sqlalchemy.models import ConceptScheme
+from skosprovider_sqlalchemy.models import Initialiser
+from skosprovider_sqlalchemy.models import Label
+from skosprovider_sqlalchemy.providers import SQLAlchemyProvider
+from tests import DBTestCase
+from tests.conftest import create_data
+
+
+class TestProviderFactory(DBTestCase):
+
+    def setUp(self):
+        Base.metadata.create_all(self.engine)
+        self.session = self.session_maker()
+        Initialiser(self.session).init_all()
+        create_data(self.session)
+        cs = ConceptScheme(id=2, uri='urn:x-skosprovider:trees')
+        cs.labels.append(Label('Trees', 'prefLabel', 'en'))
+        self.session.add(cs)
+        self.session.add(Concept(
+            id=110, concept_id=1, uri='urn:x-skosprovider:trees:1',
+            conceptscheme=cs
+        ))
+        self.session.commit()
+        self.factory = ProviderFactory(self.session, expand_strategy='visit')
+
+    def tearDown(self):
+        self.session.rollback()
+        session.close_all_sessions()
+        Base.metadata.drop_all(self.engine)
+
+    def test_create_providers(self):
+        providers = self.factory.create_providers()
+        assert [1, 2] == [p.conceptscheme_id for p in providers]
+        assert ['1', '2'] == [p.get_vocabulary_id() for p in providers]
+        for p in providers:
+            assert isinstance(p, SQLAlchemyProvider)
+            assert p.session is self.session
+            assert 'visit' == p.expand_strategy
+        assert providers[1] is self.factory.get_provider(2)
+        assert not self.factory.get_provider(3)
+
+    def test_create_providers_metadata(self):
+        providers = self.factory.create_providers(
+            metadata={1: {'id': 'SOORTEN', 'subject': ['biology']}},
+            conceptscheme_ids=[1]
+        )
+        assert 1 == len(providers)
+        assert 'SOORTEN' == providers[0].get_vocabulary_id()
+        assert ['biology'] == providers[0].get_metadata()['subject']
+        assert 1 == providers[0].conceptscheme_id
+
+    def test_conceptschemes_are_preloaded(self):
+        providers = self.factory.create_providers()
+        self.session.get(ConceptScheme, 2).uri = 'urn:x-skosprovider:changed'
+        self.session.flush()
+        cs = providers[1].concept_scheme
+        assert 'urn:x-skosprovider:trees' == cs.uri
+        assert 'Trees' == cs.label('en').label
+        assert 'urn:x-skosprovider:test' == providers[0].concept_scheme.uri
+        self.factory.clear_cache()
+        assert 'urn:x-skosprovider:changed' == providers[1].concept_scheme.uri
+
+    def test_preloaded_conceptschemes_expire(self):
+        factory = ProviderFactory(self.session, cache_ttl=60)
+        provider = factory.create_providers(conceptscheme_ids=[2])[0]
+        self.session.get(ConceptScheme, 2).uri = 'urn:x-skosprovider:changed'
+        self.session.flush()
+        assert 'urn:x-skosprovider:trees' == provider.concept_scheme.uri
+        provider._conceptscheme_loaded -= 61
+        assert 'urn:x-skosprovider:changed' == provider.concept_scheme.uri
+
+    def test_resolve_uris(self):
+        assert {
+            'urn:x-skosprovider:test:1': (1, '1'),
+            'urn:x-skosprovider:trees:1': (2, '1'),
+        } == self.factory.resolve_uris([
+            'urn:x-skosprovider:test:1',
+            'urn:x-skosprovider:trees:1',
+            'urn:x-skosprovider:trees:404',
+        ])
+
+    def test_get_by_uris(self):
+        self.factory.create_providers(conceptscheme_ids=[2])
+        res = self.factory.get_by_uris([
+            'urn:x-skosprovider:test:1',
+            'urn:x-skosprovider:trees:1',
+            'urn:x-skosprovider:trees:404',
+        ])
+        assert res['urn:x-skosprovider:test:1'] is False
+        assert 'urn:x-skosprovider:trees' == (
+            res['urn:x-skosprovider:trees:1'].concept_scheme.uri
+        )
+        assert res['urn:x-skosprovider:trees:404'] is False
+
+    def test_get_by_uris_generated(self):
+        from sqlalchemy import event
+
+        for i in range(2, 7):
+            self.session.add(Concept(
+                id=109 + i, concept_id=i, conceptscheme_id=2,
+                labels=[Label('Tree %d' % i, 'prefLabel', 'en')]
+            ))
+        self.session.commit()
+        self.factory.create_providers()
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        def get_by_uris(uris):
+            self.session.expunge_all()
+            del statements[:]
+            event.listen(self.engine, 'before_cursor_execute', before_cursor_execute)
+            try:
+                return self.factory.get_by_uris(uris)
+            finally:
+                event.remove(
+                    self.engine, 'before_cursor_execute', before_cursor_execute
+                )
+
+        res = get_by_uris(['urn:x-skosprovider:2:2'])
+        assert 'Tree 2' == res['urn:x-skosprovider:2:2'].label('en').label
+        count = len(statements)
+        uris = ['urn:x-skosprovider:2:%d' % i for i in range(2, 7)]
+        uris.append('urn:x-skosprovider:test:1')
+        res = get_by_uris(uris)
+        assert ['2', '3', '4', '5', '6'] == [res[uri].id for uri in uris[:-1]]
+        assert 'Churches' == res['urn:x-skosprovider:test:1'].label('en').label
+        # The other conceptscheme only adds the queries that load its things.
+        assert len(statements) <= 2 * count
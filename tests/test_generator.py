@@ -0,0 +1,178 @@
+import pytest
+from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy.orm import session
+
+from skosprovider_sqlalchemy.generator import generate_scheme
+from skosprovider_sqlalchemy.models import Collection
+from skosprovider_sqlalchemy.models import Concept
+from skosprovider_sqlalchemy.models import Match
+from skosprovider_sqlalchemy.models import Note
+from skosprovider_sqlalchemy.providers import SQLAlchemyProvider
+from skosprovider_sqlalchemy.scripts.generate_skos_scheme import main
+from tests import DBTestCase
+from tests.conftest import count_stale_concept_ids
+
+
+class TestGenerator(DBTestCase):
+
+    @pytest.fixture(autouse=True)
+    def init_generator(self, synthetic_scheme):
+        self.generate = synthetic_scheme
+
+    def setUp(self):
+        self.session = self.session_maker()
+
+    def tearDown(self):
+        self.session.rollback()
+        session.close_all_sessions()
+
+    def _count(self, model, cs_id):
+        return self.session.execute(
+            select(func.count()).select_from(model)
+            .filter(model.conceptscheme_id == cs_id)
+        ).scalar()
+
+    def test_generate(self):
+        cs_id = self.generate(
+            size=200, depth=3, branching=4, collections=5, polyhierarchy=0,
+            languages=['nl', 'en'], labels_per_concept=2
+        )
+        assert 200 == self._count(Concept, cs_id)
+        assert 5 == self._count(Collection, cs_id)
+        provider = SQLAlchemyProvider(
+            {'id': 'SYNTHETIC', 'conceptscheme_id': cs_id},
+            self.session
+        )
+        assert {'nl', 'en'} == set(provider.concept_scheme.languages)
+        c = provider.get_by_id(1)
+        assert 'urn:x-skosprovider:synthetic:%d:1' % cs_id == c.uri
+        assert 4 == len(c.labels)
+        direct = SQLAlchemyProvider(
+            {'id': 'SYNTHETIC', 'conceptscheme_id': cs_id},
+            self.session,
+            label_strategy='direct'
+        )
+        assert 4 == len(direct.get_by_id(1).labels)
+        assert 0 == count_stale_concept_ids(self.session.connection())
+        assert 4 == len(c.narrower)
+        # 200 concepts in trees of 1 + 4 + 16 concepts
+        assert 10 == len(provider.get_top_concepts())
+        assert 21 == len(provider.expand(1))
+        assert self.session.execute(
+            select(func.count()).select_from(Note)
+        ).scalar() > 0
+        assert self.session.execute(
+            select(func.count()).select_from(Match)
+        ).scalar() > 0
+
+    def test_insert_after_generate(self):
+        from skosprovider_sqlalchemy.models import Label
+
+        cs_id = self.generate(size=20, collections=2)
+        concept = Concept(concept_id='new', conceptscheme_id=cs_id)
+        concept.labels.append(Label('New', 'prefLabel', 'en'))
+        self.session.add(concept)
+        # The ids of the generated rows were explicit, so on PostgreSQL this
+        # only works when the sequences have caught up.
+        self.session.flush()
+        assert 21 == self._count(Concept, cs_id)
+        assert 'New' == concept.labels[0].label
+
+    def test_collections_without_cycles(self):
+        cs_id = self.generate(
+            size=100, depth=4, branching=3, collections=20,
+            polyhierarchy=0.5
+        )
+        provider = SQLAlchemyProvider(
+            {'id': 'SYNTHETIC', 'conceptscheme_id': cs_id},
+            self.session
+        )
+        for i in range(101, 121):
+            coll = provider.get_by_id(i)
+            assert 1 == len(coll.superordinates)
+            assert set(coll.members) <= set(provider.expand(coll.superordinates[0]))
+
+    def test_deterministic(self):
+        first = self.generate(size=50, seed=3)
+        second = self.generate(size=50, seed=3)
+        provider = SQLAlchemyProvider(
+            {'id': 'SYNTHETIC', 'conceptscheme_id': first},
+            self.session
+        )
+        other = SQLAlchemyProvider(
+            {'id': 'SYNTHETIC', 'conceptscheme_id': second},
+            self.session
+        )
+        assert first != second
+        assert (
+            [c['label'] for c in provider.get_all()]
+            == [c['label'] for c in other.get_all()]
+        )
+
+    def test_invalid(self):
+        with self.engine.begin() as conn:
+            with pytest.raises(ValueError):
+                generate_scheme(conn, size=0)
+
+    def test_script(self):
+        if self.engine.url.database in (None, '', ':memory:'):
+            pytest.skip('The script needs a database it can connect to.')
+        main([
+            'generate_skos_scheme',
+            self.engine.url.render_as_string(hide_password=False),
+            '--size', '20'
+        ])
+        assert 20 == self.session.execute(
+            select(func.count()).select_from(Concept)
+        ).scalar()
+
+    def test_listing_strategies(self):
+        from skosprovider_sqlalchemy.models import Label
+        from skosprovider_sqlalchemy.models import Language
+        from skosprovider_sqlalchemy.models import Thing
+
+        cs_id = self.generate(
+            size=150, collections=10, languages=['nl', 'en', 'fr'],
+            labels_per_concept=2
+        )
+        self.session.add(Language('nl-BE', 'Flemish'))
+        things = self.session.execute(
+            select(Thing).filter(Thing.conceptscheme_id == cs_id)
+        ).scalars().all()
+        for thing in things:
+            if thing.id % 3 == 0:
+                thing.labels.append(
+                    Label('Sort %d' % thing.id, 'sortLabel', 'nl')
+                )
+            if thing.id % 5 == 0:
+                thing.labels.append(
+                    Label('Vlaams %d' % thing.id, 'prefLabel', 'nl-BE')
+                )
+            if thing.id % 7 == 0:
+                thing.labels.append(
+                    Label('Deutsch %d' % thing.id, 'altLabel', 'de')
+                )
+        self.session.flush()
+        for label_strategy in ('association', 'direct'):
+            load, sql = [
+                SQLAlchemyProvider(
+                    {'id': 'SYNTHETIC', 'conceptscheme_id': cs_id},
+                    self.session,
+                    label_strategy=label_strategy,
+                    listing_strategy=listing_strategy
+                )
+                for listing_strategy in ('load', 'sql')
+            ]
+            languages = ('nl', 'nl-BE', 'en', 'de', 'es', 'any', ['es', 'de'])
+            for language in languages:
+                for sort in (None, 'id', 'label', 'sortlabel'):
+                    for method, args in (
+                        ('get_all', ()),
+                        ('find', ({'type': 'concept', 'label': 'a'},)),
+                    ):
+                        kwargs = {'language': language, 'sort': sort}
+                        assert (
+                            getattr(load, method)(*args, **kwargs) ==
+                            getattr(sql, method)(*args, **kwargs)
+                        )
@@ -0,0 +1,104 @@
+from sqlalchemy.orm import session
+
+from skosprovider_sqlalchemy.instrumentation import ProviderCallStats
+from skosprovider_sqlalchemy.models import Base
+from skosprovider_sqlalchemy.models import Initialiser
+from skosprovider_sqlalchemy.providers import SQLAlchemyProvider
+from tests import DBTestCase
+from tests.conftest import create_data
+
+
+class TestInstrumentation(DBTestCase):
+
+    def setUp(self):
+        Base.metadata.create_all(self.engine)
+        self.session = self.session_maker()
+        Initialiser(self.session).init_all()
+        create_data(self.session)
+        self.calls = []
+        self.provider = SQLAlchemyProvider(
+            {'id': 'SOORTEN', 'conceptscheme_id': 1},
+            self.session,
+            instrumentation=self.calls.append
+        )
+
+    def tearDown(self):
+        self.session.rollback()
+        session.close_all_sessions()
+        Base.metadata.drop_all(self.engine)
+
+    def test_not_instrumented(self):
+        provider = SQLAlchemyProvider(
+            {'id': 'SOORTEN', 'conceptscheme_id': 1},
+            self.session
+        )
+        assert provider.instrumentation is None
+        assert provider.get_by_id(1)
+        assert [] == self.calls
+
+    def test_get_by_id(self):
+        self.session.expunge_all()
+        con = self.provider.get_by_id(1)
+        assert '1' == con.id
+        assert 1 == len(self.calls)
+        stats = self.calls[0]
+        assert isinstance(stats, ProviderCallStats)
+        assert stats.provider is self.provider
+        assert 'get_by_id' == stats.method
+        assert stats.duration > 0
+        assert stats.statements > 0
+        assert 1 == stats.rows
+        assert stats.objects > 0
+        assert 'SOORTEN.get_by_id' in repr(stats)
+
+    def test_nested_calls_count_once(self):
+        self.provider.find({'collection': {'id': 2, 'depth': 'all'}})
+        assert ['find'] == [c.method for c in self.calls]
+
+    def test_generator(self):
+        records = list(self.provider.iter_raw())
+        assert 9 == len(records)
+        assert ['iter_raw'] == [c.method for c in self.calls]
+        assert self.calls[0].statements > 0
+
+    def test_generator_suspended(self):
+        records = self.provider.iter_raw()
+        next(records)
+        self.provider.get_by_id(1)
+        assert ['get_by_id'] == [c.method for c in self.calls]
+        list(records)
+        assert ['get_by_id', 'iter_raw'] == [c.method for c in self.calls]
+
+    def test_generator_abandoned(self):
+        records = self.provider.iter_raw()
+        next(records)
+        del records
+        assert ['iter_raw'] == [c.method for c in self.calls]
+        self.provider.get_by_id(1)
+        assert ['iter_raw', 'get_by_id'] == [c.method for c in self.calls]
+
+    def test_rows(self):
+        assert self.provider.get_by_id(1)
+        assert 9 == len(self.provider.get_all())
+        assert not self.provider.get_by_id(700)
+        assert 4 == len(list(self.provider.iter_raw(concept_ids=[1, 2, 3, 4])))
+        assert [1, 9, 0, 4] == [c.rows for c in self.calls]
+
+    def test_counts_per_call(self):
+        self.session.expunge_all()
+        self.provider.get_all()
+        self.provider.get_all()
+        first, second = self.calls
+        assert first.statements == second.statements
+        assert first.rows == second.rows
+
+    def test_failing_callback(self):
+        def callback(stats):
+            raise RuntimeError('Metrics are down.')
+
+        provider = SQLAlchemyProvider(
+            {'id': 'SOORTEN', 'conceptscheme_id': 1},
+            self.session,
+            instrumentation=callback
+        )
+        assert 9 == len(provider.get_all())
@@ -0,0 +1,258 @@
+import io
+import os
+
+import pytest
+from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy.orm import session
+
+from skosprovider_sqlalchemy.export import export_ntriples
+from skosprovider_sqlalchemy.loaders import load_csv
+from skosprovider_sqlalchemy.loaders import load_ntriples
+from skosprovider_sqlalchemy.loaders import parse_ntriples
+from skosprovider_sqlalchemy.models import Base
+from skosprovider_sqlalchemy.models import Concept
+from skosprovider_sqlalchemy.models import ConceptScheme
+from skosprovider_sqlalchemy.models import Initialiser
+from skosprovider_sqlalchemy.models import Label
+from skosprovider_sqlalchemy.models import Source
+from skosprovider_sqlalchemy.providers import SQLAlchemyProvider
+from tests import DBTestCase
+from tests.conftest import count_stale_concept_ids
+from tests.conftest import create_data
+from tests.conftest import create_unmigrated_schema
+
+DUMP = '''
+# A small thesaurus
+<http://id.example.com/trees> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2004/02/skos/core#ConceptScheme> .
+<http://id.example.com/trees> <http://www.w3.org/2004/02/skos/core#prefLabel> "Trees"@en .
+<http://id.example.com/trees/1> <http://www.w3.org/2004/02/skos/core#prefLabel> "Oak"@en .
+<http://id.example.com/trees/1> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2004/02/skos/core#Concept> .
+<http://id.example.com/trees/1> <http://purl.org/dc/terms/identifier> "oak" .
+<http://id.example.com/trees/1> <http://www.w3.org/2004/02/skos/core#altLabel> "Quercus \\"robur\\""@la .
+<http://id.example.com/trees/1> <http://www.w3.org/2004/02/skos/core#definition> "A <em>tree</em>"^^<http://www.w3.org/1999/02/22-rdf-syntax-ns#HTML> .
+<http://id.example.com/trees/1> <http://www.w3.org/2004/02/skos/core#narrower> <http://id.example.com/trees/2> .
+<http://id.example.com/trees/1> <http://www.w3.org/2004/02/skos/core#exactMatch> <http://vocab.getty.edu/aat/300012264> .
+<http://id.example.com/trees/1> <http://www.w3.org/2004/02/skos/core#broader> <http://elsewhere.example.com/1> .
+<http://id.example.com/trees/2> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2004/02/skos/core#Concept> .
+<http://id.example.com/trees/2> <http://www.w3.org/2004/02/skos/core#broader> <http://id.example.com/trees/1> .
+<http://id.example.com/trees/2> <http://www.w3.org/2004/02/skos/core#prefLabel> "Sessile oak"@en .
+<http://id.example.com/trees/2> <http://purl.org/dc/terms/source> _:s1 .
+_:s1 <http://purl.org/dc/terms/bibliographicCitation> "Trees of Europe, p. 12" .
+<http://id.example.com/trees/3> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2004/02/skos/core#Collection> .
+<http://id.example.com/trees/3> <http://www.w3.org/2004/02/skos/core#member> <http://id.example.com/trees/2> .
+<http://id.example.com/trees/3> <http://purl.org/iso25964/skos-thes#superOrdinate> <http://id.example.com/trees/1> .
+'''
+
+
+class TestParseNTriples:
+
+    def test_parse(self):
+        triples = list(parse_ntriples([
+            '<http://a> <http://b> "x\\ty\\u00E9"@nl-BE .',
+            '_:n1 <http://b> <http://c> . # comment',
+            '<http://a> <http://b> "1"^^<http://www.w3.org/2001/XMLSchema#integer> .',
+        ]))
+        assert ('http://a', 'http://b', 'x\tyé', 'nl-BE', None) == triples[0]
+        assert ('_:n1', 'http://b', 'http://c', False, None) == triples[1]
+        assert 'http://www.w3.org/2001/XMLSchema#integer' == triples[2][4]
+
+    def test_invalid(self):
+        with pytest.raises(ValueError) as e:
+            list(parse_ntriples(['', '<http://a> <http://b> .']))
+        assert 'line 2' in str(e.value)
+
+
+class TestLoadNTriples(DBTestCase):
+
+    def setUp(self):
+        Base.metadata.create_all(self.engine)
+        self.session = self.session_maker()
+        Initialiser(self.session).init_all()
+        create_data(self.session)
+        self.session.get(Concept, 10).sources.append(Source('A book'))
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.rollback()
+        session.close_all_sessions()
+        Base.metadata.drop_all(self.engine)
+
+    def _load(self, lines, **kwargs):
+        return load_ntriples(self.session.connection(), lines, **kwargs)
+
+    def _provider(self, cs_id, **kwargs):
+        return SQLAlchemyProvider(
+            {'id': 'LOADED', 'conceptscheme_id': cs_id}, self.session, **kwargs
+        )
+
+    def test_load(self):
+        cs_id = self._load(io.StringIO(DUMP), chunk_size=4)
+        provider = self._provider(cs_id)
+        assert 'http://id.example.com/trees' == provider.concept_scheme.uri
+        assert 'Trees' == provider.concept_scheme.label('en').label
+        assert {'en', 'la'} == set(provider.concept_scheme.languages)
+        oak = provider.get_by_id('oak')
+        assert 'http://id.example.com/trees/1' == oak.uri
+        assert 'Quercus "robur"' == oak.label('la').label
+        assert 'HTML' == oak.notes[0].markup
+        assert ['http://vocab.getty.edu/aat/300012264'] == oak.matches['exact']
+        assert [] == oak.broader
+        assert 1 == len(oak.narrower)
+        sessile = provider.get_by_uri('http://id.example.com/trees/2')
+        assert ['oak'] == sessile.broader
+        assert 'Trees of Europe, p. 12' == sessile.sources[0].citation
+        collection = provider.get_by_uri('http://id.example.com/trees/3')
+        assert [sessile.id] == collection.members
+        assert ['oak'] == collection.superordinates
+        assert [collection.id] == oak.subordinate_arrays
+        assert list(provider.iter_raw()) == list(
+            self._provider(cs_id, label_strategy='direct').iter_raw()
+        )
+        assert 0 == count_stale_concept_ids(self.session.connection())
+
+    def test_round_trip(self):
+        out = io.StringIO()
+        export_ntriples(self._provider(1), out)
+        self.session.get(ConceptScheme, 1).uri = 'urn:x-skosprovider:original'
+        self.session.flush()
+        cs_id = self._load(io.StringIO(out.getvalue()))
+        original = {r.uri: r for r in self._provider(1).iter_raw(relation_uris=True)}
+        loaded = {r.uri: r for r in self._provider(cs_id).iter_raw(relation_uris=True)}
+        assert original.keys() == loaded.keys()
+        for uri, record in original.items():
+            other = loaded[uri]
+            assert record.id == other.id
+            assert record.type == other.type
+            # sortLabels have no SKOS equivalent and are not exported.
+            assert sorted(
+                label for label in record.labels if label.type != 'sortLabel'
+            ) == sorted(other.labels)
+            for field in (
+                'notes', 'sources', 'broader', 'narrower', 'related',
+                'members', 'subordinate_arrays', 'superordinates'
+            ):
+                assert sorted(getattr(record, field)) == sorted(getattr(other, field))
+            assert record.matches == other.matches
+
+    def test_load_into_conceptscheme(self):
+        self.session.add(ConceptScheme(id=5, uri='urn:x-skosprovider:trees'))
+        self.session.flush()
+        assert 5 == self._load(io.StringIO(DUMP), conceptscheme_id=5)
+        assert 'oak' == self._provider(5).get_by_id('oak').id
+        assert 'Trees' == self._provider(5).concept_scheme.label('en').label
+
+    def test_without_conceptscheme(self):
+        with pytest.raises(ValueError):
+            self._load([
+                '<http://a> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> '
+                '<http://www.w3.org/2004/02/skos/core#Concept> .'
+            ])
+
+    def test_invalid_language(self):
+        with pytest.raises(ValueError):
+            self._load(io.StringIO(DUMP.replace('"Oak"@en', '"Oak"@xx-invalid')))
+
+    def test_staging_table_is_dropped(self):
+        from sqlalchemy import inspect
+
+        self._load(io.StringIO(DUMP))
+        conn = self.session.connection()
+        assert 3 == conn.execute(
+            select(func.count()).select_from(Concept.__table__)
+            .where(Concept.__table__.c.conceptscheme_id == 2)
+        ).scalar()
+        assert 'skos_load_statement' not in inspect(conn).get_temp_table_names()
+
+
+class TestLoadCsv(DBTestCase):
+
+    def setUp(self):
+        Base.metadata.create_all(self.engine)
+        self.session = self.session_maker()
+        Initialiser(self.session).init_all()
+        self.session.add(ConceptScheme(id=1, uri='urn:x-skosprovider:menu'))
+        self.session.commit()
+        self.provider = SQLAlchemyProvider(
+            {'id': 'MENU', 'conceptscheme_id': 1}, self.session
+        )
+
+    def tearDown(self):
+        self.session.rollback()
+        session.close_all_sessions()
+        Base.metadata.drop_all(self.engine)
+
+    def _load(self, lines, **kwargs):
+        return load_csv(self.session.connection(), lines, 1, **kwargs)
+
+    def test_menu(self):
+        from skosprovider.uri import UriPatternGenerator
+
+        path = os.path.join(os.path.dirname(__file__), 'data', 'menu.csv')
+        with open(path, newline='') as f:
+            res = self._load(
+                f, language='en', chunk_size=4,
+                uri_generator=UriPatternGenerator('urn:x-skosprovider:menu:%s')
+            )
+        assert {'created': 11, 'updated': 0} == res
+        lobster = self.provider.get_by_id(11)
+        assert 'urn:x-skosprovider:menu:11' == lobster.uri
+        assert 'en' == lobster.label().language
+        assert 'Lobster Thermidor' in lobster.label().label
+        assert 1 == len(lobster.notes)
+        assert 1 == len(lobster.sources)
+        assert ['en'] == self.provider.concept_scheme.languages
+        assert 11 == len(self.provider.get_all())
+
+    def test_update(self):
+        self._load(io.StringIO('1,Egg,Fried\n2,Bacon,,Breakfast book\n'))
+        concept = self.session.get(Concept, 1)
+        concept.labels.append(Label('Ei', 'prefLabel', 'nl'))
+        self.session.flush()
+        res = self._load(io.StringIO(
+            'id\tlabel\n2\tCrispy bacon\n3\tSpam\n3\tMore spam\n'
+        ), delimiter='\t', header=True)
+        assert {'created': 1, 'updated': 1} == res
+        self.session.expire_all()
+        egg = self.provider.get_by_id(1)
+        assert {'Egg', 'Ei'} == {l.label for l in egg.labels}
+        assert 1 == len(egg.notes)
+        bacon = self.provider.get_by_id(2)
+        assert ['Crispy bacon'] == [l.label for l in bacon.labels]
+        assert [] == bacon.sources
+        assert ['More spam'] == [l.label for l in self.provider.get_by_id(3).labels]
+        assert 0 == self.session.execute(
+            select(func.count()).select_from(Label)
+            .where(Label.label == 'Bacon')
+        ).scalar()
+        direct = SQLAlchemyProvider(
+            {'id': 'MENU', 'conceptscheme_id': 1}, self.session,
+            label_strategy='direct'
+        )
+        assert [
+            (r.id, sorted(r.labels), r.notes, r.sources)
+            for r in self.provider.iter_raw()
+        ] == [
+            (r.id, sorted(r.labels), r.notes, r.sources)
+            for r in direct.iter_raw()
+        ]
+        assert 0 == count_stale_concept_ids(self.session.connection())
+
+    def test_unmigrated(self):
+        if self.engine.dialect.name != 'sqlite':
+            pytest.skip('The unmigrated schema is only built on SQLite.')
+        create_unmigrated_schema(self.engine)
+        res = self._load(io.StringIO('1,Egg,Fried,Breakfast book\n2,Bacon\n'))
+        assert {'created': 2, 'updated': 0} == res
+        egg = self.provider.get_by_id(1)
+        assert 'Egg' == egg.label().label
+        assert 1 == len(egg.notes)
+        assert 1 == len(egg.sources)
+
+    def test_unknown_conceptscheme(self):
+        with pytest.raises(ValueError):
+            load_csv(self.session.connection(), io.StringIO('1,Egg\n'), 404)
+
+    def test_invalid_language(self):
+        with pytest.raises(ValueError):
+            self._load(io.StringIO('1,Egg\n'), language='xx-invalid')
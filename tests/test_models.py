@@ -232,6 +232,103 @@ class TestLabel(DBTestCase):
         assert None == l.language_id
         assert 'prefLabel' == l.labeltype.name
 
+    def test_concept_id(self):
+        from skosprovider_sqlalchemy.models import Concept
+        from skosprovider_sqlalchemy.models import ConceptScheme
+        from tests.conftest import count_stale_concept_ids
+
+        cs = ConceptScheme(id=1, uri='urn:x-skosprovider:test')
+        church = Concept(id=1, concept_id='1', conceptscheme=cs)
+        chapel = Concept(id=2, concept_id='2', conceptscheme=cs)
+        l = self._get_target_class()('Kerken', 'prefLabel', 'nl')
+        church.labels.append(l)
+        cs.labels.append(self._get_target_class()('Gebouwen', 'prefLabel', 'nl'))
+        self.session.add_all([cs, church, chapel])
+        self.session.flush()
+        assert 1 == l.concept_id
+        assert 0 == count_stale_concept_ids(self.session.connection())
+        chapel.labels.append(self._get_target_class()('Kapellen', 'prefLabel', 'nl'))
+        self.session.flush()
+        self.session.expire_all()
+        assert [2] == [label.concept_id for label in chapel.labels]
+        assert 0 == count_stale_concept_ids(self.session.connection())
+
+
+class TestBestLabel(DBTestCase):
+
+    def setUp(self):
+        from skosprovider_sqlalchemy.models import Concept
+        from skosprovider_sqlalchemy.models import ConceptScheme
+        from skosprovider_sqlalchemy.models import Label
+        from skosprovider_sqlalchemy.models import Language
+
+        Base.metadata.create_all(self.engine)
+        self.session = self.session_maker()
+        Initialiser(self.session).init_all()
+        self.session.merge(Language('en-GB', 'English (United Kingdom)'))
+        self.labels = [
+            Label('Cnock-Heyst', 'altLabel', 'nl'),
+            Label('Knocke-Heyst', 'prefLabel', 'en'),
+            Label('Knokke-Heist', 'prefLabel', 'nl-BE'),
+            Label('Knokke-Heist', 'prefLabel', 'nl'),
+            Label('Cnock-Heyst', 'altLabel', 'nl-BE'),
+            Label('Knocke-Heyst', 'prefLabel', 'en-GB'),
+            Label('123MeFirst', 'sortLabel', 'en'),
+            Label('Knocke', 'hiddenLabel', 'fr'),
+            Label('Knocke-le-Zoute', 'altLabel', 'fr'),
+        ]
+        self.session.add(ConceptScheme(id=1, uri='urn:x-skosprovider:test'))
+        self.session.add(Concept(id=1, concept_id='1', conceptscheme_id=1))
+        self.session.add(Concept(
+            id=2, concept_id='2', conceptscheme_id=1, labels=self.labels
+        ))
+        self.session.add(Concept(
+            id=3, concept_id='3', conceptscheme_id=1,
+            labels=[Label('Le Zoute', 'altLabel', 'fr')]
+        ))
+        self.session.flush()
+
+    def tearDown(self):
+        self.session.rollback()
+        session.close_all_sessions()
+        Base.metadata.drop_all(self.engine)
+
+    def _best_label(self, *args, **kwargs):
+        from sqlalchemy import select
+        from skosprovider_sqlalchemy.models import Thing
+        from skosprovider_sqlalchemy.models import best_label
+
+        return dict(self.session.execute(
+            select(Thing.id, best_label(*args, **kwargs))
+        ).all())
+
+    def test_same_as_label(self):
+        from skosprovider.skos import label
+
+        for language in (
+            'nl-BE', 'nl', 'en', 'en-US', 'en-GB', 'fr', 'de', 'any', None,
+            ['de', 'fr'], ['fr', 'en'], ['any', 'nl']
+        ):
+            for sortLabel in (False, True):
+                for direct in (False, True):
+                    res = self._best_label(language, sortLabel, direct=direct)
+                    assert None is res[1]
+                    assert label(self.labels, language, sortLabel).label == res[2]
+                    assert 'Le Zoute' == res[3]
+
+    def test_filter_and_sort(self):
+        from sqlalchemy import func
+        from sqlalchemy import select
+        from skosprovider_sqlalchemy.models import Thing
+        from skosprovider_sqlalchemy.models import best_label
+
+        label = best_label('fr')
+        assert ['3', '2'] == self.session.execute(
+            select(Thing.concept_id)
+            .filter(label.is_not(None))
+            .order_by(func.lower(label).desc())
+        ).scalars().all()
+
 
 class TestNote(DBTestCase):
 
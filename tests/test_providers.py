@@ -1,15 +1,43 @@
+import subprocess
+import sys
+
 import pytest
+from skosprovider.skos import label
 from skosprovider.uri import UriPatternGenerator
+from sqlalchemy import create_engine
+from sqlalchemy import select
 from sqlalchemy.orm import session
+from sqlalchemy.orm import sessionmaker
 
 from skosprovider_sqlalchemy.models import Base
 from skosprovider_sqlalchemy.models import Initialiser
 from skosprovider_sqlalchemy.providers import SQLAlchemyProvider
 from tests import DBTestCase
 from tests.conftest import create_data
+from tests.conftest import create_toplevel
+from tests.conftest import create_unmigrated_schema
 from tests.conftest import create_visitation
 
 
+def _dump(thing):
+    '''
+    Turn a concept or collection into something that can be compared.
+    '''
+    res = {}
+    for key, value in vars(thing).items():
+        if key == 'concept_scheme':
+            continue
+        elif key == 'matches':
+            value = {k: sorted(v) for k, v in value.items()}
+        elif isinstance(value, list):
+            value = sorted(
+                repr(vars(v)) if hasattr(v, '__dict__') else repr(v)
+                for v in value
+            )
+        res[key] = value
+    return res
+
+
 class TestSQLAlchemyProvider(DBTestCase):
 
     def setUp(self):
@@ -114,6 +142,53 @@ class TestSQLAlchemyProvider(DBTestCase):
         cs = self.provider.concept_scheme
         assert self.provider._conceptscheme == cs
 
+    def test_concept_scheme_clear_cache(self):
+        from skosprovider_sqlalchemy.models import ConceptScheme
+        cs = self.provider.concept_scheme
+        self.session.get(ConceptScheme, 1).uri = 'urn:x-skosprovider:changed'
+        self.session.flush()
+        assert self.provider.concept_scheme is cs
+        self.provider.clear_cache()
+        assert self.provider._conceptscheme is None
+        assert 'urn:x-skosprovider:changed' == self.provider.concept_scheme.uri
+
+    def test_concept_scheme_cache_ttl(self):
+        provider = SQLAlchemyProvider(
+            {'id': 'SOORTEN', 'conceptscheme_id': 1},
+            self.session,
+            cache_ttl=60
+        )
+        assert 60 == provider.cache_ttl
+        cs = provider.concept_scheme
+        assert provider.concept_scheme is cs
+        provider._conceptscheme_loaded -= 61
+        assert provider.concept_scheme is not cs
+        assert 'urn:x-skosprovider:test' == provider.concept_scheme.uri
+
+    def test_preloaded_concept_scheme(self):
+        from skosprovider.skos import ConceptScheme
+        from skosprovider_sqlalchemy.models import (
+            ConceptScheme as ConceptSchemeModel
+        )
+
+        preloaded = ConceptScheme('urn:x-skosprovider:preloaded')
+        provider = SQLAlchemyProvider(
+            {'id': 'SOORTEN', 'conceptscheme_id': 1},
+            self.session,
+            concept_scheme=preloaded,
+            cache_ttl=60
+        )
+        assert provider.concept_scheme is preloaded
+        provider._conceptscheme_loaded -= 61
+        assert 'urn:x-skosprovider:test' == provider.concept_scheme.uri
+        provider = SQLAlchemyProvider(
+            {'id': 'SOORTEN', 'conceptscheme_id': 1},
+            self.session,
+            concept_scheme=self.session.get(ConceptSchemeModel, 1)
+        )
+        assert provider._conceptscheme is not None
+        assert 'urn:x-skosprovider:test' == provider.concept_scheme.uri
+
     def test_get_concept_by_id(self):
         from skosprovider.skos import Concept
 
@@ -154,6 +229,88 @@ class TestSQLAlchemyProvider(DBTestCase):
         con = self.provider.get_by_uri('urn:x-skosprovider:test:404')
         assert not con
 
+    def test_get_by_uris(self):
+        uris = ['urn:x-skosprovider:test:%d' % i for i in range(1, 11)]
+        res = self.provider.get_by_uris(uris)
+        assert uris == list(res)
+        assert res['urn:x-skosprovider:test:10'] is False
+        for uri in uris[:-1]:
+            assert _dump(self.provider.get_by_uri(uri)) == _dump(res[uri])
+
+    def test_get_by_ids(self):
+        ids = [1, '2', 3, 404]
+        res = self.provider.get_by_ids(ids, chunk_size=2)
+        assert ids == list(res)
+        assert res[404] is False
+        for id in ids[:-1]:
+            assert _dump(self.provider.get_by_id(id)) == _dump(res[id])
+
+    def test_get_by_uris_unknown(self):
+        assert {'urn:x-skosprovider:test:404': False} == (
+            self.provider.get_by_uris(['urn:x-skosprovider:test:404'])
+        )
+
+    def test_get_by_uris_chunks(self):
+        uris = ['urn:x-skosprovider:test:%d' % i for i in range(1, 11)]
+        res = self.provider.get_by_uris(uris, chunk_size=3)
+        assert 9 == len([c for c in res.values() if c])
+
+    def test_uri_cache(self):
+        provider = SQLAlchemyProvider(
+            {'id': 'SOORTEN', 'conceptscheme_id': 1},
+            self.session,
+            uri_cache=True
+        )
+        assert provider.uri_cache
+        assert provider._uri_map is None
+        con = provider.get_by_uri('urn:x-skosprovider:test:1')
+        assert '1' == con.id
+        assert 9 == len(provider._uri_map)
+        assert not provider.get_by_uri('urn:x-skosprovider:test:404')
+        provider.clear_cache()
+        assert provider._uri_map is None
+
+    def test_uri_cache_stays_current(self):
+        from skosprovider_sqlalchemy.models import Concept as ConceptModel
+
+        provider = SQLAlchemyProvider(
+            {'id': 'SOORTEN', 'conceptscheme_id': 1},
+            self.session,
+            uri_cache=True
+        )
+        provider.get_by_uri('urn:x-skosprovider:test:1')
+        # Swap the uris of two concepts and add a new one.
+        self.session.get(ConceptModel, 10).uri = 'urn:x-skosprovider:test:3'
+        self.session.get(ConceptModel, 30).uri = 'urn:x-skosprovider:test:1'
+        self.session.add(ConceptModel(
+            id=100, concept_id=10, uri='urn:x-skosprovider:test:10',
+            conceptscheme_id=1
+        ))
+        self.session.flush()
+        res = provider.get_by_uris([
+            'urn:x-skosprovider:test:1',
+            'urn:x-skosprovider:test:3',
+            'urn:x-skosprovider:test:10'
+        ])
+        assert ['3', '1', '10'] == [c.id for c in res.values()]
+        assert 30 == provider._uri_map['urn:x-skosprovider:test:1']
+        assert 100 == provider._uri_map['urn:x-skosprovider:test:10']
+
+    def test_uri_cache_ttl(self):
+        provider = SQLAlchemyProvider(
+            {'id': 'SOORTEN', 'conceptscheme_id': 1},
+            self.session,
+            uri_cache=True,
+            cache_ttl=60
+        )
+        provider.get_by_uri('urn:x-skosprovider:test:1')
+        uri_map = provider._uri_map
+        provider.get_by_uri('urn:x-skosprovider:test:1')
+        assert provider._uri_map is uri_map
+        provider._uri_map_loaded -= 61
+        provider.get_by_uri('urn:x-skosprovider:test:1')
+        assert provider._uri_map is not uri_map
+
     def test_concept_has_correct_note(self):
         from skosprovider.skos import Note
 
@@ -189,6 +346,129 @@ class TestSQLAlchemyProvider(DBTestCase):
         assert cola.id == colb.id
         assert cola.uri == colb.uri
 
+    def _add_multilingual(self):
+        from skosprovider_sqlalchemy.models import Concept
+        from skosprovider_sqlalchemy.models import Label
+
+        self.session.add(Concept(
+            id=100, concept_id='100', conceptscheme_id=1,
+            labels=[
+                Label('Bidplaats', 'prefLabel', 'nl-BE'),
+                Label('Lieu de culte', 'prefLabel', 'fr'),
+                Label('Andachtsort', 'altLabel', 'de'),
+                Label('Gebedsplaats', 'hiddenLabel', 'nl-BE'),
+            ]
+        ))
+        self.session.flush()
+
+    def test_get_listing_labels(self):
+        self._add_multilingual()
+        labels = self.provider._get_listing_labels([10, 100], 'nl')
+        # Concept 1 has Dutch labels, so only those are needed.
+        assert {'nl'} == {l.language for l in labels[10]}
+        # Concept 100 has a label in a variant of Dutch.
+        assert ['Bidplaats'] == [l.label for l in labels[100]]
+
+    def test_get_listing_labels_fallback(self):
+        self._add_multilingual()
+        labels = self.provider._get_listing_labels([100], 'es')
+        # No Spanish labels, so everything but hidden labels is loaded.
+        assert ['Bidplaats', 'Lieu de culte', 'Andachtsort'] == [
+            l.label for l in labels[100]
+        ]
+
+    def test_get_listing_labels_match_label(self):
+        self._add_multilingual()
+        provider = SQLAlchemyProvider(
+            {'id': 'SOORTEN', 'conceptscheme_id': 1, 'default_language': 'fr'},
+            self.session
+        )
+        for language in ('es', 'fr', 'de', 'nl', 'en'):
+            labels = provider._get_listing_labels([100], language)
+            assert (
+                provider.get_by_id(100).label(language).label ==
+                label(labels[100], language).label
+            )
+        assert {
+            'id': '100',
+            'uri': None,
+            'type': 'concept',
+            'label': 'Bidplaats'
+        } in provider.get_all(language='es')
+
+    def test_get_all_matches_labels_of_things(self):
+        from skosprovider_sqlalchemy.models import Thing
+
+        self._add_multilingual()
+        for language in ('en', 'nl', 'nl-BE', 'fr', 'de', 'und', 'any'):
+            for sort in ('label', 'sortlabel'):
+                self.session.expire_all()
+                things = self.session.execute(
+                    select(Thing).filter(Thing.conceptscheme_id == 1)
+                ).scalars().all()
+                expected = [
+                    (t.concept_id, t.label(language).label)
+                    for t in sorted(
+                        things, key=lambda t: (t._sortkey(sort, language), t.id)
+                    )
+                ]
+                assert expected == [
+                    (c['id'], c['label'])
+                    for c in self.provider.get_all(language=language, sort=sort)
+                ]
+
+    def test_sql_listing_strategy(self):
+        from skosprovider_sqlalchemy.models import Thing
+
+        self._add_multilingual()
+        provider = SQLAlchemyProvider(
+            {'id': 'SOORTEN', 'conceptscheme_id': 1},
+            self.session,
+            listing_strategy='sql'
+        )
+        assert 'sql' == provider.listing_strategy
+        assert 'load' == self.provider.listing_strategy
+        for language in ('en', 'nl', 'nl-BE', 'fr', 'de', 'any'):
+            for sort in ('id', 'uri', 'label', 'sortlabel'):
+                self.session.expire_all()
+                things = self.session.execute(
+                    select(Thing).filter(Thing.conceptscheme_id == 1)
+                ).scalars().all()
+                expected = [
+                    (t.concept_id, t.label(language).label)
+                    for t in sorted(
+                        things, key=lambda t: (t._sortkey(sort, language), t.id)
+                    )
+                ]
+                assert expected == [
+                    (c['id'], c['label'])
+                    for c in provider.get_all(language=language, sort=sort)
+                ]
+
+    def test_sql_listing_strategy_find(self):
+        provider = SQLAlchemyProvider(
+            {'id': 'SOORTEN', 'conceptscheme_id': 1},
+            self.session,
+            listing_strategy='sql'
+        )
+        for query in (
+            {'label': 'kerken'},
+            {'type': 'collection'},
+            {'collection': {'id': 2, 'depth': 'all'}},
+            {'matches': {'uri': 'http://vocab.getty.edu/aat/300007501'}},
+        ):
+            expected = self.provider.find(query, sort='label', sort_order='desc')
+            assert expected
+            assert expected == provider.find(query, sort='label', sort_order='desc')
+
+    def test_set_invalid_listing_strategy(self):
+        with pytest.raises(ValueError):
+            SQLAlchemyProvider(
+                {'id': 'SOORTEN', 'conceptscheme_id': 1},
+                self.session,
+                listing_strategy='invalid'
+            )
+
     def test_get_all(self):
         all = self.provider.get_all()
         assert len(all) == 9
@@ -335,6 +615,68 @@ class TestSQLAlchemyProvider(DBTestCase):
             'Chapels'
         ] == [c['label'] for c in all]
 
+    def test_get_top_display_child_count(self):
+        all = self.provider.get_top_display(child_count=True)
+        assert {
+                   'id': '1',
+                   'uri': 'urn:x-skosprovider:test:1',
+                   'type': 'concept',
+                   'label': 'Churches',
+                   'child_count': 2,
+                   'has_children': True
+               } in all
+        assert {
+                   'id': '3',
+                   'uri': 'urn:x-skosprovider:test:3',
+                   'type': 'concept',
+                   'label': 'Chapels',
+                   'child_count': 1,
+                   'has_children': True
+               } in all
+
+    def test_get_children_display_child_count(self):
+        children = self.provider.get_children_display(2, child_count=True, sort='id')
+        assert [
+            {
+                'id': '4',
+                'uri': 'urn:x-skosprovider:test:4',
+                'type': 'concept',
+                'label': 'Cathedrals',
+                'child_count': 0,
+                'has_children': False
+            }, {
+                'id': '6',
+                'uri': 'urn:x-skosprovider:test:6',
+                'type': 'concept',
+                'label': 'Parochiekerken',
+                'child_count': 1,
+                'has_children': True
+            }
+        ] == children
+
+    def test_get_children_display_child_count_matches_children(self):
+        for thing in self.provider.get_all():
+            children = self.provider.get_children_display(thing['id'], child_count=True)
+            for child in children:
+                assert child['child_count'] == \
+                    len(self.provider.get_children_display(child['id']))
+
+    def test_get_children_display_counts_only_when_asked(self):
+        from sqlalchemy import event
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(self.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            children = self.provider.get_children_display(2)
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', before_cursor_execute)
+        assert ['4', '6'] == sorted(c['id'] for c in children)
+        assert not any('count(' in s.lower() for s in statements)
+
     def test_get_children_display_unexisting(self):
         children = self.provider.get_children_display(700)
         assert not children
@@ -383,6 +725,77 @@ class TestSQLAlchemyProvider(DBTestCase):
         children = self.provider.get_children_display(4)
         assert len(children) == 0
 
+    def test_get_display_tree(self):
+        tree = self.provider.get_display_tree([1, 3], sort='id')
+        assert ['1', '3'] == sorted(tree)
+        assert [
+            {
+                'id': '2',
+                'uri': 'urn:x-skosprovider:test:2',
+                'type': 'collection',
+                'label': 'Churches by function',
+                'has_children': True
+            }, {
+                'id': '8',
+                'uri': 'urn:x-skosprovider:test:8',
+                'type': 'collection',
+                'label': 'Parts of churches',
+                'has_children': True
+            }
+        ] == tree['1']
+        assert ['5'] == [c['id'] for c in tree['3']]
+        assert not tree['3'][0]['has_children']
+
+    def test_get_display_tree_depth(self):
+        tree = self.provider.get_display_tree([1], depth=3, sort='id')
+        churches = tree['1']
+        assert ['2', '8'] == [c['id'] for c in churches]
+        by_function = churches[0]['children']
+        assert ['4', '6'] == [c['id'] for c in by_function]
+        assert [] == by_function[0]['children']
+        assert 'children' not in by_function[1]['children'][0]
+        assert ['7'] == [c['id'] for c in by_function[1]['children']]
+        assert ['9'] == [c['id'] for c in churches[1]['children']]
+
+    def test_get_display_tree_matches_get_children_display(self):
+        for thing in self.provider.get_all():
+            tree = self.provider.get_display_tree([thing['id']])
+            children = self.provider.get_children_display(thing['id'])
+            assert sorted(c['id'] for c in children) == \
+                sorted(c['id'] for c in tree[thing['id']])
+
+    def test_get_display_tree_invalid_depth(self):
+        with pytest.raises(ValueError):
+            self.provider.get_display_tree([1], depth=0)
+
+    def test_get_display_tree_wide(self):
+        from skosprovider_sqlalchemy.models import Concept
+
+        roots = []
+        for i in range(1200):
+            root = Concept(
+                id=1000 + 2 * i, concept_id=str(1000 + 2 * i),
+                conceptscheme_id=1
+            )
+            root.narrower_concepts.add(Concept(
+                id=1001 + 2 * i, concept_id=str(1001 + 2 * i),
+                conceptscheme_id=1
+            ))
+            roots.append(root)
+        self.session.add_all(roots)
+        self.session.flush()
+        ids = [r.concept_id for r in roots]
+        tree = self.provider.get_display_tree(ids + ['700'], depth=2)
+        assert not tree['700']
+        for root in roots:
+            assert [str(root.id + 1)] == [c['id'] for c in tree[root.concept_id]]
+            assert [] == tree[root.concept_id][0]['children']
+
+    def test_get_display_tree_unexisting(self):
+        tree = self.provider.get_display_tree([3, 700])
+        assert not tree['700']
+        assert 1 == len(tree['3'])
+
     def test_find_all(self):
         all = self.provider.find({})
         assert len(all) == 9
@@ -462,6 +875,84 @@ class TestSQLAlchemyProvider(DBTestCase):
                    'label': 'Churches'
                } in all
 
+    def test_suggest(self):
+        res = self.provider.suggest('Church')
+        assert [
+            'Churches', 'Churches by function', 'Churchtowers',
+            'Parts of churches'
+        ] == [r['match'] for r in res]
+        assert {
+            'id': '1',
+            'uri': 'urn:x-skosprovider:test:1',
+            'type': 'concept',
+            'label': 'Churches',
+            'match': 'Churches'
+        } == res[0]
+
+    def test_suggest_exact_before_prefix(self):
+        res = self.provider.suggest('churches by function')
+        assert ['Churches by function'] == [r['match'] for r in res]
+        res = self.provider.suggest('kerken')
+        # Kerken is an exact match, Hulpkerken and Parochiekerken are infix.
+        assert ['1', '7', '6'] == [r['id'] for r in res]
+        assert 'Churches' == res[0]['label']
+        assert 'Kerken' == res[0]['match']
+
+    def test_suggest_ranking(self):
+        from skosprovider_sqlalchemy.models import Concept
+        from skosprovider_sqlalchemy.models import Label
+
+        self._add_multilingual()
+        self.session.add_all([
+            Concept(
+                id=101, concept_id='101', conceptscheme_id=1,
+                labels=[Label('Gebedsruimte', 'prefLabel', 'nl')]
+            ),
+            Concept(
+                id=102, concept_id='102', conceptscheme_id=1,
+                labels=[Label('Gebedshal', 'prefLabel', 'fr')]
+            ),
+        ])
+        self.session.flush()
+        # prefLabels before hiddenLabels, Dutch before French.
+        assert ['101', '102', '100'] == [
+            r['id'] for r in self.provider.suggest('gebed', 'nl')
+        ]
+        assert ['102', '101', '100'] == [
+            r['id'] for r in self.provider.suggest('gebed', 'fr')
+        ]
+        assert ['Bidplaats'] == [
+            r['label'] for r in self.provider.suggest('gebedsplaats', 'nl')
+        ]
+
+    def test_suggest_limit(self):
+        assert ['1', '2'] == [
+            r['id'] for r in self.provider.suggest('church', limit=2)
+        ]
+        with pytest.raises(ValueError):
+            self.provider.suggest('church', limit=0)
+        with pytest.raises(ValueError):
+            self.provider.suggest('church', limit='10')
+
+    def test_suggest_without_infix(self):
+        assert ['1'] == [
+            r['id'] for r in self.provider.suggest('kerk', infix=False)
+        ]
+
+    def test_suggest_nothing(self):
+        assert [] == self.provider.suggest('  ')
+        assert [] == self.provider.suggest('%')
+        assert [] == self.provider.suggest('_hurch')
+        assert [] == self.provider.suggest('churchez')
+
+    def test_suggest_direct_labels(self):
+        direct = SQLAlchemyProvider(
+            {'id': 'SOORTEN', 'conceptscheme_id': 1}, self.session,
+            label_strategy='direct'
+        )
+        for prefix in ['church', 'ker', 'kapel', 'c']:
+            assert self.provider.suggest(prefix) == direct.suggest(prefix)
+
     def test_find_collection_unexisting(self):
         with pytest.raises(ValueError):
             self.provider.find({'collection': {'id': 404}})
@@ -572,6 +1063,68 @@ class TestSQLAlchemyProvider(DBTestCase):
                    'label': 'Churchtowers'
                } in all
 
+    def test_find_by_matches(self):
+        res = self.provider.find_by_matches([
+            'http://vocab.getty.edu/aat/300007501',
+            'http://vocab.getty.edu/aat/300003625',
+            'http://vocab.getty.edu/aat/notpresent',
+        ])
+        assert {
+            'http://vocab.getty.edu/aat/300007501': [{
+                'id': '4',
+                'uri': 'urn:x-skosprovider:test:4',
+                'type': 'concept',
+                'label': 'Cathedrals'
+            }],
+            'http://vocab.getty.edu/aat/300003625': [{
+                'id': '9',
+                'uri': 'urn:x-skosprovider:test:9',
+                'type': 'concept',
+                'label': 'Churchtowers'
+            }],
+            'http://vocab.getty.edu/aat/notpresent': []
+        } == res
+
+    def test_find_by_matches_close_inherits_exact(self):
+        uris = [
+            'http://vocab.getty.edu/aat/300007501',
+            'http://vocab.getty.edu/aat/300003625'
+        ]
+        res = self.provider.find_by_matches(uris, types=['close'])
+        assert [['4'], ['9']] == [[c['id'] for c in res[u]] for u in uris]
+        res = self.provider.find_by_matches(uris, types=['exact'])
+        assert [[], ['9']] == [[c['id'] for c in res[u]] for u in uris]
+        res = self.provider.find_by_matches(uris, types=['broad'])
+        assert [[], []] == [res[u] for u in uris]
+
+    def test_find_by_matches_chunks(self):
+        uris = ['http://vocab.getty.edu/aat/%d' % i for i in range(300000000, 300010000)]
+        res = self.provider.find_by_matches(uris, chunk_size=500)
+        assert 10000 == len(res)
+        assert ['4'] == [c['id'] for c in res['http://vocab.getty.edu/aat/300007501']]
+        assert ['9'] == [c['id'] for c in res['http://vocab.getty.edu/aat/300003625']]
+
+    def test_find_by_matches_matches_find(self):
+        for uri in [
+            'http://vocab.getty.edu/aat/300007501',
+            'http://vocab.getty.edu/aat/300003625'
+        ]:
+            for type in ['close', 'exact', None]:
+                query = {'uri': uri}
+                if type:
+                    query['type'] = type
+                assert self.provider.find({'matches': query}) == (
+                    self.provider.find_by_matches(
+                        [uri], types=[type] if type else None
+                    )[uri]
+                )
+
+    def test_find_by_matches_unknown_type(self):
+        with pytest.raises(ValueError):
+            self.provider.find_by_matches(
+                ['http://vocab.getty.edu/aat/300007501'], types=['fuzzy']
+            )
+
     def test_expand_concept(self):
         ids = self.provider.expand(1)
         assert {'1', '4', '6', '7'} == set(ids)
@@ -592,6 +1145,69 @@ class TestSQLAlchemyProvider(DBTestCase):
         ids = self.provider.expand(404)
         assert not ids
 
+    def test_iter_raw(self):
+        records = list(self.provider.iter_raw())
+        assert len(records) == 9
+        assert [r.id for r in records] == ['1', '2', '3', '4', '5', '6', '7', '8', '9']
+
+    def test_iter_raw_chunked(self):
+        records = list(self.provider.iter_raw(chunk_size=2))
+        assert len(records) == 9
+        assert len({r.id for r in records}) == 9
+
+    def test_iter_raw_matches_get_by_id(self):
+        for record in self.provider.iter_raw():
+            thing = self.provider.get_by_id(record.id)
+            assert record.uri == thing.uri
+            assert record.type == thing.type
+            assert sorted(l.label for l in record.labels) == \
+                sorted(l.label for l in thing.labels)
+            assert len(record.notes) == len(thing.notes)
+            assert sorted(record.member_of) == sorted(thing.member_of)
+            if record.type == 'concept':
+                assert sorted(record.broader) == sorted(thing.broader)
+                assert sorted(record.narrower) == sorted(thing.narrower)
+                assert sorted(record.related) == sorted(thing.related)
+                assert sorted(record.subordinate_arrays) == \
+                    sorted(thing.subordinate_arrays)
+                assert record.matches == thing.matches
+            else:
+                assert sorted(record.members) == sorted(thing.members)
+                assert sorted(record.superordinates) == \
+                    sorted(thing.superordinates)
+                assert record.infer_concept_relations == \
+                    thing.infer_concept_relations
+
+    def test_iter_raw_concept_ids(self):
+        records = list(self.provider.iter_raw(concept_ids=[1, '2', 404]))
+        assert ['1', '2'] == [r.id for r in records]
+        assert 'Churches' == label(records[0].labels, 'en').label
+        assert ['2', '8'] == sorted(records[0].subordinate_arrays)
+        assert ['4', '6'] == sorted(records[1].members)
+
+    def test_iter_raw_relation_uris(self):
+        records = list(self.provider.iter_raw(concept_ids=[1, 2], relation_uris=True))
+        assert [
+            'urn:x-skosprovider:test:2', 'urn:x-skosprovider:test:8'
+        ] == sorted(records[0].subordinate_arrays)
+        assert [
+            'urn:x-skosprovider:test:4', 'urn:x-skosprovider:test:6'
+        ] == sorted(records[1].members)
+
+    def test_iter_raw_gen_uri(self):
+        from skosprovider_sqlalchemy.models import Concept, ConceptScheme
+        provider = SQLAlchemyProvider(
+            {'id': 'SOORTEN', 'conceptscheme_id': 99},
+            self.session,
+            uri_generator=UriPatternGenerator('http://id.example.com/trees/%s')
+        )
+        self.session.add(
+            Concept(concept_id=1, conceptscheme=ConceptScheme(id=99, uri='http://id.example.com/trees'))
+        )
+        self.session.flush()
+        records = list(provider.iter_raw())
+        assert records[0].uri == 'http://id.example.com/trees/1'
+
 
 class TestSQLAlchemyProviderExpandVisit(DBTestCase):
 
@@ -666,3 +1282,400 @@ class TestSQLAlchemyProviderExpandVisitNoVisitation(DBTestCase):
         ids = self.visitationprovider.expand(404)
         assert not ids
 
+
+class TestSQLAlchemyProviderTopPrecomputed(DBTestCase):
+
+    def setUp(self):
+        Base.metadata.create_all(self.engine)
+        self.session = self.session_maker()
+        Initialiser(self.session).init_all()
+        create_data(self.session)
+        self.provider = SQLAlchemyProvider(
+            {'id': 'SOORTEN', 'conceptscheme_id': 1},
+            self.session,
+            top_strategy='precomputed'
+        )
+
+    def tearDown(self):
+        self.session.rollback()
+        session.close_all_sessions()
+        Base.metadata.drop_all(self.engine)
+
+    def test_top_strategy(self):
+        assert 'precomputed' == self.provider.top_strategy
+
+    def test_set_invalid_top_strategy(self):
+        with pytest.raises(ValueError):
+            SQLAlchemyProvider(
+                {'id': 'SOORTEN', 'conceptscheme_id': 1},
+                self.session,
+                top_strategy='invalid'
+            )
+
+    def test_get_top_concepts_without_toplevel(self):
+        top = self.provider.get_top_concepts(sort='id')
+        assert ['1', '3', '9'] == [c['id'] for c in top]
+
+    def test_get_top_display_without_toplevel(self):
+        top = self.provider.get_top_display(sort='id')
+        assert ['1', '3'] == [c['id'] for c in top]
+
+    def test_get_top_concepts(self):
+        create_toplevel(self.session)
+        top = self.provider.get_top_concepts(sort='id')
+        assert ['1', '3', '9'] == [c['id'] for c in top]
+        assert {
+                   'id': '1',
+                   'uri': 'urn:x-skosprovider:test:1',
+                   'type': 'concept',
+                   'label': 'Churches'
+               } in top
+
+    def test_get_top_display(self):
+        create_toplevel(self.session)
+        top = self.provider.get_top_display(sort='label', sort_order='desc')
+        assert ['Churches', 'Chapels'] == [c['label'] for c in top]
+
+    def test_get_top_display_child_count(self):
+        create_toplevel(self.session)
+        top = self.provider.get_top_display(sort='id', child_count=True)
+        assert [2, 1] == [c['child_count'] for c in top]
+        assert all(c['has_children'] for c in top)
+
+    def test_get_top_concepts_reads_toplevel(self):
+        from skosprovider_sqlalchemy.models import TopLevel
+        self.session.add(TopLevel(conceptscheme_id=1, concept_id=50, hierarchy='concept'))
+        self.session.flush()
+        top = self.provider.get_top_concepts()
+        assert ['5'] == [c['id'] for c in top]
+
+    def test_query_top_level(self):
+        from skosprovider_sqlalchemy.models import TopLevel
+        self.session.add(TopLevel(conceptscheme_id=1, concept_id=50, hierarchy='concept'))
+        self.session.flush()
+        # The TopLevel table is ignored.
+        assert ['1', '3', '9'] == sorted(
+            c.concept_id for c in self.provider.query_top_level('concept')
+        )
+        assert ['1', '3'] == sorted(
+            c.concept_id for c in self.provider.query_top_level('display')
+        )
+        with pytest.raises(ValueError):
+            self.provider.query_top_level('collection')
+
+
+class TestSQLAlchemyProviderDirectLabels(DBTestCase):
+
+    def setUp(self):
+        Base.metadata.create_all(self.engine)
+        self.session = self.session_maker()
+        Initialiser(self.session).init_all()
+        create_data(self.session)
+        create_toplevel(self.session)
+        self.provider = SQLAlchemyProvider(
+            {'id': 'SOORTEN', 'conceptscheme_id': 1},
+            self.session,
+            label_strategy='direct'
+        )
+        self.association = SQLAlchemyProvider(
+            {'id': 'SOORTEN', 'conceptscheme_id': 1},
+            self.session
+        )
+
+    def tearDown(self):
+        self.session.rollback()
+        session.close_all_sessions()
+        Base.metadata.drop_all(self.engine)
+
+    def _statements(self, call):
+        from sqlalchemy import event
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(self.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            self.session.expire_all()
+            res = call()
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', before_cursor_execute)
+        return res, statements
+
+    def test_label_strategy(self):
+        assert 'association' == self.association.label_strategy
+        assert 'direct' == self.provider.label_strategy
+
+    def test_set_invalid_label_strategy(self):
+        with pytest.raises(ValueError):
+            SQLAlchemyProvider(
+                {'id': 'SOORTEN', 'conceptscheme_id': 1},
+                self.session,
+                label_strategy='invalid'
+            )
+
+    def test_get_by_id(self):
+        for id in range(1, 10):
+            self.session.expire_all()
+            expected = _dump(self.association.get_by_id(id))
+            self.session.expire_all()
+            assert expected == _dump(self.provider.get_by_id(id))
+
+    def test_get_by_uris(self):
+        uris = ['urn:x-skosprovider:test:%d' % id for id in range(1, 10)]
+        expected = {
+            uri: _dump(thing)
+            for uri, thing in self.association.get_by_uris(uris).items()
+        }
+        self.session.expire_all()
+        assert expected == {
+            uri: _dump(thing)
+            for uri, thing in self.provider.get_by_uris(uris).items()
+        }
+
+    def test_listings(self):
+        for method, kwargs in (
+            ('get_all', {}),
+            ('get_top_concepts', {}),
+            ('get_top_display', {'child_count': True}),
+            ('get_children_display', {'thing_id': 1}),
+            ('find', {'query': {'label': 'kerken'}}),
+        ):
+            self.session.expire_all()
+            expected = getattr(self.association, method)(sort='id', **kwargs)
+            self.session.expire_all()
+            assert expected == getattr(self.provider, method)(sort='id', **kwargs)
+
+    def test_iter_raw(self):
+        expected = list(self.association.iter_raw())
+        assert expected == list(self.provider.iter_raw())
+
+    def test_no_association_joins(self):
+        for call in (
+            lambda: self.provider.get_by_id(1),
+            lambda: self.provider.get_all(),
+            lambda: self.provider.get_top_display(),
+            lambda: self.provider.find({'label': 'kerken'}),
+            lambda: list(self.provider.iter_raw()),
+        ):
+            res, statements = self._statements(call)
+            assert res
+            for statement in statements:
+                for table in ('concept_label', 'concept_note', 'concept_source'):
+                    assert table not in statement
+
+    def test_new_label(self):
+        from skosprovider_sqlalchemy.models import Concept
+        from skosprovider_sqlalchemy.models import Label
+
+        concept = self.session.get(Concept, 10)
+        concept.labels.append(Label('Kirchen', 'prefLabel', 'de'))
+        self.session.flush()
+        self.session.expire_all()
+        assert 'Kirchen' == self.provider.get_all(language='de', sort='id')[0]['label']
+
+
+class TestSQLAlchemyProviderUnmigrated(DBTestCase):
+
+    def setUp(self):
+        if self.engine.dialect.name != 'sqlite':
+            pytest.skip('The unmigrated schema is only built on SQLite.')
+        Base.metadata.create_all(self.engine)
+        create_unmigrated_schema(self.engine)
+        self.session = self.session_maker()
+        Initialiser(self.session).init_all()
+        create_data(self.session)
+        self.provider = SQLAlchemyProvider(
+            {'id': 'SOORTEN', 'conceptscheme_id': 1},
+            self.session
+        )
+
+    def tearDown(self):
+        self.session.rollback()
+        session.close_all_sessions()
+        Base.metadata.drop_all(self.engine)
+
+    def test_has_no_owner_columns(self):
+        from skosprovider_sqlalchemy.models import has_owner_columns
+
+        assert not has_owner_columns(self.engine)
+
+    def test_read(self):
+        self.session.expire_all()
+        con = self.provider.get_by_id(1)
+        assert 'Churches' == con.label('en').label
+        assert 2 == len(self.provider.get_by_uris([con.uri, 'urn:x-skosprovider:test:2']))
+        assert 9 == len(self.provider.get_all())
+        assert self.provider.find({'label': 'kerken'})
+        assert self.provider.get_top_display(child_count=True)
+        assert self.provider.get_children_display(1)
+        assert 9 == len(list(self.provider.iter_raw()))
+
+    def test_write(self):
+        from skosprovider_sqlalchemy.models import Concept
+        from skosprovider_sqlalchemy.models import Label
+        from skosprovider_sqlalchemy.models import Note
+
+        concept = self.session.get(Concept, 10)
+        concept.labels.append(Label('Kirchen', 'prefLabel', 'de'))
+        concept.notes.append(Note('Kirchen nach Funktion.', 'note', 'de'))
+        self.session.flush()
+        self.session.expire_all()
+        assert 'Kirchen' == self.provider.get_by_id(1).label('de').label
+
+
+class TestSQLAlchemyProviderQueryPlans(DBTestCase):
+
+    def setUp(self):
+        if self.engine.dialect.name != 'sqlite':
+            pytest.skip('Query plans are only checked on SQLite.')
+        Base.metadata.create_all(self.engine)
+        self.session = self.session_maker()
+        Initialiser(self.session).init_all()
+        create_data(self.session)
+        self.provider = SQLAlchemyProvider(
+            {'id': 'SOORTEN', 'conceptscheme_id': 1},
+            self.session
+        )
+
+    def tearDown(self):
+        self.session.rollback()
+        session.close_all_sessions()
+        Base.metadata.drop_all(self.engine)
+
+    def _get_plans(self, func, *args, **kwargs):
+        from sqlalchemy import event
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT'):
+                statements.append((statement, parameters))
+
+        self.session.expunge_all()
+        event.listen(self.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            func(*args, **kwargs)
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', before_cursor_execute)
+        assert statements
+        conn = self.session.connection()
+        return [
+            row[3]
+            for statement, parameters in statements
+            for row in conn.exec_driver_sql(
+                'EXPLAIN QUERY PLAN ' + statement, parameters
+            )
+        ]
+
+    def _assert_no_scans(self, plans):
+        assert [] == [p for p in plans if p.startswith('SCAN')]
+
+    def test_get_by_id(self):
+        self._assert_no_scans(self._get_plans(self.provider.get_by_id, 1))
+
+    def test_get_by_uri(self):
+        plans = self._get_plans(
+            self.provider.get_by_uri, 'urn:x-skosprovider:test:1'
+        )
+        self._assert_no_scans(plans)
+        assert any('ix_concept_uri_conceptscheme_id' in p for p in plans)
+
+    def test_find(self):
+        self._assert_no_scans(self._get_plans(
+            self.provider.find,
+            {'label': 'kerk', 'type': 'concept', 'collection': {'id': 2, 'depth': 'all'}}
+        ))
+
+    def test_find_matches(self):
+        plans = self._get_plans(
+            self.provider.find,
+            {'matches': {'type': 'close', 'uri': 'http://vocab.getty.edu/aat/300007501'}}
+        )
+        self._assert_no_scans(plans)
+        assert any('ix_match_uri' in p for p in plans)
+
+    def test_get_by_uris(self):
+        plans = self._get_plans(
+            self.provider.get_by_uris,
+            ['urn:x-skosprovider:test:1', 'urn:x-skosprovider:test:2']
+        )
+        self._assert_no_scans(plans)
+        assert any('ix_concept_uri_conceptscheme_id' in p for p in plans)
+
+    def test_find_by_matches(self):
+        plans = self._get_plans(
+            self.provider.find_by_matches,
+            ['http://vocab.getty.edu/aat/300007501', 'http://vocab.getty.edu/aat/300003625'],
+            types=['close']
+        )
+        self._assert_no_scans(plans)
+        assert any('ix_match_uri' in p for p in plans)
+
+    def test_get_all(self):
+        self._assert_no_scans(self._get_plans(self.provider.get_all))
+
+    def test_get_top_concepts(self):
+        plans = self._get_plans(self.provider.get_top_concepts)
+        self._assert_no_scans(plans)
+        assert any('ix_concept_hierarchy_concept_concept_id_narrower' in p for p in plans)
+        assert any('ix_collection_concept_concept_id' in p for p in plans)
+
+    def test_get_top_display(self):
+        plans = self._get_plans(self.provider.get_top_display, child_count=True)
+        self._assert_no_scans(plans)
+        assert any('ix_concept_hierarchy_collection_collection_id_narrower' in p for p in plans)
+
+    def test_get_children_display(self):
+        self._assert_no_scans(self._get_plans(self.provider.get_children_display, 1))
+
+    def test_get_display_tree(self):
+        self._assert_no_scans(self._get_plans(self.provider.get_display_tree, [1, 3], depth=3))
+
+    def test_expand(self):
+        self._assert_no_scans(self._get_plans(self.provider.expand, 1))
+
+    def test_iter_raw(self):
+        plans = self._get_plans(list, self.provider.iter_raw())
+        self._assert_no_scans(plans)
+        assert any('ix_concept_related_concept_concept_id_to' in p for p in plans)
+
+
+class TestSQLAlchemyProviderFreshProcess:
+
+    SCRIPT = '''
+import sys
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from skosprovider_sqlalchemy.providers import SQLAlchemyProvider
+session = sessionmaker(bind=create_engine(sys.argv[1]))()
+provider = SQLAlchemyProvider({'id': 'SOORTEN', 'conceptscheme_id': 1}, session)
+print(len(getattr(provider, sys.argv[2])()))
+'''
+
+    @pytest.fixture(autouse=True)
+    def database(self, tmp_path):
+        self.url = 'sqlite:///%s' % (tmp_path / 'skos.db')
+        engine = create_engine(self.url)
+        Base.metadata.create_all(engine)
+        s = sessionmaker(bind=engine)()
+        Initialiser(s).init_all()
+        create_data(s)
+        s.commit()
+        s.close()
+        engine.dispose()
+
+    def _run(self, method):
+        res = subprocess.run(
+            [sys.executable, '-c', self.SCRIPT, self.url, method],
+            capture_output=True, text=True
+        )
+        assert '' == res.stderr
+        return int(res.stdout)
+
+    def test_get_top_concepts(self):
+        assert 3 == self._run('get_top_concepts')
+
+    def test_get_top_display(self):
+        assert 2 == self._run('get_top_display')
@@ -0,0 +1,271 @@
+import pytest
+from sqlalchemy.orm import session
+
+from skosprovider_sqlalchemy.generator import generate_scheme
+from skosprovider_sqlalchemy.models import Base
+from skosprovider_sqlalchemy.models import Collection
+from skosprovider_sqlalchemy.models import Concept
+from skosprovider_sqlalchemy.models import ConceptScheme
+from skosprovider_sqlalchemy.models import Initialiser
+from skosprovider_sqlalchemy.models import Label
+from skosprovider_sqlalchemy.models import Language
+from skosprovider_sqlalchemy.models import Match
+from skosprovider_sqlalchemy.models import Note
+from skosprovider_sqlalchemy.models import Source
+from skosprovider_sqlalchemy.providers import SQLAlchemyProvider
+from tests import DBTestCase
+
+SIZES = (2, 10)
+
+
+def create_scheme(session, size):
+    '''
+    Create a conceptscheme that grows in every direction with `size`.
+
+    * Concept 1 is the top concept. It has `size` narrower concepts, each
+      with one narrower concept of its own, and subordinate array 2 with
+      all of its narrower concepts as members.
+    * Every narrower concept has labels, notes, sources, matches and
+      related concepts. Concept 6 is the first one.
+    * There are `size` concepts without a broader concept that are a
+      member of collection 4, nested in collection 3. Their broader
+      concept is inferred from collection 3, so they are not top concepts.
+    * There are `size` more top concepts that are a member of collection
+      5, that does not infer concept relations.
+    '''
+    cs = ConceptScheme(
+        id=1,
+        uri='urn:x-skosprovider:counts',
+        languages=[session.get(Language, 'en'), session.get(Language, 'nl')]
+    )
+    session.add(cs)
+    ids = iter(range(1, 10 * size + 10))
+
+    def _thing(cls, **kwargs):
+        id = next(ids)
+        thing = cls(
+            id=id,
+            concept_id=id,
+            uri='urn:x-skosprovider:counts:%d' % id,
+            conceptscheme=cs,
+            **kwargs
+        )
+        thing.labels.append(Label('Thing %d' % id, 'prefLabel', 'en'))
+        thing.labels.append(Label('Ding %d' % id, 'prefLabel', 'nl'))
+        session.add(thing)
+        return thing
+
+    top = _thing(Concept)
+    array = _thing(Collection, infer_concept_relations=True)
+    array.broader_concepts.add(top)
+    outer = _thing(Collection, infer_concept_relations=True)
+    outer.broader_concepts.add(top)
+    inner = _thing(Collection, infer_concept_relations=False)
+    inner.member_of.add(outer)
+    loose = _thing(Collection, infer_concept_relations=False)
+
+    previous = None
+    for i in range(size):
+        concept = _thing(Concept)
+        concept.broader_concepts.add(top)
+        concept.member_of.add(array)
+        concept.notes.append(Note('Note %d' % i, 'scopeNote', 'en'))
+        concept.sources.append(Source('Source %d' % i))
+        concept.matches.append(
+            Match(matchtype_id='closeMatch', uri='urn:x-match:close:%d' % i)
+        )
+        concept.matches.append(
+            Match(matchtype_id='exactMatch', uri='urn:x-match:exact:%d' % i)
+        )
+        if previous is not None:
+            concept.related_concepts.add(previous)
+        previous = concept
+        _thing(Concept).broader_concepts.add(concept)
+        top.matches.append(
+            Match(matchtype_id='broadMatch', uri='urn:x-match:broad:%d' % i)
+        )
+    for _ in range(size):
+        _thing(Concept).member_of.add(inner)
+        _thing(Concept).member_of.add(loose)
+    session.commit()
+
+
+class TestQueryCounts(DBTestCase):
+    '''
+    Check that the number of SQL statements a provider method issues does
+    not grow with the amount of data it returns.
+    '''
+
+    def setUp(self):
+        Base.metadata.create_all(self.engine)
+
+    def tearDown(self):
+        session.close_all_sessions()
+        Base.metadata.drop_all(self.engine)
+
+    def _count(self, size, method, *args, **kwargs):
+        '''
+        Count the statements issued by a provider method for a conceptscheme
+        of a certain size.
+        '''
+        s = self.session_maker()
+        Initialiser(s).init_all()
+        create_scheme(s, size)
+        calls = []
+        provider = SQLAlchemyProvider(
+            {'id': 'COUNTS', 'conceptscheme_id': 1},
+            s,
+            instrumentation=calls.append,
+        )
+        # Load the conceptscheme up front, it is cached afterwards.
+        provider.concept_scheme
+        s.expunge_all()
+        res = getattr(provider, method)(*args, **kwargs)
+        assert res
+        s.close()
+        session.close_all_sessions()
+        Base.metadata.drop_all(self.engine)
+        Base.metadata.create_all(self.engine)
+        return calls[0].statements
+
+    def _assert_bounded(self, method, *args, **kwargs):
+        counts = [
+            self._count(size, method, *args, **kwargs)
+            for size in SIZES
+        ]
+        assert len(set(counts)) == 1, (
+            'Statements issued by %s grow with the data: %s.' % (
+                method, dict(zip(SIZES, counts))
+            )
+        )
+
+    def test_get_by_id_concept(self):
+        self._assert_bounded('get_by_id', 1)
+
+    def test_get_by_id_narrower(self):
+        self._assert_bounded('get_by_id', 6)
+
+    def test_get_by_id_collection(self):
+        self._assert_bounded('get_by_id', 2)
+
+    def test_get_by_uri(self):
+        self._assert_bounded('get_by_uri', 'urn:x-skosprovider:counts:1')
+
+    def test_get_by_uris(self):
+        self._assert_bounded(
+            'get_by_uris',
+            ['urn:x-skosprovider:counts:%d' % i for i in range(1, 9)]
+        )
+
+    def test_get_by_ids(self):
+        self._assert_bounded('get_by_ids', list(range(1, 9)))
+
+    def test_find(self):
+        self._assert_bounded('find', {'label': 'Thing'})
+
+    def test_find_collection(self):
+        self._assert_bounded(
+            'find', {'collection': {'id': 3, 'depth': 'all'}}
+        )
+
+    def test_find_by_matches(self):
+        self._assert_bounded(
+            'find_by_matches',
+            ['urn:x-match:close:%d' % i for i in range(10)],
+            types=['close']
+        )
+
+    def test_get_all(self):
+        self._assert_bounded('get_all')
+
+    def test_get_top_concepts(self):
+        self._assert_bounded('get_top_concepts')
+
+    def test_get_top_display(self):
+        self._assert_bounded('get_top_display', child_count=True)
+
+    def test_get_children_display(self):
+        self._assert_bounded('get_children_display', 1, child_count=True)
+
+    def test_expand(self):
+        self._assert_bounded('expand', 1)
+
+    def test_expand_collection(self):
+        self._assert_bounded('expand', 3)
+
+    def test_get_display_tree(self):
+        self._assert_bounded('get_display_tree', [1], depth=2)
+
+
+class TestQueryCost(DBTestCase):
+    '''
+    Check that the work the database does for a provider method does not
+    grow with the size of unrelated conceptschemes in the same database.
+    '''
+
+    def setUp(self):
+        if self.engine.dialect.name != 'sqlite':
+            pytest.skip('Counting the work of a query needs SQLite.')
+        Base.metadata.create_all(self.engine)
+        self.session = self.session_maker()
+        Initialiser(self.session).init_all()
+        create_scheme(self.session, 10)
+
+    def tearDown(self):
+        self.session.close()
+        session.close_all_sessions()
+        Base.metadata.drop_all(self.engine)
+
+    def _cost(self, method, *args, **kwargs):
+        '''
+        Count the SQLite virtual machine steps a provider method takes.
+        '''
+        self.session.expire_all()
+        provider = SQLAlchemyProvider(
+            {'id': 'COUNTS', 'conceptscheme_id': 1}, self.session
+        )
+        provider.concept_scheme
+        conn = self.session.connection().connection.driver_connection
+        steps = []
+
+        def _step():
+            steps.append(1)
+            return 0
+
+        conn.set_progress_handler(_step, 10)
+        try:
+            assert getattr(provider, method)(*args, **kwargs)
+        finally:
+            conn.set_progress_handler(None, 10)
+        return len(steps)
+
+    def _assert_bounded(self, method, *args, **kwargs):
+        before = self._cost(method, *args, **kwargs)
+        if not hasattr(self, 'generated'):
+            self.generated = generate_scheme(
+                self.session.connection(),
+                size=2000, languages=('nl', 'en', 'fr', 'de')
+            )
+            self.session.commit()
+        after = self._cost(method, *args, **kwargs)
+        assert after <= 2 * before, (
+            'The cost of %s grows with the size of the database: %d steps '
+            'before and %d after adding a conceptscheme.' % (
+                method, before, after
+            )
+        )
+
+    def test_get_all(self):
+        self._assert_bounded('get_all', language='nl')
+
+    def test_get_all_fallback(self):
+        self._assert_bounded('get_all', language='es')
+
+    def test_find(self):
+        self._assert_bounded('find', {'label': 'Thing'}, language='es')
+
+    def test_get_top_display(self):
+        self._assert_bounded('get_top_display', language='es')
+
+    def test_get_children_display(self):
+        self._assert_bounded('get_children_display', 1, language='es')
@@ -0,0 +1,131 @@
+from skosprovider.uri import TypedUrnGenerator
+from skosprovider.uri import UriPatternGenerator
+from sqlalchemy.orm import session
+
+from skosprovider_sqlalchemy.factory import ProviderFactory
+from skosprovider_sqlalchemy.models import Base
+from skosprovider_sqlalchemy.models import Collection
+from skosprovider_sqlalchemy.models import Concept
+from skosprovider_sqlalchemy.models import ConceptScheme
+from skosprovider_sqlalchemy.models import Initialiser
+from skosprovider_sqlalchemy.providers import SQLAlchemyProvider
+from skosprovider_sqlalchemy.resolver import UriResolver
+from tests import DBTestCase
+from tests.conftest import create_data
+
+
+class TestUriResolver(DBTestCase):
+
+    def setUp(self):
+        Base.metadata.create_all(self.engine)
+        self.session = self.session_maker()
+        Initialiser(self.session).init_all()
+        create_data(self.session)
+        for id in (2, 3, 4):
+            self.session.add(ConceptScheme(id=id, uri='urn:x-skosprovider:%d' % id))
+        self.session.add_all([
+            Concept(id=110, concept_id='oak', conceptscheme_id=2),
+            Concept(id=120, concept_id='Oak', conceptscheme_id=3),
+            Concept(id=130, concept_id='1', conceptscheme_id=4),
+            Collection(id=140, concept_id='2', conceptscheme_id=4),
+        ])
+        self.session.commit()
+        self.providers = [
+            SQLAlchemyProvider(
+                {'id': 'SOORTEN', 'conceptscheme_id': 1}, self.session
+            ),
+            SQLAlchemyProvider(
+                {'id': 'TREES', 'conceptscheme_id': 2}, self.session,
+                uri_generator=UriPatternGenerator('http://id.example.com/trees/%s')
+            ),
+            SQLAlchemyProvider(
+                {'id': 'BOMEN', 'conceptscheme_id': 3}, self.session
+            ),
+            SQLAlchemyProvider(
+                {'id': 'TYPED', 'conceptscheme_id': 4}, self.session,
+                uri_generator=TypedUrnGenerator('TYPED')
+            ),
+        ]
+        self.resolver = UriResolver(self.session, self.providers)
+
+    def tearDown(self):
+        self.session.rollback()
+        session.close_all_sessions()
+        Base.metadata.drop_all(self.engine)
+
+    def test_resolve_stored(self):
+        assert (1, '1') == self.resolver.resolve('urn:x-skosprovider:test:1')
+        assert (1, '2') == self.resolver.resolve('urn:x-skosprovider:test:2')
+        assert not self.resolver.resolve('urn:x-skosprovider:test:404')
+
+    def test_resolve_generated(self):
+        assert (2, 'oak') == self.resolver.resolve('http://id.example.com/trees/oak')
+        assert not self.resolver.resolve('http://id.example.com/trees/beech')
+        assert not self.resolver.resolve('http://id.example.com/trees/')
+
+    def test_resolve_generated_lowercase(self):
+        # The default generator lowercases the URIs it generates.
+        uri = self.providers[2].uri_generator.generate(type='concept', id='Oak')
+        assert 'urn:x-skosprovider:bomen:oak' == uri
+        assert (3, 'Oak') == self.resolver.resolve(uri)
+
+    def test_resolve_generated_typed(self):
+        assert (4, '1') == self.resolver.resolve('urn:x-skosprovider:typed:concept:1')
+        assert (4, '2') == self.resolver.resolve('urn:x-skosprovider:typed:collection:2')
+        assert not self.resolver.resolve('urn:x-skosprovider:typed:collection:1')
+
+    def test_resolve_generated_stored_uri(self):
+        # Concepts with a stored URI are only found by that URI.
+        assert not self.resolver.resolve('urn:x-skosprovider:soorten:1')
+
+    def test_resolve_uris(self):
+        assert {
+            'urn:x-skosprovider:test:1': (1, '1'),
+            'http://id.example.com/trees/oak': (2, 'oak'),
+            'urn:x-skosprovider:typed:concept:1': (4, '1'),
+        } == self.resolver.resolve_uris([
+            'urn:x-skosprovider:test:1',
+            'http://id.example.com/trees/oak',
+            'urn:x-skosprovider:typed:concept:1',
+            'urn:x-skosprovider:test:404',
+        ], chunk_size=2)
+
+    def test_without_cache(self):
+        self.resolver.resolve('urn:x-skosprovider:test:1')
+        assert {} == self.resolver._cache
+
+    def test_cache(self):
+        resolver = UriResolver(self.session, self.providers, cache=True)
+        assert (1, '1') == resolver.resolve('urn:x-skosprovider:test:1')
+        self.session.get(Concept, 10).uri = 'urn:x-skosprovider:changed'
+        self.session.flush()
+        assert (1, '1') == resolver.resolve('urn:x-skosprovider:test:1')
+        resolver.clear_cache()
+        assert not resolver.resolve('urn:x-skosprovider:test:1')
+
+    def test_cache_ttl(self):
+        resolver = UriResolver(
+            self.session, self.providers, cache=True, cache_ttl=60
+        )
+        resolver.resolve('urn:x-skosprovider:test:1')
+        self.session.get(Concept, 10).uri = 'urn:x-skosprovider:changed'
+        self.session.flush()
+        assert (1, '1') == resolver.resolve('urn:x-skosprovider:test:1')
+        resolver._cache_loaded -= 61
+        assert not resolver.resolve('urn:x-skosprovider:test:1')
+
+    def test_factory(self):
+        factory = ProviderFactory(self.session)
+        factory.create_providers(
+            metadata={2: {'id': 'TREES'}},
+            provider_kwargs={2: {
+                'uri_generator': UriPatternGenerator('http://id.example.com/trees/%s')
+            }}
+        )
+        assert (2, 'oak') == factory.resolver.resolve('http://id.example.com/trees/oak')
+        res = factory.get_by_uris([
+            'http://id.example.com/trees/oak', 'urn:x-skosprovider:test:1'
+        ])
+        assert 'oak' == res['http://id.example.com/trees/oak'].id
+        assert 'http://id.example.com/trees/oak' == res['http://id.example.com/trees/oak'].uri
+        assert '1' == res['urn:x-skosprovider:test:1'].id
@@ -1,15 +1,20 @@
 import csv
 import os
 
+import pytest
+from sqlalchemy import func
 from sqlalchemy import select
 from sqlalchemy.orm import session
 
 from skosprovider_sqlalchemy.models import Base
 from skosprovider_sqlalchemy.models import Initialiser
+from skosprovider_sqlalchemy.utils import TopLevelCalculator
 from skosprovider_sqlalchemy.utils import VisitationCalculator
 from skosprovider_sqlalchemy.utils import import_provider
+from skosprovider_sqlalchemy.utils import upgrade_database
 
 from tests import DBTestCase
+from tests.conftest import count_stale_concept_ids
 
 
 def _get_menu():
@@ -366,6 +371,31 @@ class TestImportProviderTests(DBTestCase):
         assert 'urn:x-skosprovider:menu:11' == lobster.uri
         assert 'Lobster Thermidor' == str(lobster.label())
         assert 1 == len(lobster.notes)
+        self.session.flush()
+        assert 0 == count_stale_concept_ids(self.session.connection())
+
+    def test_does_not_buffer(self):
+        import copy
+        import gc
+        import weakref
+
+        geoprovider = _get_geo()
+        get_by_id = geoprovider.get_by_id
+        read = []
+
+        def _get_by_id(id):
+            gc.collect()
+            # Only the concept being imported may still be around.
+            assert 1 >= len([r for r in read if r() is not None])
+            # A copy, the provider keeps its own concepts around.
+            thing = copy.copy(get_by_id(id))
+            read.append(weakref.ref(thing))
+            return thing
+
+        geoprovider.get_by_id = _get_by_id
+        cs = import_provider(geoprovider, self.session)
+        assert 11 == len(read)
+        assert 11 == len(cs.concepts)
 
     def test_geo(self):
         from skosprovider_sqlalchemy.models import (
@@ -662,3 +692,514 @@ class TestVisitationCalculator(DBTestCase):
             if v['id'] == 2:
                 assert v['lft'] + 1 == v['rght']
                 assert 2 == v['depth']
+
+
+class TestTopLevelCalculator(DBTestCase):
+
+    def setUp(self):
+        Base.metadata.create_all(self.engine)
+        self.session = self.session_maker()
+        Initialiser(self.session).init_all()
+
+    def tearDown(self):
+        self.session.rollback()
+        session.close_all_sessions()
+        Base.metadata.drop_all(self.engine)
+
+    def _get_cs(self):
+        from skosprovider_sqlalchemy.models import (
+            ConceptScheme as ConceptSchemeModel
+        )
+
+        return ConceptSchemeModel(
+            id=1,
+            uri='urn:x-skosprovider:cs:1'
+        )
+
+    def _get_concept_ids(self, toplevel, hierarchy):
+        from skosprovider_sqlalchemy.models import (
+            Thing as ThingModel
+        )
+
+        return sorted(
+            self.session.get(ThingModel, t['id']).concept_id
+            for t in toplevel if t['hierarchy'] == hierarchy
+        )
+
+    def test_empty_provider(self):
+        from skosprovider.providers import DictionaryProvider
+
+        p = DictionaryProvider({'id': 'EMPTY'}, [])
+        cs = self._get_cs()
+        self.session.add(cs)
+        import_provider(p, self.session, cs)
+        tc = TopLevelCalculator(self.session)
+        assert [] == tc.calculate(cs)
+
+    def test_geo(self):
+        geoprovider = _get_geo()
+        cs = self._get_cs()
+        self.session.add(cs)
+        import_provider(geoprovider, self.session, cs)
+        tc = TopLevelCalculator(self.session)
+        toplevel = tc.calculate(cs)
+        assert ['1'] == self._get_concept_ids(toplevel, 'concept')
+        assert ['1', '333'] == self._get_concept_ids(toplevel, 'display')
+
+    def test_buildings(self):
+        buildingprovider = _get_buildings()
+        cs = self._get_cs()
+        self.session.add(cs)
+        import_provider(buildingprovider, self.session, cs)
+        tc = TopLevelCalculator(self.session)
+        toplevel = tc.calculate(cs)
+        assert ['1', '3'] == self._get_concept_ids(toplevel, 'concept')
+        assert ['1', '3'] == self._get_concept_ids(toplevel, 'display')
+
+
+class TestUpgradeDatabase(DBTestCase):
+
+    def setUp(self):
+        Base.metadata.create_all(self.engine)
+
+    def tearDown(self):
+        Base.metadata.drop_all(self.engine)
+
+    def test_up_to_date(self):
+        assert [] == upgrade_database(self.engine)
+
+    def test_missing_indexes(self):
+        from sqlalchemy import inspect
+        from skosprovider_sqlalchemy.models import Thing
+
+        index = [
+            i for i in Thing.__table__.indexes
+            if i.name == 'ix_concept_uri_conceptscheme_id'
+        ][0]
+        with self.engine.begin() as conn:
+            index.drop(conn)
+        assert 'ix_concept_uri_conceptscheme_id' not in [
+            i['name'] for i in inspect(self.engine).get_indexes('concept')
+        ]
+        assert ['ix_concept_uri_conceptscheme_id'] == upgrade_database(self.engine)
+        assert 'ix_concept_uri_conceptscheme_id' in [
+            i['name'] for i in inspect(self.engine).get_indexes('concept')
+        ]
+
+    def test_missing_tables(self):
+        from sqlalchemy import inspect
+        from skosprovider_sqlalchemy.models import TopLevel
+
+        TopLevel.__table__.drop(self.engine)
+        upgrade_database(self.engine)
+        assert 'toplevel' in inspect(self.engine).get_table_names()
+
+    def test_missing_concept_id(self):
+        from sqlalchemy import inspect
+        from sqlalchemy import text
+        from skosprovider_sqlalchemy.models import ConceptScheme
+        from skosprovider_sqlalchemy.models import Label
+        from skosprovider_sqlalchemy.models import Thing
+        from skosprovider_sqlalchemy.models import concept_label
+        from skosprovider_sqlalchemy.models import conceptscheme_label
+
+        s = self.session_maker()
+        Initialiser(s).init_all()
+        s.commit()
+        s.close()
+        # The label table as it was before it had a concept_id.
+        concept_label.drop(self.engine)
+        conceptscheme_label.drop(self.engine)
+        Label.__table__.drop(self.engine)
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                'CREATE TABLE label ('
+                'id INTEGER PRIMARY KEY, '
+                'label VARCHAR(512) NOT NULL, '
+                'labeltype_id VARCHAR(20) NOT NULL, '
+                'language_id VARCHAR(64))'
+            ))
+            concept_label.create(conn)
+            conceptscheme_label.create(conn)
+            conn.execute(ConceptScheme.__table__.insert().values(id=1, uri='urn:cs'))
+            conn.execute(Thing.__table__.insert().values(
+                id=1, type='concept', concept_id='1', conceptscheme_id=1
+            ))
+            conn.execute(text(
+                "INSERT INTO label (id, label, labeltype_id, language_id) "
+                "VALUES (1, 'Oak', 'prefLabel', 'en'), "
+                "(2, 'Trees', 'prefLabel', 'en')"
+            ))
+            conn.execute(concept_label.insert().values(concept_id=1, label_id=1))
+            conn.execute(conceptscheme_label.insert().values(
+                conceptscheme_id=1, label_id=2
+            ))
+
+        created = upgrade_database(self.engine)
+        assert 'label.concept_id' in created
+        assert 'ix_label_concept_id_language_id_labeltype_id' in created
+        assert 'ix_label_label_lower' in created
+        with self.engine.connect() as conn:
+            assert [(1, 1), (2, None)] == conn.execute(
+                select(Label.id, Label.concept_id).order_by(Label.id)
+            ).all()
+        assert 'concept_id' in [
+            c['name'] for c in inspect(self.engine).get_columns('label')
+        ]
+        assert [] == upgrade_database(self.engine)
+
+    def test_stale_concept_id(self):
+        from sqlalchemy import update
+        from skosprovider_sqlalchemy.models import Label
+        from tests.conftest import create_data
+
+        s = self.session_maker()
+        Initialiser(s).init_all()
+        create_data(s)
+        s.execute(update(Label).values(concept_id=None))
+        s.commit()
+        assert 0 < count_stale_concept_ids(s.connection())
+        s.close()
+        assert [] == upgrade_database(self.engine)
+        with self.engine.connect() as conn:
+            assert 0 == count_stale_concept_ids(conn)
+
+
+class TestMaterializeUris(DBTestCase):
+
+    def setUp(self):
+        from skosprovider_sqlalchemy.models import Collection
+        from skosprovider_sqlalchemy.models import Concept
+        from skosprovider_sqlalchemy.models import ConceptScheme
+
+        Base.metadata.create_all(self.engine)
+        self.session = self.session_maker()
+        Initialiser(self.session).init_all()
+        cs = ConceptScheme(id=1, uri='urn:x-skosprovider:cs:1')
+        self.session.add_all([
+            cs,
+            Concept(id=1, concept_id='Oak', conceptscheme=cs),
+            Concept(
+                id=2, concept_id='beech', uri='http://example.com/beech',
+                conceptscheme=cs
+            ),
+            Collection(id=3, concept_id='trees', conceptscheme=cs),
+        ])
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.rollback()
+        session.close_all_sessions()
+        Base.metadata.drop_all(self.engine)
+
+    def _uris(self):
+        from skosprovider_sqlalchemy.models import Thing
+
+        return dict(self.session.execute(
+            select(Thing.concept_id, Thing.uri).order_by(Thing.id)
+        ).all())
+
+    def test_pattern(self):
+        from skosprovider.uri import UriPatternGenerator
+        from skosprovider_sqlalchemy.utils import materialize_uris
+
+        generator = UriPatternGenerator('http://id.example.com/trees/%s')
+        assert 2 == materialize_uris(self.session, 1, generator)
+        assert {
+            'Oak': 'http://id.example.com/trees/Oak',
+            'beech': 'http://example.com/beech',
+            'trees': 'http://id.example.com/trees/trees',
+        } == self._uris()
+        assert 0 == materialize_uris(self.session, 1, generator)
+
+    def test_default_urn(self):
+        from skosprovider.uri import DefaultUrnGenerator
+        from skosprovider_sqlalchemy.providers import SQLAlchemyProvider
+        from skosprovider_sqlalchemy.utils import materialize_uris
+
+        provider = SQLAlchemyProvider(
+            {'id': 'TREES', 'conceptscheme_id': 1}, self.session
+        )
+        generated = provider.get_by_id('Oak').uri
+        assert not provider.get_by_uri(generated)
+        materialize_uris(self.session, 1, DefaultUrnGenerator('TREES'))
+        assert 'urn:x-skosprovider:trees:oak' == self._uris()['Oak']
+        assert 'Oak' == provider.get_by_uri(generated).id
+
+    def test_generated_in_python(self):
+        from skosprovider.uri import UriGenerator
+        from skosprovider_sqlalchemy.utils import materialize_uris
+
+        class ReversedGenerator(UriGenerator):
+            def generate(self, **kwargs):
+                return 'urn:reversed:%s' % kwargs['id'][::-1]
+
+        assert 2 == materialize_uris(
+            self.session, 1, ReversedGenerator(), chunk_size=1
+        )
+        assert 'urn:reversed:kaO' == self._uris()['Oak']
+        assert 'urn:reversed:seert' == self._uris()['trees']
+
+    def test_on_flush(self):
+        from sqlalchemy import event
+        from skosprovider.uri import UriPatternGenerator
+        from skosprovider_sqlalchemy.models import Collection
+        from skosprovider_sqlalchemy.models import Concept
+        from skosprovider_sqlalchemy.models import ConceptScheme
+        from skosprovider_sqlalchemy.utils import materialize_uris_on_flush
+
+        listener = materialize_uris_on_flush(self.session, {
+            1: UriPatternGenerator('http://id.example.com/trees/%s')
+        })
+        cs = self.session.get(ConceptScheme, 1)
+        other = ConceptScheme(id=2, uri='urn:x-skosprovider:cs:2')
+        self.session.add_all([
+            Concept(id=4, concept_id='ash', conceptscheme_id=1),
+            Collection(id=5, concept_id='shrubs', conceptscheme=cs),
+            Concept(id=6, concept_id='willow', conceptscheme=other),
+        ])
+        self.session.flush()
+        event.remove(self.session, 'before_flush', listener)
+        uris = self._uris()
+        assert 'http://id.example.com/trees/ash' == uris['ash']
+        assert 'http://id.example.com/trees/shrubs' == uris['shrubs']
+        assert uris['willow'] is None
+        assert uris['Oak'] is None
+
+
+class TestImportProviders(DBTestCase):
+
+    @pytest.fixture(autouse=True)
+    def init_database(self, tmp_path):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+
+        if self.engine.url.database in (None, '', ':memory:'):
+            # Every thread would get an in-memory database of its own.
+            self.engine = create_engine('sqlite:///%s' % (tmp_path / 'skos.db'))
+            self.session_maker = sessionmaker(bind=self.engine)
+        Base.metadata.create_all(self.engine)
+        db_session = self.session_maker()
+        Initialiser(db_session).init_all()
+        db_session.commit()
+        db_session.close()
+        yield
+        session.close_all_sessions()
+        Base.metadata.drop_all(self.engine)
+
+    def test_import_providers(self):
+        from skosprovider_sqlalchemy.models import ConceptScheme
+        from skosprovider_sqlalchemy.models import Language
+        from skosprovider_sqlalchemy.providers import SQLAlchemyProvider
+        from skosprovider_sqlalchemy.utils import import_providers
+
+        providers = [_get_menu(), _get_geo(), _get_buildings()]
+        reports = import_providers(providers, self.session_maker, max_workers=3)
+        assert ['MENU', 'GEOGRAPHY', 'BUILDINGS'] == [r.provider_id for r in reports]
+        assert [None, None, None] == [r.error for r in reports]
+        assert [11, 11, 4] == [r.concepts for r in reports]
+        for report in reports:
+            assert report.duration > 0
+        session = self.session_maker()
+        assert 3 == session.execute(
+            select(func.count()).select_from(ConceptScheme)
+        ).scalar()
+        assert session.get(Language, 'und') is not None
+        geo = SQLAlchemyProvider(
+            {'id': 'GEOGRAPHY', 'conceptscheme_id': reports[1].conceptscheme_id},
+            session
+        )
+        assert 'World' == geo.get_by_id(1).label('en').label
+        session.close()
+
+    def test_failed_import(self):
+        from skosprovider.providers import DictionaryProvider
+        from skosprovider_sqlalchemy.models import ConceptScheme
+        from skosprovider_sqlalchemy.utils import import_providers
+
+        class BrokenProvider(DictionaryProvider):
+            def get_by_id(self, id):
+                raise RuntimeError('Unable to read %s.' % id)
+
+        broken = BrokenProvider({'id': 'BROKEN'}, [{'id': 1}])
+        reports = import_providers([broken, _get_geo()], self.session_maker)
+        assert isinstance(reports[0].error, RuntimeError)
+        assert reports[0].conceptscheme_id is None
+        assert reports[1].error is None
+        session = self.session_maker()
+        assert [reports[1].conceptscheme_id] == session.execute(
+            select(ConceptScheme.id)
+        ).scalars().all()
+        session.close()
+
+    def test_providers_are_streamed(self):
+        from unittest import mock
+        from skosprovider_sqlalchemy.utils import import_providers
+
+        geo = _get_geo()
+        with mock.patch.object(
+            geo, 'get_by_id', wraps=geo.get_by_id
+        ) as get_by_id, mock.patch.object(
+            geo, 'get_all', wraps=geo.get_all
+        ) as get_all:
+            reports = import_providers([geo], self.session_maker)
+        assert 11 == reports[0].concepts
+        # Once to collect the languages and once to import.
+        assert 2 == get_all.call_count
+        assert 22 == get_by_id.call_count
+
+
+class _ConceptschemeTestCase(DBTestCase):
+
+    def setUp(self):
+        from skosprovider_sqlalchemy.models import Source
+        from skosprovider_sqlalchemy.models import Thing
+        from skosprovider_sqlalchemy.models import TopLevel
+        from tests.conftest import create_data
+        from tests.conftest import create_visitation
+
+        Base.metadata.create_all(self.engine)
+        self.session = self.session_maker()
+        Initialiser(self.session).init_all()
+        create_data(self.session)
+        create_visitation(self.session)
+        self.session.get(Thing, 10).sources.append(Source('A book'))
+        cs = self.session.get(Thing, 10).conceptscheme
+        cs.sources.append(Source('The scheme book'))
+        for t in TopLevelCalculator(self.session).calculate(cs):
+            self.session.add(TopLevel(
+                conceptscheme=cs, concept_id=t['id'], hierarchy=t['hierarchy']
+            ))
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.rollback()
+        session.close_all_sessions()
+        Base.metadata.drop_all(self.engine)
+
+    def _provider(self, cs_id, **kwargs):
+        from skosprovider_sqlalchemy.providers import SQLAlchemyProvider
+
+        return SQLAlchemyProvider(
+            {'id': 'SOORTEN', 'conceptscheme_id': cs_id}, self.session, **kwargs
+        )
+
+
+class TestCloneConceptscheme(_ConceptschemeTestCase):
+
+    def test_clone(self):
+        from skosprovider_sqlalchemy.utils import clone_conceptscheme
+
+        clone = clone_conceptscheme(self.session, 1, uri='urn:x-skosprovider:copy')
+        assert 2 == clone.id
+        assert 'urn:x-skosprovider:copy' == clone.uri
+        original = self._provider(1)
+        copy = self._provider(2)
+        assert original.concept_scheme.languages == copy.concept_scheme.languages
+        assert 'The scheme book' == copy.concept_scheme.sources[0].citation
+        assert list(original.iter_raw()) == list(copy.iter_raw())
+        assert list(original.iter_raw()) == list(
+            self._provider(2, label_strategy='direct').iter_raw()
+        )
+        assert 0 == count_stale_concept_ids(self.session.connection())
+        assert original.get_top_concepts() == copy.get_top_concepts()
+
+    def test_clone_precomputed(self):
+        from skosprovider_sqlalchemy.utils import clone_conceptscheme
+
+        clone_conceptscheme(self.session, 1)
+        original = self._provider(1, expand_strategy='visit', top_strategy='precomputed')
+        copy = self._provider(2, expand_strategy='visit', top_strategy='precomputed')
+        assert sorted(original.expand(1)) == sorted(copy.expand(1))
+        assert original.get_top_display() == copy.get_top_display()
+
+    def test_clone_is_independent(self):
+        from skosprovider_sqlalchemy.models import Label
+        from skosprovider_sqlalchemy.models import Thing
+        from skosprovider_sqlalchemy.utils import clone_conceptscheme
+
+        clone_conceptscheme(self.session, 1)
+        copy = self.session.execute(
+            select(Thing).where(Thing.conceptscheme_id == 2, Thing.concept_id == '1')
+        ).scalar_one()
+        assert copy.id > 90
+        copy.labels.append(Label('Kirchen', 'prefLabel', 'de'))
+        self.session.flush()
+        assert 3 == len(self._provider(2).get_by_id(1).labels)
+        assert 2 == len(self._provider(1).get_by_id(1).labels)
+
+    def test_clone_statements(self):
+        from sqlalchemy import event
+        from skosprovider_sqlalchemy.utils import clone_conceptscheme
+
+        statements = []
+
+        def count(*args):
+            statements.append(args)
+
+        event.listen(self.engine, 'before_cursor_execute', count)
+        try:
+            clone_conceptscheme(self.session, 1)
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', count)
+        assert len(statements) < 40
+
+    def test_unknown(self):
+        from skosprovider_sqlalchemy.utils import clone_conceptscheme
+
+        with pytest.raises(ValueError):
+            clone_conceptscheme(self.session, 404)
+
+
+class TestDeleteConceptscheme(_ConceptschemeTestCase):
+
+    def _count(self, table):
+        return self.session.execute(
+            select(func.count()).select_from(table)
+        ).scalar()
+
+    def _counts(self):
+        from skosprovider_sqlalchemy import models
+
+        return {
+            table.name: self._count(table)
+            for table in models.Base.metadata.sorted_tables
+        }
+
+    def test_delete(self):
+        from skosprovider_sqlalchemy.models import ConceptScheme
+        from skosprovider_sqlalchemy.utils import clone_conceptscheme
+        from skosprovider_sqlalchemy.utils import delete_conceptscheme
+
+        before = self._counts()
+        original = list(self._provider(1).iter_raw())
+        clone_conceptscheme(self.session, 1)
+        assert 9 == delete_conceptscheme(self.session, 2)
+        assert before == self._counts()
+        assert original == list(self._provider(1).iter_raw())
+        assert self.session.get(ConceptScheme, 2) is None
+
+    def test_delete_everything(self):
+        from skosprovider_sqlalchemy.models import Thing
+        from skosprovider_sqlalchemy.utils import delete_conceptscheme
+
+        before = self._counts()
+        self.session.get(Thing, 10)
+        assert 9 == delete_conceptscheme(self.session, 1)
+        after = self._counts()
+        for table in (
+            'concept', 'label', 'note', 'source', 'match', 'visitation',
+            'toplevel', 'conceptscheme', 'concept_label',
+            'conceptscheme_source', 'concept_hierarchy_concept',
+            'collection_concept', 'conceptscheme_language'
+        ):
+            assert 0 == after[table], table
+        # Reference data stays.
+        assert before['language'] == after['language']
+        assert before['labeltype'] == after['labeltype']
+
+    def test_delete_unknown(self):
+        from skosprovider_sqlalchemy.utils import delete_conceptscheme
+
+        with pytest.raises(ValueError):
+            delete_conceptscheme(self.session, 404)